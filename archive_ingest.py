@@ -0,0 +1,514 @@
+# -*- coding: utf-8 -*-
+"""
+Archive Ingest - استخراج الصور والملفات الشخصية من صفحات مؤرشفة (WARC و HAR ومجلد HTML) دون إعادة جلبها
+"""
+
+import argparse
+import base64
+import binascii
+import codecs
+import contextlib
+import gzip
+import json
+import mmap
+import os
+import re
+import sys
+import time
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+from avatar_extractor import AvatarExtractor
+from batch_engine import PlatformRateLimiter
+from bulk_cli import parse_rates
+from candidate_resolver import CandidateResolver
+from html_document import HtmlDocument
+from image_store import ImageStore
+from metrics import error_class_of
+from profile_analyzer import ProfileAnalyzer
+
+HTML_EXTENSIONS = ('.html', '.htm', '.xhtml')
+HTML_TYPES = ('text/html', 'application/xhtml+xml')
+CHARSET = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+HAR_ENTRIES = re.compile(r'"entries"\s*:\s*\[')
+# حد بين مدخلين: نهاية كائن ثم كائن يبدأ بأحد مفاتيح مدخل HAR
+HAR_NEXT_ENTRY = re.compile(r'\}\s*,\s*(?=\{\s*"(?:startedDateTime|pageref|request|response|time|cache|timings)"\s*:)')
+HAR_CHUNK_BYTES = 1024 * 1024
+# مدخل أكبر من هذا يُعد تالفاً بدل قراءة بقية الملف إلى الذاكرة بحثاً عن نهايته
+HAR_MAX_ENTRY_BYTES = 256 * 1024 * 1024
+
+def _charset_of(content_type: Optional[str]) -> Optional[str]:
+    match = CHARSET.search(content_type or '')
+    return match.group(1) if match else None
+
+def _is_html(content_type: Optional[str]) -> bool:
+    # الأرشيفات القديمة لا تحفظ النوع دائماً
+    return not content_type or content_type.split(';')[0].strip().lower() in HTML_TYPES
+
+def _parse_headers(block: bytes) -> Dict[str, str]:
+    """ترويسات بصيغة name: value، بمفاتيح صغيرة"""
+    headers = {}
+    for line in block.decode('latin-1').split('\r\n'):
+        name, sep, value = line.partition(':')
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+def _split_http(block, offset: int, length: int) -> Optional[Dict]:
+    """فصل ترويسات استجابة HTTP المؤرشفة عن جسمها؛ block يدعم find مثل mmap أو bytes"""
+    end = offset + length
+    header_end = block.find(b'\r\n\r\n', offset, end)
+    if header_end < 0:
+        return None
+    status_line, _, header_block = bytes(block[offset:header_end]).partition(b'\r\n')
+    parts = status_line.split()
+    if len(parts) < 2 or not parts[1].isdigit():
+        return None
+    headers = _parse_headers(header_block)
+    return {
+        'status': int(parts[1]),
+        'content_type': headers.get('content-type'),
+        'transfer_encoding': headers.get('transfer-encoding', '').lower(),
+        'content_encoding': headers.get('content-encoding', '').lower(),
+        'offset': header_end + 4,
+        'length': end - header_end - 4,
+    }
+
+def _page_ref(source: str, url: Optional[str], http: Optional[Dict] = None, **location) -> Dict:
+    """وصف صفحة يكفي العملية العاملة لقراءتها: مسار وإزاحة في ملف، أو بايتات مضمنة"""
+    http = http or {}
+    ref = {
+        'source': source,
+        'url': url,
+        'charset': _charset_of(http.get('content_type')),
+        'transfer_encoding': http.get('transfer_encoding', ''),
+        'content_encoding': http.get('content_encoding', ''),
+    }
+    ref.update(location)
+    return ref
+
+def _content_length(headers: Dict[str, str]) -> Optional[int]:
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        return None
+    return length if length >= 0 else None
+
+def _warc_records(stream) -> Iterator[Tuple[Dict[str, str], int, int]]:
+    """سجلات WARC من ملف غير مضغوط عبر mmap: (الترويسات، بداية الكتلة، طولها) دون نسخ الكتل"""
+    position = 0
+    size = len(stream)
+    while position < size:
+        header_end = stream.find(b'\r\n\r\n', position)
+        if header_end < 0:
+            return
+        headers = _parse_headers(bytes(stream[position:header_end]))
+        start = header_end + 4
+        length = _content_length(headers)
+        if length is None:
+            # سجل تالف: نتجاوزه إلى بداية السجل التالي بدل إيقاف الأرشيف كله
+            print(f"⚠️ سجل WARC بطول غير صالح عند {position}: {headers.get('content-length')!r}", file=sys.stderr)
+            next_record = stream.find(b'\r\nWARC/', start - 2)
+            if next_record < 0:
+                return
+            position = next_record + 2
+            continue
+        if start + length > size:
+            print(f"⚠️ سجل WARC مبتور عند {position}", file=sys.stderr)
+            length = size - start
+        yield headers, start, length
+        # كل سجل يُختم بسطرين فارغين
+        position = start + length
+        while stream[position:position + 2] == b'\r\n':
+            position += 2
+
+def _warc_gz_records(stream) -> Iterator[Tuple[Dict[str, str], bytes]]:
+    """سجلات WARC مضغوطة: فك الضغط تدفقي فتُقرأ الكتل كبايتات"""
+    line = stream.readline()
+    while line:
+        if not line.strip():
+            line = stream.readline()
+            continue
+        header_lines = []
+        while line.strip():
+            header_lines.append(line)
+            line = stream.readline()
+        headers = _parse_headers(b''.join(header_lines))
+        length = _content_length(headers)
+        if length is None:
+            print(f"⚠️ سجل WARC بطول غير صالح: {headers.get('content-length')!r}", file=sys.stderr)
+            # بلا طول صحيح نتجاوز الأسطر حتى بداية السجل التالي
+            line = stream.readline()
+            while line and not line.startswith(b'WARC/'):
+                line = stream.readline()
+            continue
+        yield headers, stream.read(length)
+        line = stream.readline()
+
+def iter_warc(path: str) -> Iterator[Dict]:
+    """صفحات HTML من سجلات response و resource في ملف WARC"""
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as stream:
+            try:
+                for headers, block in _warc_gz_records(stream):
+                    page = _warc_page(path, headers, block, 0, len(block))
+                    if page is not None:
+                        ref, offset, length = page
+                        ref['data'] = block[offset:offset + length]
+                        yield ref
+            except (EOFError, OSError, zlib.error) as e:
+                # ملف مبتور أو تالف الضغط: نكتفي بما قُرئ قبله
+                print(f"⚠️ توقفت قراءة {path}: {e}", file=sys.stderr)
+        return
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as stream:
+            for headers, start, length in _warc_records(stream):
+                page = _warc_page(path, headers, stream, start, length)
+                if page is not None:
+                    # العملية العاملة تقرأ الجسم من الملف بنفسها فلا يمر عبر الأنبوب
+                    ref, offset, length = page
+                    ref.update(path=path, offset=offset, length=length)
+                    yield ref
+
+def _warc_page(path: str, headers: Dict[str, str], block, start: int,
+               length: int) -> Optional[Tuple[Dict, int, int]]:
+    """(وصف الصفحة، بداية جسمها، طوله) من سجل WARC، أو None للسجلات التي ليست صفحات HTML ناجحة"""
+    record_type = headers.get('warc-type')
+    url = headers.get('warc-target-uri', '').strip('<>')
+    source = f"{os.path.basename(path)}#{headers.get('warc-record-id', start)}"
+    if record_type == 'resource':
+        if not _is_html(headers.get('content-type')):
+            return None
+        return _page_ref(source, url, {'content_type': headers.get('content-type')}), start, length
+    if record_type != 'response':
+        return None
+
+    http = _split_http(block, start, length)
+    if http is None or http['status'] != 200 or not _is_html(http['content_type']):
+        return None
+    return _page_ref(source, url, http), http['offset'], http['length']
+
+def _har_entries(stream, chunk_size: int = HAR_CHUNK_BYTES) -> Iterator[Dict]:
+    """مدخلات HAR واحداً تلو الآخر بفك تدريجي من mmap؛ الذاكرة بحجم أكبر مدخل لا حجم الملف"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    size = len(stream)
+    read_at = 0
+    text = ''
+
+    def read(amount: int) -> str:
+        nonlocal read_at
+        chunk = stream[read_at:read_at + amount]
+        read_at += len(chunk)
+        return utf8.decode(chunk, final=read_at >= size)
+
+    # بداية مصفوفة entries، مع إبقاء ذيل صغير لاسم قد ينقسم بين دفعتين
+    while True:
+        text += read(chunk_size)
+        match = HAR_ENTRIES.search(text)
+        if match:
+            text = text[match.end():]
+            break
+        if read_at >= size:
+            return
+        text = text[-64:]
+
+    # الإزاحة تتقدم داخل النص المقروء، ولا يُنسخ الباقي إلا عند قراءة دفعة جديدة
+    position = 0
+    resync = False
+    while True:
+        if resync:
+            match = HAR_NEXT_ENTRY.search(text, position)
+            if match is None:
+                if read_at >= size:
+                    return
+                # ذيل صغير يبقى لحد قد ينقسم بين دفعتين
+                text, position = text[max(position, len(text) - 256):] + read(chunk_size), 0
+                continue
+            position, resync = match.end(), False
+        while position < len(text) and text[position] in ' \t\r\n,':
+            position += 1
+        if position >= len(text):
+            if read_at >= size:
+                return
+            text, position = read(chunk_size), 0
+            continue
+        if text[position] == ']':
+            return
+        try:
+            entry, end = decoder.raw_decode(text, position)
+        except json.JSONDecodeError as e:
+            pending = len(text) - position
+            # نص لم يُغلق، أو خطأ في آخر المقروء حيث قد تنقسم كلمة أو \uXXXX
+            truncated = e.msg.startswith('Unterminated string') or e.pos >= len(text) - 16
+            if truncated and read_at < size and pending < HAR_MAX_ENTRY_BYTES:
+                # المدخل لم يكتمل بعد: مضاعفة المقروء تبقي الكلفة خطية
+                text = text[position:] + read(max(chunk_size, pending))
+                position = 0
+                continue
+            print(f"⚠️ مدخل HAR تالف، الانتقال إلى المدخل التالي: {e}", file=sys.stderr)
+            position, resync = max(e.pos, position + 1), True
+            continue
+        yield entry
+        position = end
+
+def iter_har(path: str) -> Iterator[Dict]:
+    """صفحات HTML من مدخلات HAR؛ كل مدخل يُفك وحده بدل بناء شجرة الملف كاملة"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as stream:
+            for index, entry in enumerate(_har_entries(stream), 1):
+                try:
+                    ref = _har_page(path, index, entry)
+                except (AttributeError, TypeError, ValueError, binascii.Error) as e:
+                    print(f"⚠️ تخطي مدخل HAR {index} في {path}: {e}", file=sys.stderr)
+                    continue
+                if ref is not None:
+                    yield ref
+
+def _har_page(path: str, index: int, entry: Dict) -> Optional[Dict]:
+    response = entry.get('response') or {}
+    content = response.get('content') or {}
+    body = content.get('text')
+    if response.get('status') != 200 or body is None or not _is_html(content.get('mimeType')):
+        return None
+    if content.get('encoding') == 'base64':
+        data = base64.b64decode(body, validate=True)
+        charset = _charset_of(content.get('mimeType'))
+    else:
+        # HAR يحفظ النص مفكوكاً أصلاً
+        data = body.encode('utf-8')
+        charset = 'utf-8'
+    ref = _page_ref(f'{os.path.basename(path)}#{index}', (entry.get('request') or {}).get('url'), data=data)
+    ref['charset'] = charset
+    return ref
+
+def iter_html_dir(path: str) -> Iterator[Dict]:
+    """ملفات HTML محفوظة؛ الرابط من og:url أو link canonical داخل الصفحة"""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.lower().endswith(HTML_EXTENSIONS):
+                continue
+            file_path = os.path.join(root, name)
+            size = os.path.getsize(file_path)
+            if size:
+                yield _page_ref(os.path.relpath(file_path, path), None, path=file_path, offset=0, length=size)
+
+def iter_pages(inputs: List[str]) -> Iterator[Dict]:
+    """كل الصفحات من المدخلات حسب نوع كل منها"""
+    for path in inputs:
+        if os.path.isdir(path):
+            yield from iter_html_dir(path)
+        elif path.endswith(('.warc', '.warc.gz')):
+            yield from iter_warc(path)
+        elif path.endswith('.har'):
+            yield from iter_har(path)
+        elif path.lower().endswith(HTML_EXTENSIONS):
+            yield _page_ref(os.path.basename(path), None, path=path, offset=0, length=os.path.getsize(path))
+        else:
+            print(f"⚠️ نوع ملف غير مدعوم: {path}", file=sys.stderr)
+
+# المستخرجات داخل كل عملية عاملة، وملفات الأرشيف المفتوحة فيها
+_worker_extractor = None
+_worker_analyzer = None
+_worker_maps = {}
+
+def _init_worker():
+    global _worker_extractor, _worker_analyzer
+    # رسائل المستخرج لا تختلط بـ JSONL عند الكتابة إلى stdout
+    sys.stdout = sys.stderr
+    _worker_extractor = AvatarExtractor(pool_size=1)
+    _worker_analyzer = ProfileAnalyzer()
+
+def _read_ref(ref: Dict) -> bytes:
+    """بايتات الصفحة: مضمنة، أو شريحة من الملف عبر mmap تفتحه العملية العاملة بنفسها"""
+    if ref.get('data') is not None:
+        return ref['data']
+    mapped = _worker_maps.get(ref['path'])
+    if mapped is None:
+        # ملفات قليلة مفتوحة في كل عملية لأن الصفحات تصل بترتيب الأرشيف
+        if len(_worker_maps) >= 4:
+            _worker_maps.pop(next(iter(_worker_maps))).close()
+        with open(ref['path'], 'rb') as f:
+            mapped = _worker_maps[ref['path']] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mapped[ref['offset']:ref['offset'] + ref['length']]
+
+def _dechunk(data: bytes) -> bytes:
+    """فك Transfer-Encoding: chunked كما حُفظ في الأرشيف"""
+    parts = []
+    position = 0
+    while True:
+        line_end = data.find(b'\r\n', position)
+        if line_end < 0:
+            break
+        size = int(data[position:line_end].split(b';')[0] or b'0', 16)
+        if size == 0:
+            break
+        parts.append(data[line_end + 2:line_end + 2 + size])
+        position = line_end + 2 + size + 2
+    return b''.join(parts)
+
+def _decode_body(ref: Dict, data: bytes) -> str:
+    if 'chunked' in ref['transfer_encoding']:
+        data = _dechunk(data)
+    if ref['content_encoding'] in ('gzip', 'x-gzip'):
+        data = gzip.decompress(data)
+    elif ref['content_encoding'] == 'deflate':
+        data = zlib.decompress(data)
+    return data.decode(ref['charset'] or 'utf-8', errors='replace')
+
+def _page_url(ref: Dict, html: str) -> str:
+    if ref['url']:
+        return ref['url']
+    doc = HtmlDocument(html, '')
+    url = doc.meta('og:url')
+    if not url:
+        link = doc.soup.find('link', rel='canonical')
+        url = link.get('href') if link else None
+    return url or 'file://' + os.path.abspath(ref['path'])
+
+def _analyze_page(ref: Dict, include_profile: bool) -> Dict:
+    """تشغيل مستخرجات المنصات ومحلل الملف الشخصي على صفحة واحدة"""
+    record = {'source': ref['source'], 'url': ref['url']}
+    try:
+        html = _decode_body(ref, _read_ref(ref))
+        url = record['url'] = _page_url(ref, html)
+        doc = HtmlDocument(html, url)
+        candidates = _worker_extractor._extract_avatars(doc)
+        record['platform'] = _worker_extractor._platform_for(url)
+        # ترتيب وإزالة تكرار دون فحص عبر الشبكة
+        record['candidates'] = [dict(c) for c in CandidateResolver(None, probe=False).rank(candidates)]
+        if include_profile:
+            record['profile'] = _worker_analyzer.analyze_profile(doc, url)
+        record['success'] = bool(candidates)
+        if not candidates:
+            record['error_class'] = 'no_candidates'
+    except Exception as e:
+        record.update(success=False, error=f'خطأ في التحليل: {e}', error_class=error_class_of(e))
+    return record
+
+def _analyze_batch(refs: List[Dict], include_profile: bool) -> List[Dict]:
+    """دفعة صفحات لكل مهمة لتقليل كلفة التنقل بين العمليات"""
+    return [_analyze_page(ref, include_profile) for ref in refs]
+
+def _batches(pages: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+class ImageFetcher:
+    """تحميل أفضل مرشح لكل صفحة عند الطلب، مع احترام وتيرة كل منصة"""
+
+    def __init__(self, image_store: ImageStore, workers: int = 8, rate_limits: Optional[Dict[str, float]] = None):
+        self.extractor = AvatarExtractor(image_store=image_store, pool_size=workers)
+        self.rate_limiter = PlatformRateLimiter(rate_limits)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def submit(self, record: Dict):
+        # الانتظار لدور المنصة يحدث قبل الوصول إلى العمال
+        return self.rate_limiter.submit(record['platform'], self.executor.submit, self._fetch, record,
+                                        bucket_key=self.extractor._site_key(record['url'], record['platform']))
+
+    def _fetch(self, record: Dict) -> Dict:
+        platform = record['platform']
+        best_avatar, download_result = self.extractor._resolve_best(record['candidates'], platform)
+        result = self.extractor._build_result(record['url'], best_avatar or {}, download_result, platform)
+        record = dict(record, success=result['success'])
+        for key in ('avatar_url', 'resolution', 'file_size', 'format', 'image_hash', 'error', 'error_class'):
+            if key in result:
+                record[key] = result[key]
+        return record
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+def run(args) -> int:
+    fetcher = None
+    if args.fetch_images:
+        fetcher = ImageFetcher(ImageStore(args.images), args.fetch_workers, parse_rates(args.rate))
+
+    workers = args.workers or os.cpu_count() or 1
+    window = args.window or workers * 4
+    batches = _batches(iter_pages(args.inputs), args.batch_size)
+    counts = {'pages': 0, 'with_candidates': 0, 'failed': 0}
+    started = time.monotonic()
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    # رسائل تحميل الصور تذهب إلى stderr حتى يبقى stdout للنتائج
+    redirect = contextlib.redirect_stdout(sys.stderr)
+
+    def emit(record: Dict):
+        output.write(json.dumps(record, ensure_ascii=False) + '\n')
+        counts['pages'] += 1
+        if record.get('candidates'):
+            counts['with_candidates'] += 1
+        if not record.get('success'):
+            counts['failed'] += 1
+        if counts['pages'] % args.progress_every == 0:
+            rate = counts['pages'] / max(time.monotonic() - started, 1e-9)
+            print(f"📊 {counts['pages']} صفحة ({rate:.0f}/ث)", file=sys.stderr)
+
+    pending = {}
+    exhausted = False
+    try:
+        with redirect, ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            while True:
+                # نافذة محدودة حتى لا تتكدس الصفحات في الذاكرة أمام العمليات
+                while not exhausted and len(pending) < window:
+                    try:
+                        batch = next(batches)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[pool.submit(_analyze_batch, batch, not args.no_profile)] = 'parse'
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = pending.pop(future)
+                    if stage == 'fetch':
+                        emit(future.result())
+                        continue
+                    for record in future.result():
+                        if fetcher is not None and record.get('candidates'):
+                            pending[fetcher.submit(record)] = 'fetch'
+                        else:
+                            emit(record)
+    finally:
+        if fetcher is not None:
+            fetcher.shutdown()
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"🎊 انتهى: {counts['pages']} صفحة، {counts['with_candidates']} بها صور، "
+          f"❌ {counts['failed']} في {time.monotonic() - started:.1f} ثانية", file=sys.stderr)
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='استخراج الصور والملفات الشخصية من أرشيف صفحات إلى JSONL')
+    parser.add_argument('inputs', nargs='+', help='ملفات .warc أو .warc.gz أو .har، أو مجلدات HTML')
+    parser.add_argument('-o', '--output', default='-', help='ملف النتائج (الافتراضي: stdout)')
+    parser.add_argument('--workers', type=int, help='عدد العمليات (الافتراضي: عدد الأنوية)')
+    parser.add_argument('--batch-size', type=int, default=16, help='صفحات لكل مهمة')
+    parser.add_argument('--window', type=int, help='أقصى عدد دفعات معلقة (الافتراضي: 4 × العمليات)')
+    parser.add_argument('--no-profile', action='store_true', help='تخطي تحليل بيانات الملف الشخصي')
+    parser.add_argument('--fetch-images', action='store_true', help='تحميل أفضل صورة لكل صفحة')
+    parser.add_argument('--images', default='avatar_store', help='مجلد حفظ الصور مع --fetch-images')
+    parser.add_argument('--fetch-workers', type=int, default=8)
+    parser.add_argument('--rate', action='append', metavar='PLATFORM=RATE', help='طلبات في الثانية لكل منصة')
+    parser.add_argument('--progress-every', type=int, default=1000)
+    return run(parser.parse_args(argv))
+
+if __name__ == "__main__":
+    sys.exit(main())
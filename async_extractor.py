@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+"""
+Async Avatar Extractor - مستخرج الصور غير المتزامن
+"""
+
+import asyncio
+import codecs
+import contextlib
+import json
+import time
+import aiohttp
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+from avatar_extractor import AvatarExtractor
+from circuit_breaker import CircuitOpenError, FetchError, parse_retry_after
+from deadline import Deadline, DeadlineExceeded, timeout_within
+from metrics import error_class_of
+from page_stream import PageStopTracker
+from records import ExtractionResult, json_default
+from html_document import HtmlDocument
+
+class AsyncAvatarExtractor:
+    """نسخة asyncio من المستخرج تشترك في عميل HTTP واحد مع keep-alive
+
+    الشبكة وحدها غير متزامنة هنا؛ التحليل ومعالجة الصور وسياسة إعادة المحاولة والقواطع
+    والفحص من AvatarExtractor المغلف، فيتصرف المساران بنفس الطريقة.
+    """
+
+    def __init__(self, extractor: AvatarExtractor = None, limit: int = 200, limit_per_host: int = 20,
+                 timeout: float = 15):
+        self.extractor = extractor or AvatarExtractor()
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self._client = None
+        # مهام الاستخراج الجارية حسب مفتاح الملف الشخصي
+        self._inflight = {}
+
+    async def __aenter__(self):
+        await self._get_client()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _get_client(self) -> aiohttp.ClientSession:
+        """إنشاء العميل المشترك عند أول استخدام"""
+        if self._client is None or self._client.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=30
+            )
+            self._client = aiohttp.ClientSession(
+                connector=connector,
+                headers=dict(self.extractor.session.headers),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._client
+
+    async def close(self):
+        """إغلاق العميل وتحرير الاتصالات"""
+        if self._client is not None and not self._client.closed:
+            await self._client.close()
+        self._client = None
+
+    async def extract_avatar_async(self, url: str, include_profile: bool = False,
+                                   deadline: Optional[Deadline] = None) -> ExtractionResult:
+        """استخراج الصورة من الرابط، ومعها بيانات الملف الشخصي عند الطلب، ضمن deadline اختياري"""
+        extractor = self.extractor
+        started = time.perf_counter()
+        platform = extractor._platform_for(url)
+        key = (extractor.registry.canonical_key(url), include_profile)
+        try:
+            task = self._inflight.get(key)
+            if task is not None:
+                # طلب جارٍ لنفس الملف: ننتظر نتيجته بدل جلب ثانٍ
+                result = (await asyncio.shield(task)).copy(input_url=url)
+                extractor.metrics.record_result(platform, result, time.perf_counter() - started, 'coalesced')
+                return result
+
+            task = asyncio.ensure_future(self._extract(url, platform, include_profile, deadline))
+            self._inflight[key] = task
+            try:
+                result = await asyncio.shield(task)
+            finally:
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+        except Exception as e:
+            result = ExtractionResult.failure(url, f'خطأ في الاستخراج: {str(e)}', error_class_of(e), platform=platform)
+
+        if result.error_class == 'timed_out':
+            result.timed_out = True
+        extractor.metrics.record_result(platform, result, time.perf_counter() - started)
+        return result
+
+    async def _extract(self, url: str, platform: str, include_profile: bool,
+                       deadline: Optional[Deadline] = None) -> ExtractionResult:
+        extractor = self.extractor
+        print(f"🔍 جاري استخراج الصورة من: {url}")
+
+        # الرابط الموحد للملف الشخصي
+        fetch_url = extractor.registry.canonical_url(url)
+
+        # جلب الصفحة
+        with extractor.metrics.stage('fetch', platform):
+            doc = await self._fetch_page(fetch_url, include_profile, deadline)
+
+        # التحليل عمل على المعالج فننقله خارج حلقة الأحداث
+        loop = asyncio.get_running_loop()
+        profile = None
+        if include_profile:
+            profile = await loop.run_in_executor(
+                None, extractor._timed_analysis, 'profile', platform, doc,
+                extractor.profile_analyzer.analyze_profile, doc, doc.url
+            )
+        avatars = await loop.run_in_executor(
+            None, extractor._timed_analysis, 'candidates', platform, doc, extractor._extract_avatars, doc
+        )
+        if doc.parse_seconds:
+            extractor.metrics.observe_stage('parse', platform, doc.parse_seconds)
+
+        if not avatars:
+            extractor.metrics.stage_failed('candidates', platform, 'no_candidates')
+            return extractor._with_profile(
+                ExtractionResult.failure(url, 'لم يتم العثور على صور', 'no_candidates', platform=platform), profile)
+
+        best_avatar, download_result = await self._resolve_best(avatars, platform, deadline)
+        return extractor._with_profile(extractor._build_result(url, best_avatar, download_result, platform), profile)
+
+    async def _fetch_page(self, url: str, need_head: bool = False, deadline: Optional[Deadline] = None) -> HtmlDocument:
+        """جلب الصفحة على دفعات حتى تكفي للاستخراج أو تبلغ max_page_bytes"""
+        extractor = self.extractor
+        platform_name = extractor.registry.detect(urlparse(url).netloc).name
+        async with self._request(url, platform_name, deadline) as response:
+            # صفحات الأخطاء ليست ملفات شخصية، لكن المنصة استجابت
+            if response.status >= 400:
+                raise FetchError(response.status, str(response.url))
+            platform = extractor.registry.detect(response.url.host or '')
+            decoder = codecs.getincrementaldecoder(response.charset or 'utf-8')(errors='replace')
+            tracker = PageStopTracker(platform, need_head)
+            received = 0
+            async for chunk in response.content.iter_chunked(65536):
+                received += len(chunk)
+                if deadline is not None:
+                    deadline.check()
+                if tracker.feed(decoder.decode(chunk)) or received >= extractor.max_page_bytes:
+                    break
+            else:
+                tracker.feed(decoder.decode(b'', final=True))
+            extractor.metrics.bytes_in.inc(received, stage='fetch', platform=platform.name)
+            return HtmlDocument(tracker.text(), str(response.url))
+
+    @contextlib.asynccontextmanager
+    async def _request(self, url: str, platform: str, deadline: Optional[Deadline] = None, **kwargs):
+        """مثل AvatarExtractor._request: نجاح القاطع يُسجل بعد قراءة الجسم داخل الكتلة"""
+        extractor = self.extractor
+        response, breaker = await self._send(url, platform, deadline, **kwargs)
+        try:
+            yield response
+        except DeadlineExceeded:
+            extractor._settle(breaker, 'release')
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            # انقطاع أثناء قراءة الجسم فشل للمنصة كفشل الاتصال
+            extractor._settle(breaker, 'record_failure')
+            raise
+        except Exception:
+            # رمز خطأ نهائي أو محتوى مرفوض: المنصة استجابت
+            extractor._settle(breaker, 'record_success')
+            raise
+        except BaseException:
+            # الإلغاء ليس فشلاً للمنصة لكنه يحرر محاولة نصف الفتح
+            extractor._settle(breaker, 'release')
+            raise
+        else:
+            extractor._settle(breaker, 'record_success')
+        finally:
+            response.release()
+
+    async def _send(self, url: str, platform: str, deadline: Optional[Deadline] = None, **kwargs):
+        """طلب GET بسياسة إعادة المحاولة وقاطع المستخرج المتزامن نفسيهما"""
+        extractor = self.extractor
+        client = await self._get_client()
+        breaker_key = extractor._breaker_key(url, platform)
+        breaker = extractor.breakers.get(breaker_key)
+        attempt = 0
+        while True:
+            timeout = timeout_within(deadline, self.timeout)
+            if not breaker.allow():
+                raise CircuitOpenError(breaker_key, breaker.retry_in())
+
+            try:
+                response = await client.get(url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if isinstance(e, asyncio.TimeoutError) and timeout < self.timeout and deadline.expired():
+                    # المهلة قصرت بسبب ميزانيتنا لا بسبب بطء المنصة
+                    breaker.release()
+                    raise DeadlineExceeded() from e
+                breaker.record_failure()
+                delay = extractor._retry_delay(attempt, deadline)
+                if delay is None:
+                    raise
+                reason = type(e).__name__
+            except Exception:
+                # إعادة توجيه لا تنتهي أو رابط غير صالح: لا يبقى القاطع نصف مفتوح إلى الأبد
+                breaker.record_failure()
+                raise
+            except BaseException:
+                breaker.release()
+                raise
+            else:
+                if not extractor.retry_policy.should_retry(response.status):
+                    return response, breaker
+
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                breaker.record_failure(retry_after)
+                delay = extractor._retry_delay(attempt, deadline, retry_after)
+                if delay is None:
+                    # انتهت المحاولات أو طلب الخادم انتظاراً طويلاً: يعالج المستدعي الحالة
+                    return response, None
+                response.release()
+                reason = f'http_{response.status}'
+
+            attempt += 1
+            extractor.metrics.retries.inc(platform=platform, reason=reason)
+            print(f"🔁 إعادة المحاولة {attempt} بعد {delay:.1f} ثانية ({reason}): {url}")
+            await asyncio.sleep(delay)
+
+    async def _resolve_best(self, avatars: List[Dict], platform: str,
+                            deadline: Optional[Deadline] = None) -> Tuple[Optional[Dict], Dict]:
+        """مثل AvatarExtractor._resolve_best: فحص المرشحين ثم تحميل الأفضل مع الانتقال للتالي عند الفشل"""
+        extractor = self.extractor
+        loop = asyncio.get_running_loop()
+        # الصور الصغيرة تصل كاملة في الفحص فلا يُعاد تحميلها
+        bodies = {}
+        with extractor.metrics.stage('selection', platform):
+            ranked = await self._rank(avatars, deadline, bodies)
+
+        download_result = {'success': False, 'error': 'لا توجد صور بجودة مناسبة'}
+        for candidate in ranked:
+            if candidate['url'] in bodies:
+                download_result = await loop.run_in_executor(
+                    None, extractor._image_from_probe, bodies[candidate['url']], platform)
+            else:
+                download_result = await self._download_image(candidate['url'], platform, deadline)
+            if download_result['success']:
+                return candidate, download_result
+            if deadline is not None and deadline.expired():
+                # لا وقت لتجربة بقية المرشحين
+                break
+            print(f"⚠️ فشل تحميل المرشح {candidate['url']}: {download_result.get('error')}")
+        return None, download_result
+
+    async def _rank(self, candidates: List[Dict], deadline: Optional[Deadline] = None,
+                    bodies: Optional[Dict] = None) -> List[Dict]:
+        """ترتيب CandidateResolver نفسه، والفحوص طلبات متزامنة على العميل المشترك"""
+        resolver = self.extractor.candidate_resolver
+        ranked, to_probe = resolver.probe_plan(candidates)
+        if not to_probe:
+            return ranked
+        results = await asyncio.gather(*(self._probe(candidate['url'], deadline) for candidate in to_probe))
+        return resolver.apply_probes(ranked, to_probe, results, bodies)
+
+    async def _probe(self, url: str, deadline: Optional[Deadline] = None):
+        """قراءة أول بايتات الصورة فقط لمعرفة أبعادها"""
+        resolver = self.extractor.candidate_resolver
+        try:
+            client = await self._get_client()
+            headers = {'Range': f'bytes=0-{resolver.probe_bytes - 1}'}
+            timeout = aiohttp.ClientTimeout(total=timeout_within(deadline, resolver.timeout))
+            async with client.get(url, headers=headers, timeout=timeout) as response:
+                if response.status not in (200, 206):
+                    return None, None
+                buffer = bytearray()
+                complete = True
+                # بعض الخوادم تتجاهل Range فنتوقف بأنفسنا
+                async for chunk in response.content.iter_chunked(8192):
+                    buffer += chunk
+                    if len(buffer) >= resolver.probe_bytes:
+                        complete = False
+                        break
+            return resolver.parse_probe(bytes(buffer), response.status, response.headers, complete)
+        except Exception:
+            return None, None
+
+    async def _download_image(self, url: str, platform: str = 'unknown',
+                              deadline: Optional[Deadline] = None) -> Dict:
+        """تحميل الصورة عبر إعادة المحاولة والقاطع، ثم معالجتها خارج حلقة الأحداث"""
+        extractor = self.extractor
+        started = time.perf_counter()
+        try:
+            async with self._request(url, platform, deadline) as response:
+                if response.status != 200:
+                    error_class = f'http_{response.status}'
+                    extractor.metrics.stage_failed('download', platform, error_class)
+                    return {'success': False, 'error': f'فشل التحميل: {response.status}', 'error_class': error_class}
+
+                # قراءة على دفعات مع رفض مبكر للصور الضخمة أو غير الصالحة
+                reader = extractor._image_reader(response.headers)
+                async for chunk in response.content.iter_chunked(65536):
+                    reader.feed(chunk)
+                    if deadline is not None:
+                        deadline.check()
+
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, extractor._finish_download, reader, response.headers, platform, started)
+
+        except Exception as e:
+            extractor.metrics.stage_failed('download', platform, error_class_of(e))
+            return {'success': False, 'error': f'خطأ في تحميل الصورة: {str(e)}', 'error_class': error_class_of(e)}
+
+    async def extract_many(self, urls: List[str], concurrency: int = 50) -> List[ExtractionResult]:
+        """استخراج عدة روابط بحد أقصى من الطلبات المتزامنة مع الحفاظ على الترتيب"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _run(url: str) -> ExtractionResult:
+            async with semaphore:
+                return await self.extract_avatar_async(url)
+
+        return await asyncio.gather(*(_run(url) for url in urls))
+
+# للاستخدام المباشر
+if __name__ == "__main__":
+    async def _main():
+        async with AsyncAvatarExtractor() as extractor:
+            return await extractor.extract_many(["https://youtube.com/@mivo1-l"])
+
+    results = asyncio.run(_main())
+    print(json.dumps(results, indent=2, ensure_ascii=False, default=json_default))
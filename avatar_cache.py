@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Avatar Cache - ذاكرة تخزين مؤقت لنتائج الاستخراج
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from platform_registry import default_registry
+
+def normalize_profile_url(url: str) -> str:
+    """توحيد رابط الملف الشخصي لاستخدامه كمفتاح: المنصة واسم المستخدم"""
+    return default_registry.canonical_key(url)
+
+class AvatarCache:
+    """تخزين مؤقت بطبقتين: LRU في الذاكرة و SQLite على القرص"""
+
+    DEFAULT_TTLS = {
+        'youtube': 24 * 3600,
+        'instagram': 6 * 3600,
+        'tiktok': 6 * 3600,
+        'twitter': 12 * 3600,
+        'generic': 3600,
+    }
+
+    def __init__(self, db_path: str = 'avatar_cache.sqlite3', max_memory_entries: int = 1024,
+                 max_disk_entries: int = 100000, ttls: Optional[Dict[str, int]] = None,
+                 default_ttl: int = 3600, registry=None):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttls = dict(self.DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.default_ttl = default_ttl
+        self.registry = registry or default_registry
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self._setup_db()
+
+    def _setup_db(self):
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS avatar_cache (
+                key TEXT PRIMARY KEY,
+                platform TEXT,
+                result TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS idx_avatar_cache_accessed ON avatar_cache (accessed_at)')
+        self.db.commit()
+
+    def ttl_for(self, platform: str) -> int:
+        """مدة الصلاحية حسب المنصة"""
+        return self.ttls.get(platform, self.default_ttl)
+
+    def get(self, url: str) -> Optional[Dict]:
+        """جلب مدخل من الذاكرة ثم من القرص"""
+        key = self.registry.canonical_key(url)
+        now = time.time()
+
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                return entry
+
+            row = self.db.execute(
+                'SELECT platform, result, etag, last_modified, stored_at, expires_at '
+                'FROM avatar_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            self.db.execute('UPDATE avatar_cache SET accessed_at = ? WHERE key = ?', (now, key))
+            self.db.commit()
+
+            entry = {
+                'platform': row[0],
+                'result': json.loads(row[1]),
+                'etag': row[2],
+                'last_modified': row[3],
+                'stored_at': row[4],
+                'expires_at': row[5],
+            }
+            self._remember(key, entry)
+            return entry
+
+    def put(self, url: str, result: Dict, etag: str = None, last_modified: str = None):
+        """حفظ نتيجة ناجحة في الطبقتين"""
+        key = self.registry.canonical_key(url)
+        platform = result.get('platform', 'generic')
+        now = time.time()
+        entry = {
+            'platform': platform,
+            'result': result,
+            'etag': etag,
+            'last_modified': last_modified,
+            'stored_at': now,
+            'expires_at': now + self.ttl_for(platform),
+        }
+
+        with self.lock:
+            self._remember(key, entry)
+            self.db.execute(
+                'INSERT OR REPLACE INTO avatar_cache '
+                '(key, platform, result, etag, last_modified, stored_at, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, platform, json.dumps(dict(result), ensure_ascii=False), etag, last_modified,
+                 now, entry['expires_at'], now)
+            )
+            self.db.commit()
+            self.writes += 1
+            if self.writes % 1000 == 0:
+                self._evict_disk()
+
+    def touch(self, url: str, entry: Dict):
+        """تمديد صلاحية مدخل بعد تأكيد عدم تغيّره (304)"""
+        key = self.registry.canonical_key(url)
+        now = time.time()
+        entry['expires_at'] = now + self.ttl_for(entry['platform'])
+
+        with self.lock:
+            self._remember(key, entry)
+            self.db.execute(
+                'UPDATE avatar_cache SET expires_at = ?, accessed_at = ? WHERE key = ?',
+                (entry['expires_at'], now, key)
+            )
+            self.db.commit()
+
+    def is_fresh(self, entry: Dict) -> bool:
+        """هل المدخل ما زال صالحاً"""
+        return entry['expires_at'] > time.time()
+
+    def _remember(self, key: str, entry: Dict):
+        """إضافة مدخل للذاكرة مع طرد الأقدم استخداماً"""
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """حذف الأقدم استخداماً عند تجاوز الحد على القرص"""
+        count = self.db.execute('SELECT COUNT(*) FROM avatar_cache').fetchone()[0]
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            self.db.execute(
+                'DELETE FROM avatar_cache WHERE key IN '
+                '(SELECT key FROM avatar_cache ORDER BY accessed_at LIMIT ?)', (excess,)
+            )
+            self.db.commit()
+
+    def close(self):
+        """إغلاق قاعدة البيانات"""
+        with self.lock:
+            self.db.close()
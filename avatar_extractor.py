@@ -1,358 +1,492 @@
-
 # -*- coding: utf-8 -*-
 """
 Avatar Extractor - مستخرج الصور
 """
 
+import contextlib
 import requests
-from bs4 import BeautifulSoup
-import re
+from requests.adapters import HTTPAdapter
 import json
 from urllib.parse import urlparse
 import time
-import random
 import base64
-import io
-from PIL import Image
-import os
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+from html_document import HtmlDocument
+from candidate_resolver import CandidateResolver
+from image_pipeline import BoundedImageReader, ImagePipeline
+from circuit_breaker import CircuitBreakerRegistry, CircuitOpenError, FetchError, RetryPolicy, parse_retry_after
+from deadline import Deadline, DeadlineExceeded, timeout_within
+from metrics import default_metrics, error_class_of
+from page_stream import read_page
+from platform_registry import clean_url, default_registry
+from profile_analyzer import ProfileAnalyzer
+from records import ExtractionResult, json_default
+from request_coalescer import RequestCoalescer
 
 class AvatarExtractor:
-    def __init__(self):
+    def __init__(self, pool_size: int = 32, cache=None, image_store=None,
+                 stream_pages: bool = True, max_page_bytes: int = 4 * 1024 * 1024, registry=None,
+                 image_pipeline: ImagePipeline = None, transcode_pool=None,
+                 max_image_bytes: int = 8 * 1024 * 1024, metrics=None, profiler=None,
+                 retry_policy: RetryPolicy = None, breakers: CircuitBreakerRegistry = None):
         self.session = requests.Session()
+        self.pool_size = pool_size
+        self.registry = registry or default_registry
+        # قراءة الصفحة على دفعات والتوقف عند إيجاد الصور أو بلوغ الحد
+        self.stream_pages = stream_pages
+        self.max_page_bytes = max_page_bytes
+        # AvatarCache اختياري لتجنب إعادة الجلب
+        self.cache = cache
+        # ImageStore اختياري: تُحفظ الصور على القرص بدل base64
+        self.image_store = image_store
+        self.image_pipeline = image_pipeline or ImagePipeline()
+        self.max_image_bytes = max_image_bytes
+        # TranscodePool اختياري لنقل معالجة الصور إلى عمليات منفصلة
+        self.transcode_pool = transcode_pool
+        self.profile_analyzer = ProfileAnalyzer(self.registry)
+        self.candidate_resolver = CandidateResolver(self.session, probe_workers=pool_size)
+        # ExtractionMetrics لزمن المراحل والعدادات، و SlowRequestProfiler اختياري
+        self.metrics = metrics or default_metrics
+        self.profiler = profiler
+        # الطلبات المتزامنة على نفس الملف الشخصي تشترك في جلب واحد
+        self.coalescer = RequestCoalescer()
+        # إعادة المحاولة للحالات المؤقتة، وقاطع لكل منصة يوقفها بعد فشل متكرر
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breakers = breakers or CircuitBreakerRegistry()
         self._setup_session()
     
     def _setup_session(self):
+        # مجمع اتصالات يكفي للعمال المتزامنين
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'image/webp,image/apng,image/avif,image/*,*/*;q=0.8',
         })
     
-    def extract_avatar(self, url: str) -> Dict:
-        """استخراج الصورة من الرابط"""
+    def extract_avatar(self, url: str, include_profile: bool = False,
+                       deadline: Optional[Deadline] = None) -> ExtractionResult:
+        """استخراج الصورة من الرابط، ومعها بيانات الملف الشخصي عند الطلب، ضمن deadline اختياري"""
+        started = time.perf_counter()
+        platform = self._platform_for(url)
         try:
             print(f"🔍 جاري استخراج الصورة من: {url}")
             
-            # تنظيف الرابط
-            clean_url = self._clean_url(url)
-            
-            # جلب الصفحة
-            response = self.session.get(clean_url, timeout=15)
-            html = response.text
-            final_url = response.url
-            
-            # استخراج الصور
-            avatars = self._extract_avatars(html, final_url)
-            
-            if not avatars:
-                return {'success': False, 'error': 'لم يتم العثور على صور', 'input_url': url}
-            
-            # اختيار أفضل صورة
-            best_avatar = self._select_best_avatar(avatars)
-            
-            if not best_avatar:
-                return {'success': False, 'error': 'لا توجد صور بجودة مناسبة', 'input_url': url}
+            # من التخزين المؤقت
+            if self.cache is not None:
+                cached_result = self._lookup_cache(url, deadline)
+                if cached_result and (not include_profile or 'profile' in cached_result):
+                    self.metrics.record_result(platform, cached_result, time.perf_counter() - started, 'cache_hit')
+                    return cached_result
             
-            # تحميل الصورة
-            download_result = self._download_image(best_avatar['url'])
-            
-            if download_result['success']:
-                result = {
-                    'success': True,
-                    'input_url': url,
-                    'platform': best_avatar.get('platform', 'unknown'),
-                    'avatar_url': best_avatar['url'],
-                    'base64_data': download_result['base64_data'],
-                    'resolution': download_result['resolution'],
-                    'file_size': download_result['file_size'],
-                    'format': download_result['format']
-                }
-                print(f"✅ تم استخراج الصورة بنجاح من {url}")
+            key = (self.registry.canonical_key(url), include_profile)
+            result, shared = self.coalescer.run(
+                key, lambda: self._profiled_extract(url, platform, include_profile, deadline),
+                timeout=deadline.remaining() if deadline is not None else None
+            )
+            if shared and result.get('timed_out') and not (deadline is not None and deadline.expired()):
+                # انتهت مهلة الطلب الذي التحقنا به لا مهلتنا: نجلب بأنفسنا
+                result, shared = self._profiled_extract(url, platform, include_profile, deadline), False
+            if shared:
+                print(f"🔗 تم دمج الطلب مع طلب جارٍ لنفس الملف: {url}")
+                result = result.copy(input_url=url)
+                self.metrics.record_result(platform, result, time.perf_counter() - started, 'coalesced')
                 return result
-            else:
-                return {'success': False, 'error': download_result['error'], 'input_url': url}
                 
         except Exception as e:
-            return {'success': False, 'error': f'خطأ في الاستخراج: {str(e)}', 'input_url': url}
+            result = ExtractionResult.failure(url, f'خطأ في الاستخراج: {str(e)}', error_class_of(e), platform=platform)
+        
+        if result.error_class == 'timed_out':
+            result.timed_out = True
+        self.metrics.record_result(platform, result, time.perf_counter() - started)
+        return result
     
-    def _clean_url(self, url: str) -> str:
-        """تنظيف الرابط"""
-        url = url.strip()
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
-        return url
+    def _profiled_extract(self, url: str, platform: str, include_profile: bool,
+                          deadline: Optional[Deadline] = None) -> ExtractionResult:
+        if self.profiler is not None:
+            with self.profiler.sample(f'{platform}-{url}'):
+                return self._extract(url, platform, include_profile, deadline)
+        return self._extract(url, platform, include_profile, deadline)
     
-    def _extract_avatars(self, html: str, url: str) -> List[Dict]:
-        """استخراج جميع الصور المتاحة"""
-        hostname = urlparse(url).netloc.lower()
+    def _extract(self, url: str, platform: str, include_profile: bool,
+                 deadline: Optional[Deadline] = None) -> ExtractionResult:
+        """جلب الصفحة واستخراج الصورة مع قياس زمن كل مرحلة"""
+        profile, avatars = self._fetch_candidates(url, platform, include_profile, deadline)
         
-        if 'youtube' in hostname:
-            return self._extract_youtube_avatars(html, url)
-        elif 'instagram' in hostname:
-            return self._extract_instagram_avatars(html)
-        elif 'tiktok' in hostname:
-            return self._extract_tiktok_avatars(html)
-        elif 'twitter' in hostname or 'x.com' in hostname:
-            return self._extract_twitter_avatars(html)
-        else:
-            return self._extract_generic_avatars(html, url)
-    
-    def _extract_youtube_avatars(self, html: str, url: str) -> List[Dict]:
-        """استخراج صور YouTube"""
-        avatars = []
+        if not avatars:
+            self.metrics.stage_failed('candidates', platform, 'no_candidates')
+            return self._with_profile(
+                ExtractionResult.failure(url, 'لم يتم العثور على صور', 'no_candidates', platform=platform), profile)
         
-        try:
-            # من ytInitialData
-            yt_data_match = re.search(r'var ytInitialData\s*=\s*({.+?});', html)
-            if yt_data_match:
-                yt_data = json.loads(yt_data_match.group(1))
-                
-                thumbnail_paths = [
-                    'metadata.channelMetadataRenderer.avatar.thumbnails',
-                    'microformat.channelMicroformatRenderer.thumbnail.thumbnails',
-                ]
-                
-                for path in thumbnail_paths:
-                    thumbnails = self._get_nested_value(yt_data, path)
-                    if thumbnails:
-                        for thumb in thumbnails:
-                            if thumb.get('url'):
-                                enhanced_url = self._enhance_youtube_url(thumb['url'])
-                                avatars.append({
-                                    'url': enhanced_url,
-                                    'width': thumb.get('width', 0),
-                                    'height': thumb.get('height', 0),
-                                    'platform': 'youtube',
-                                    'quality': max(thumb.get('width', 0), thumb.get('height', 0))
-                                })
-            
-            # من meta tags
-            soup = BeautifulSoup(html, 'html.parser')
-            og_image = soup.find('meta', property='og:image')
-            if og_image and og_image.get('content'):
-                meta_url = og_image['content']
-                enhanced_url = self._enhance_youtube_url(meta_url)
-                avatars.append({
-                    'url': enhanced_url,
-                    'width': 300,
-                    'height': 300,
-                    'platform': 'youtube',
-                    'quality': 300
-                })
-            
-        except Exception as e:
-            print(f"⚠️ خطأ في استخراج YouTube: {e}")
+        best_avatar, download_result = self._resolve_best(avatars, platform, deadline)
+        result = self._with_profile(self._build_result(url, best_avatar, download_result, platform), profile)
         
-        return avatars
+        if self.cache is not None and result.success:
+            self.cache.put(url, result, download_result.get('etag'), download_result.get('last_modified'))
+        
+        return result
     
-    def _extract_instagram_avatars(self, html: str) -> List[Dict]:
-        """استخراج صور Instagram"""
-        avatars = []
+    def _fetch_candidates(self, url: str, platform: str, include_profile: bool = False,
+                          deadline: Optional[Deadline] = None) -> Tuple[Optional[Dict], List[Dict]]:
+        """جلب الصفحة وإرجاع بيانات الملف الشخصي (عند الطلب) والصور المرشحة"""
+        # الرابط الموحد للملف الشخصي بدل صيغ الجوال والاستعلامات الزائدة
+        fetch_url = self.registry.canonical_url(url)
         
-        try:
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # من JSON المضمن
-            json_patterns = [
-                r'"profile_pic_url_hd"\s*:\s*"([^"]+)"',
-                r'"profile_pic_url"\s*:\s*"([^"]+)"',
-            ]
-            
-            for pattern in json_patterns:
-                matches = re.findall(pattern, html)
-                for match in matches:
-                    if 'http' in match:
-                        clean_url = match.replace('\\u0026', '&')
-                        avatars.append({
-                            'url': clean_url,
-                            'width': 1080,
-                            'height': 1080,
-                            'platform': 'instagram',
-                            'quality': 1080
-                        })
-            
-            # من meta tags
-            og_image = soup.find('meta', property='og:image')
-            if og_image and og_image.get('content'):
-                meta_url = og_image['content']
-                hd_url = meta_url.replace('150x150', '1080x1080')
-                avatars.append({
-                    'url': hd_url,
-                    'width': 1080,
-                    'height': 1080,
-                    'platform': 'instagram',
-                    'quality': 1080
-                })
-            
-        except Exception as e:
-            print(f"⚠️ خطأ في استخراج Instagram: {e}")
+        # جلب الصفحة وتحليلها مرة واحدة للمستخرجات ومحلل الملف الشخصي
+        with self.metrics.stage('fetch', platform):
+            doc = self._fetch_page(fetch_url, include_profile, deadline)
+        
+        profile = None
+        if include_profile:
+            profile = self._timed_analysis('profile', platform, doc, self.profile_analyzer.analyze_profile, doc, doc.url)
         
-        return avatars
+        # استخراج الصور
+        avatars = self._timed_analysis('candidates', platform, doc, self._extract_avatars, doc)
+        if doc.parse_seconds:
+            self.metrics.observe_stage('parse', platform, doc.parse_seconds)
+        return profile, avatars
     
-    def _extract_tiktok_avatars(self, html: str) -> List[Dict]:
-        """استخراج صور TikTok"""
-        avatars = []
+    def _resolve_best(self, avatars: List[Dict], platform: str,
+                      deadline: Optional[Deadline] = None) -> Tuple[Optional[Dict], Dict]:
+        """اختيار أفضل صورة وتحميلها، مع الانتقال للمرشح التالي عند الفشل"""
+        # الصور الصغيرة تصل كاملة في الفحص فلا يُعاد تحميلها
+        bodies = {}
+        with self.metrics.stage('selection', platform):
+            ranked = self.candidate_resolver.rank(avatars, deadline, bodies)
         
-        try:
-            # البحث في JSON المضمن
-            json_patterns = [
-                r'"avatarLarger"\s*:\s*"([^"]+)"',
-                r'"avatarMedium"\s*:\s*"([^"]+)"',
-            ]
-            
-            for pattern in json_patterns:
-                matches = re.findall(pattern, html)
-                for match_url in matches:
-                    if 'http' in match_url:
-                        clean_url = match_url.replace('\\u0026', '&')
-                        quality = 1000 if 'Larger' in pattern else 300
-                        avatars.append({
-                            'url': clean_url,
-                            'width': quality,
-                            'height': quality,
-                            'platform': 'tiktok',
-                            'quality': quality
-                        })
-            
-        except Exception as e:
-            print(f"⚠️ خطأ في استخراج TikTok: {e}")
+        def download(candidate_url: str) -> Dict:
+            if candidate_url in bodies:
+                return self._image_from_probe(bodies[candidate_url], platform)
+            return self._download_image(candidate_url, platform=platform, deadline=deadline)
         
-        return avatars
+        return self.candidate_resolver.resolve_ranked(ranked, download, deadline)
     
-    def _extract_twitter_avatars(self, html: str) -> List[Dict]:
-        """استخراج صور Twitter/X"""
-        avatars = []
-        
+    def _timed_analysis(self, stage: str, platform: str, doc: HtmlDocument, func, *args):
+        """قياس مرحلة تعمل على المستند دون احتساب زمن بناء الشجرة فيها"""
+        parse_before = doc.parse_seconds
+        started = time.perf_counter()
         try:
-            patterns = [
-                r'"profile_image_url_https":"([^"]+)"',
-            ]
-            
-            for pattern in patterns:
-                matches = re.findall(pattern, html)
-                for match_url in matches:
-                    if 'http' in match_url:
-                        clean_url = match_url.replace('\\u0026', '&')
-                        hd_url = clean_url.replace('_normal', '').replace('_bigger', '')
-                        avatars.append({
-                            'url': hd_url,
-                            'width': 400,
-                            'height': 400,
-                            'platform': 'twitter',
-                            'quality': 400
-                        })
-            
+            return func(*args)
         except Exception as e:
-            print(f"⚠️ خطأ في استخراج Twitter: {e}")
-        
-        return avatars
+            self.metrics.stage_failed(stage, platform, error_class_of(e))
+            raise
+        finally:
+            # زمن بناء الشجرة يُسجل مرة واحدة في مرحلة parse
+            elapsed = time.perf_counter() - started - (doc.parse_seconds - parse_before)
+            self.metrics.observe_stage(stage, platform, elapsed)
     
-    def _extract_generic_avatars(self, html: str, url: str) -> List[Dict]:
-        """استخراج صور عامة"""
-        avatars = []
+    def _lookup_cache(self, url: str, deadline: Optional[Deadline] = None) -> Optional[ExtractionResult]:
+        """إرجاع نتيجة مخزنة، مع إعادة التحقق الشرطي إذا انتهت صلاحيتها"""
+        entry = self.cache.get(url)
+        if not entry:
+            return None
         
-        try:
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # من meta tags
-            og_image = soup.find('meta', property='og:image')
-            if og_image and og_image.get('content'):
-                avatars.append({
-                    'url': og_image['content'],
-                    'width': 500,
-                    'height': 500,
-                    'platform': 'generic',
-                    'quality': 500
-                })
-            
-        except Exception as e:
-            print(f"⚠️ خطأ في استخراج الصور العامة: {e}")
+        cached_result = ExtractionResult.from_dict(entry['result'], input_url=url)
+        if self.cache.is_fresh(entry):
+            print(f"💾 من التخزين المؤقت: {url}")
+            return cached_result
         
-        return avatars
-    
-    def _enhance_youtube_url(self, url: str) -> str:
-        """تحسين رابط YouTube"""
-        if not url or 'ytimg.com' not in url:
-            return url
+        if not entry.get('etag') and not entry.get('last_modified'):
+            return None
+        
+        # طلب شرطي على رابط الصورة نفسه
+        download_result = self._download_image(
+            cached_result['avatar_url'],
+            etag=entry.get('etag'),
+            last_modified=entry.get('last_modified'),
+            platform=cached_result.get('platform', 'unknown'),
+            deadline=deadline
+        )
+        if download_result.get('not_modified'):
+            print(f"💾 الصورة لم تتغير (304): {url}")
+            self.cache.touch(url, entry)
+            return cached_result
         
-        enhancements = [
-            ('s88-c-k', 's800-c-k'),
-            ('s100-c-k', 's800-c-k'),
-            ('s176-c-k', 's800-c-k'),
-        ]
+        if download_result['success']:
+            best_avatar = {'url': cached_result['avatar_url'], 'platform': cached_result.get('platform')}
+            result = self._build_result(url, best_avatar, download_result)
+            self.cache.put(url, result, download_result.get('etag'), download_result.get('last_modified'))
+            return result
         
-        enhanced_url = url
-        for old, new in enhancements:
-            if old in enhanced_url:
-                enhanced_url = enhanced_url.replace(old, new)
-                break
+        return None
+    
+    def _fetch_page(self, url: str, need_head: bool = False, deadline: Optional[Deadline] = None) -> HtmlDocument:
+        """جلب الصفحة كاملة أو على دفعات حتى تكفي للاستخراج"""
+        platform_name = self.registry.detect(urlparse(url).netloc).name
+        if not self.stream_pages:
+            with self._request(url, platform_name, deadline, timeout=15) as response:
+                self._raise_for_status(response)
+                platform = self.registry.detect(urlparse(response.url).netloc)
+                self.metrics.bytes_in.inc(len(response.content), stage='fetch', platform=platform.name)
+                return HtmlDocument(response.text, response.url)
         
-        return enhanced_url
+        # الخروج من الكتلة يغلق الاتصال ويوقف تنزيل بقية الصفحة
+        with self._request(url, platform_name, deadline, timeout=15, stream=True) as response:
+            # صفحات 429 و 503 والأخطاء ليست ملفات شخصية
+            self._raise_for_status(response)
+            platform = self.registry.detect(urlparse(response.url).netloc)
+            html, stats = read_page(response, platform, self.max_page_bytes, need_head=need_head, deadline=deadline)
+            self.metrics.bytes_in.inc(stats['bytes_read'], stage='fetch', platform=platform.name)
+            return HtmlDocument(html, response.url)
+    
+    @contextlib.contextmanager
+    def _request(self, url: str, platform: str, deadline: Optional[Deadline] = None, **kwargs):
+        """استجابة GET مع إعادة المحاولة؛ نجاح القاطع يُسجل بعد قراءة الجسم داخل الكتلة لا عند وصول الترويسات"""
+        response, breaker = self._send(url, platform, deadline, **kwargs)
+        try:
+            yield response
+        except DeadlineExceeded:
+            self._settle(breaker, 'release')
+            raise
+        except (requests.RequestException, OSError):
+            # انقطاع أثناء قراءة الجسم فشل للمنصة كفشل الاتصال
+            self._settle(breaker, 'record_failure')
+            raise
+        except Exception:
+            # رمز خطأ نهائي أو محتوى مرفوض: المنصة استجابت
+            self._settle(breaker, 'record_success')
+            raise
+        except BaseException:
+            self._settle(breaker, 'release')
+            raise
+        else:
+            self._settle(breaker, 'record_success')
+        finally:
+            response.close()
     
-    def _get_nested_value(self, obj, path: str):
-        """الحصول على قيمة من JSON متداخل"""
-        keys = path.split('.')
-        current = obj
-        for key in keys:
-            if isinstance(current, dict) and key in current:
-                current = current[key]
-            elif isinstance(current, list) and key.isdigit():
-                index = int(key)
-                if 0 <= index < len(current):
-                    current = current[index]
-                else:
-                    return None
+    def _settle(self, breaker, outcome: str):
+        # None: سُجلت نتيجة المحاولة مسبقاً (استجابة مؤقتة انتهت محاولاتها)
+        if breaker is not None:
+            getattr(breaker, outcome)()
+    
+    def _send(self, url: str, platform: str, deadline: Optional[Deadline] = None, **kwargs):
+        """طلب GET مع إعادة المحاولة للحالات المؤقتة واحترام قاطع المنصة والمهلة المتبقية"""
+        breaker_key = self._breaker_key(url, platform)
+        breaker = self.breakers.get(breaker_key)
+        default_timeout = kwargs.pop('timeout', 15)
+        attempt = 0
+        while True:
+            timeout = timeout_within(deadline, default_timeout)
+            if not breaker.allow():
+                raise CircuitOpenError(breaker_key, breaker.retry_in())
+            
+            try:
+                response = self.session.get(url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if isinstance(e, requests.Timeout) and timeout < default_timeout and deadline.expired():
+                    # المهلة قصرت بسبب ميزانيتنا لا بسبب بطء المنصة
+                    breaker.release()
+                    raise DeadlineExceeded() from e
+                breaker.record_failure()
+                delay = self._retry_delay(attempt, deadline)
+                if delay is None:
+                    raise
+                reason = type(e).__name__
+            except Exception:
+                # إعادة توجيه لا تنتهي أو رابط غير صالح: لا يبقى القاطع نصف مفتوح إلى الأبد
+                breaker.record_failure()
+                raise
+            except BaseException:
+                breaker.release()
+                raise
             else:
-                return None
-        return current
+                if not self.retry_policy.should_retry(response.status_code):
+                    return response, breaker
+                
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                breaker.record_failure(retry_after)
+                delay = self._retry_delay(attempt, deadline, retry_after)
+                if delay is None:
+                    # انتهت المحاولات أو طلب الخادم انتظاراً طويلاً: يعالج المستدعي الحالة
+                    return response, None
+                response.close()
+                reason = f'http_{response.status_code}'
+            
+            attempt += 1
+            self.metrics.retries.inc(platform=platform, reason=reason)
+            print(f"🔁 إعادة المحاولة {attempt} بعد {delay:.1f} ثانية ({reason}): {url}")
+            time.sleep(delay)
     
-    def _select_best_avatar(self, avatars: List[Dict]) -> Dict:
-        """اختيار أفضل صورة"""
-        if not avatars:
+    def _retry_delay(self, attempt: int, deadline: Optional[Deadline], retry_after: Optional[float] = None) -> Optional[float]:
+        """تأخير المحاولة التالية، أو None إذا لم تتسع لها المهلة المتبقية"""
+        delay = self.retry_policy.delay_for(attempt, retry_after)
+        if delay is not None and deadline is not None and delay >= deadline.remaining():
             return None
+        return delay
+    
+    def _breaker_key(self, url: str, platform: str) -> str:
+        """قاطع لكل منصة، ولكل نطاق في المواقع العامة حتى لا يوقف موقع متعثر بقية المواقع"""
+        return self._site_key(url, platform)
+    
+    def _site_key(self, url: str, platform: Optional[str] = None) -> str:
+        """اسم المنصة المعروفة، أو النطاق للمواقع العامة: مفتاح القاطع وحد المعدل"""
+        platform = platform or self._platform_for(url)
+        if platform in (self.registry.fallback.name, 'unknown'):
+            return urlparse(self._clean_url(url)).netloc.lower()
+        return platform
+    
+    def _raise_for_status(self, response):
+        if response.status_code >= 400:
+            response.close()
+            raise FetchError(response.status_code, response.url)
+    
+    def _with_profile(self, result: ExtractionResult, profile: Dict) -> ExtractionResult:
+        """إرفاق بيانات الملف الشخصي بالنتيجة إن طُلبت"""
+        if profile is not None:
+            result.profile = profile
+        return result
+    
+    def _build_result(self, url: str, best_avatar: Dict, download_result: Dict,
+                      platform: Optional[str] = None) -> ExtractionResult:
+        """بناء نتيجة الاستخراج من نتيجة التحميل؛ platform للنتيجة الفاشلة حتى تُحتسب في منصتها"""
+        if download_result['success']:
+            result = ExtractionResult(
+                success=True,
+                input_url=url,
+                platform=best_avatar.get('platform', 'unknown'),
+                avatar_url=best_avatar['url'],
+                resolution=download_result['resolution'],
+                file_size=download_result['file_size'],
+                format=download_result['format'],
+                image_hash=download_result.get('image_hash'),
+                base64_data=download_result.get('base64_data'),
+                variants=download_result.get('variants')
+            )
+            print(f"✅ تم استخراج الصورة بنجاح من {url}")
+            return result
+        else:
+            return ExtractionResult.failure(
+                url, download_result['error'], download_result.get('error_class', 'no_candidates'),
+                platform=platform or (best_avatar or {}).get('platform'))
+    
+    def _platform_for(self, url: str) -> str:
+        """اسم المنصة من الرابط قبل جلبه"""
+        return self.registry.detect(urlparse(self._clean_url(url)).netloc).name
+    
+    def _clean_url(self, url: str) -> str:
+        """تنظيف الرابط"""
+        return clean_url(url)
+    
+    def _extract_avatars(self, doc: HtmlDocument) -> List[Dict]:
+        """استخراج جميع الصور المتاحة"""
+        platform = self.registry.detect(urlparse(doc.url).netloc)
         
-        sorted_avatars = sorted(avatars, key=lambda x: x.get('quality', 0), reverse=True)
-        return sorted_avatars[0] if sorted_avatars else None
+        try:
+            return platform.extract_candidates(doc)
+        except Exception as e:
+            print(f"⚠️ خطأ في استخراج {platform.name}: {e}")
+            return []
     
-    def _download_image(self, url: str) -> Dict:
-        """تحميل الصورة"""
+    def _download_image(self, url: str, etag: str = None, last_modified: str = None,
+                        platform: str = 'unknown', deadline: Optional[Deadline] = None) -> Dict:
+        """تحميل الصورة، مع طلب شرطي عند توفر ETag أو Last-Modified"""
+        started = time.perf_counter()
         try:
-            response = self.session.get(url, timeout=15, stream=True)
-            if response.status_code != 200:
-                return {'success': False, 'error': f'فشل التحميل: {response.status_code}'}
+            headers = {}
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
             
-            image_data = response.content
-            img = Image.open(io.BytesIO(image_data))
-            
-            # تحسين الجودة إذا كانت صغيرة
-            if max(img.size) < 400:
-                img = img.resize((800, 800), Image.Resampling.LANCZOS)
-            
-            # تحويل إلى JPEG
-            if img.mode in ('RGBA', 'LA'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                background.paste(img, mask=img.split()[-1])
-                img = background
+            with self._request(url, platform, deadline, timeout=15, stream=True, headers=headers) as response:
+                if response.status_code == 304 and headers:
+                    return {'success': True, 'not_modified': True}
+                if response.status_code != 200:
+                    error_class = f'http_{response.status_code}'
+                    self.metrics.stage_failed('download', platform, error_class)
+                    return {'success': False, 'error': f'فشل التحميل: {response.status_code}', 'error_class': error_class}
+                
+                # قراءة على دفعات مع رفض مبكر للصور الضخمة أو غير الصالحة
+                reader = self._image_reader(response.headers)
+                for chunk in response.iter_content(chunk_size=65536):
+                    reader.feed(chunk)
+                    if deadline is not None:
+                        deadline.check()
             
-            buffered = io.BytesIO()
-            img.save(buffered, format='JPEG', quality=95)
-            final_image_data = buffered.getvalue()
+            return self._finish_download(reader, response.headers, platform, started)
             
-            img_base64 = base64.b64encode(final_image_data).decode()
+        except Exception as e:
+            self.metrics.stage_failed('download', platform, error_class_of(e))
+            return {'success': False, 'error': f'خطأ في تحميل الصورة: {str(e)}', 'error_class': error_class_of(e)}
+    
+    def _image_from_probe(self, body: Tuple[bytes, Dict], platform: str = 'unknown') -> Dict:
+        """نتيجة التحميل من بايتات الفحص، بنفس حدود الحجم والنوع"""
+        started = time.perf_counter()
+        image_data, headers = body
+        try:
+            reader = self._image_reader(headers)
+            reader.feed(image_data)
+            return self._finish_download(reader, headers, platform, started)
+        except Exception as e:
+            self.metrics.stage_failed('download', platform, error_class_of(e))
+            return {'success': False, 'error': f'خطأ في تحميل الصورة: {str(e)}', 'error_class': error_class_of(e)}
+    
+    def _finish_download(self, reader: BoundedImageReader, headers, platform: str, started: float) -> Dict:
+        self.metrics.bytes_in.inc(reader.received, stage='download', platform=platform)
+        self.metrics.observe_stage('download', platform, time.perf_counter() - started)
+        
+        result = self._process_image(reader, platform)
+        result['etag'] = headers.get('ETag')
+        result['last_modified'] = headers.get('Last-Modified')
+        return result
+    
+    def _image_reader(self, headers) -> BoundedImageReader:
+        """قارئ محدود الحجم والأبعاد لجسم الصورة"""
+        return BoundedImageReader(
+            self.max_image_bytes,
+            self.image_pipeline.max_pixels,
+            content_type=headers.get('Content-Type'),
+            content_length=headers.get('Content-Length')
+        )
+    
+    def _process_image(self, reader: BoundedImageReader, platform: str = 'unknown') -> Dict:
+        """تمرير الصورة أو إعادة ترميزها عبر ImagePipeline"""
+        started = time.perf_counter()
+        # القارئ يسلم البايتات ولا يحتفظ بها، فهذه المرجعية الوحيدة للأصل
+        image_data = reader.getvalue()
+        try:
+            if self.transcode_pool is not None:
+                processed = self.transcode_pool.process(image_data)
+            else:
+                processed = self.image_pipeline.process(image_data)
+            # لا يبقى الأصل مع الناتج المعاد ترميزه أثناء الحفظ أو ترميز base64
+            del image_data
+            self.metrics.observe_stage('transcode', platform, time.perf_counter() - started)
             
-            return {
+            result = {
                 'success': True,
-                'base64_data': f"data:image/jpeg;base64,{img_base64}",
-                'resolution': img.size,
-                'file_size': len(final_image_data),
-                'format': 'JPEG'
+                'resolution': processed['resolution'],
+                'file_size': len(processed['data']),
+                'format': processed['format']
             }
+            result.update(self._store_image(processed))
+            
+            bytes_out = len(processed['data'])
+            if 'variants' in processed:
+                result['variants'] = [
+                    dict(self._store_image(variant), size=variant['size'], resolution=variant['resolution'])
+                    for variant in processed['variants']
+                ]
+                bytes_out += sum(len(variant['data']) for variant in processed['variants'])
+            self.metrics.bytes_out.inc(bytes_out, platform=platform)
+            
+            return result
             
         except Exception as e:
-            return {'success': False, 'error': f'خطأ في تحميل الصورة: {str(e)}'}
+            self.metrics.stage_failed('transcode', platform, error_class_of(e))
+            return {'success': False, 'error': f'خطأ في تحميل الصورة: {str(e)}', 'error_class': error_class_of(e)}
+    
+    def _store_image(self, processed: Dict) -> Dict:
+        """حفظ الصورة في المخزن أو ترميزها base64"""
+        if self.image_store is not None:
+            return {'image_hash': self.image_store.put(processed['data'])}
+        
+        img_base64 = base64.b64encode(processed['data']).decode()
+        return {'base64_data': f"data:{processed['mime']};base64,{img_base64}"}
 
 # للاستخدام المباشر
 if __name__ == "__main__":
     extractor = AvatarExtractor()
     result = extractor.extract_avatar("https://youtube.com/@mivo1-l")
-    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(json.dumps(result, indent=2, ensure_ascii=False, default=json_default))
@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+"""
+Batch Engine - محرك المعالجة المتزامنة للدفعات
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import (FIRST_COMPLETED, Future, InvalidStateError, ThreadPoolExecutor, TimeoutError,
+                                as_completed, wait)
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from deadline import Deadline
+from records import ExtractionResult, as_result
+
+class TokenBucket:
+    """دلو رموز لتنظيم وتيرة الطلبات"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """حجز رمز دون انتظار: المدة حتى يحين دوره، أو None إذا تجاوزت max_wait"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            # الحجز المسبق يجعل الانتظار بترتيب الوصول
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            if max_wait is not None and wait > max_wait:
+                # إعادة الرمز حتى لا يتأخر من بعدنا بسبب طلب لن يُنفذ
+                self.tokens += 1
+                return None
+            return wait
+
+    def refund(self):
+        """إعادة رمز محجوز لطلب أُلغي قبل دوره"""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def acquire(self, cancel_event: Optional[threading.Event] = None, max_wait: Optional[float] = None) -> bool:
+        """حجز رمز والانتظار حتى يحين دوره أو يُلغى الطلب؛ False إذا تجاوز الانتظار max_wait"""
+        wait = self.reserve(max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            if cancel_event is not None:
+                cancel_event.wait(wait)
+            else:
+                time.sleep(wait)
+        return True
+
+class DelayedDispatcher:
+    """خيط واحد يرسل الأعمال إلى العمال عند حلول دورها، فلا ينام عامل بانتظار دور منصة"""
+
+    # أقصى نوم قبل فحص الأعمال الملغاة، حتى لا تنتظر دفعة ملغاة دور منصة بطيئة
+    POLL_INTERVAL = 0.5
+
+    def __init__(self):
+        self.heap = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def call_at(self, due: float, callback: Callable[[], None], cancel_event: Optional[threading.Event] = None):
+        """تنفيذ callback عند due (بساعة monotonic)، أو فور ضبط cancel_event"""
+        with self.condition:
+            heapq.heappush(self.heap, (due, next(self.sequence), callback, cancel_event))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name='rate-dispatcher')
+                self.thread.start()
+            self.condition.notify()
+
+    def _next_ready(self):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if self.heap and self.heap[0][0] <= now:
+                    return heapq.heappop(self.heap)[2]
+                for i, (_, _, callback, cancel_event) in enumerate(self.heap):
+                    if cancel_event is not None and cancel_event.is_set():
+                        self.heap[i] = self.heap[-1]
+                        self.heap.pop()
+                        heapq.heapify(self.heap)
+                        return callback
+                timeout = min(self.heap[0][0] - now, self.POLL_INTERVAL) if self.heap else None
+                self.condition.wait(timeout)
+
+    def _run(self):
+        while True:
+            callback = self._next_ready()
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ خطأ في إرسال عمل مؤجل: {e}")
+
+def _chain(inner: Future, outer: Future):
+    """نقل نتيجة العمل الفعلي إلى المستقبل المعاد للمستدعي، وإلغاؤه بإلغائه"""
+    def copy(future: Future):
+        try:
+            if future.cancelled():
+                outer.cancel()
+            elif future.exception() is not None:
+                outer.set_exception(future.exception())
+            else:
+                outer.set_result(future.result())
+        except InvalidStateError:
+            # ألغى المستدعي المستقبل الخارجي أولاً
+            pass
+
+    outer.add_done_callback(lambda future: future.cancelled() and inner.cancel())
+    inner.add_done_callback(copy)
+
+class BoundedSubmitter:
+    """غلاف submit يبقي عدداً محدوداً من الأعمال لدى المجدول، والباقي في طابور محلي يُرسل كلما اكتمل عمل
+
+    الدفعة الكبيرة لا تصطدم بحد طابور العميل في FairScheduler (queue.Full) مهما طالت.
+    """
+
+    def __init__(self, submit: Callable[..., Future], limit: int):
+        self.submit = submit
+        self.limit = limit
+        self.active = 0
+        self.backlog = deque()
+        self.lock = threading.Lock()
+
+    def __call__(self, func: Callable, *args) -> Future:
+        future = Future()
+        with self.lock:
+            if self.active >= self.limit:
+                self.backlog.append((func, args, future))
+                return future
+            self.active += 1
+        self._start(func, args, future)
+        return future
+
+    def _start(self, func: Callable, args: tuple, future: Future):
+        # حلقة بدل استدعاء ذاتي: فشل الإرسال المتكرر لا يعمق المكدس
+        while True:
+            try:
+                inner = self.submit(func, *args)
+            except Exception as e:
+                try:
+                    future.set_exception(e)
+                except InvalidStateError:
+                    pass
+            else:
+                _chain(inner, future)
+                inner.add_done_callback(self._release)
+                return
+            following = self._next()
+            if following is None:
+                return
+            func, args, future = following
+
+    def _release(self, _):
+        following = self._next()
+        if following is not None:
+            self._start(*following)
+
+    def _next(self):
+        """العمل التالي غير الملغى مع الإبقاء على مكانه، أو None وتحرير المكان"""
+        with self.lock:
+            while self.backlog:
+                func, args, future = self.backlog.popleft()
+                if not future.cancelled():
+                    return func, args, future
+            self.active -= 1
+            return None
+
+class PlatformRateLimiter:
+    """حدود معدل منفصلة لكل منصة"""
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate: float = 0.5, burst: float = 1.0):
+        self.rates = rates or {}
+        self.default_rate = default_rate
+        self.burst = burst
+        self.buckets = {}
+        self.dispatcher = None
+        self.lock = threading.Lock()
+
+    def _get_bucket(self, key: str, platform: Optional[str] = None) -> TokenBucket:
+        """دلو لكل مفتاح؛ النطاق العام يأخذ معدل منصته (مثل generic) إن لم يُحدد له معدل"""
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                rate = self.rates.get(key, self.rates.get(platform, self.default_rate))
+                bucket = TokenBucket(rate, self.burst)
+                self.buckets[key] = bucket
+            return bucket
+
+    def acquire(self, platform: str, cancel_event: Optional[threading.Event] = None,
+                max_wait: Optional[float] = None, bucket_key: Optional[str] = None) -> bool:
+        """انتظار دور الطلب التالي على المنصة، أو على bucket_key (نطاق الموقع العام) عند تحديده"""
+        return self._get_bucket(bucket_key or platform, platform).acquire(cancel_event, max_wait)
+
+    def submit(self, platform: str, submit: Callable[..., Future], func: Callable, *args,
+               cancel_event: Optional[threading.Event] = None, max_wait: Optional[float] = None,
+               rejected: Optional[Callable[[], object]] = None, bucket_key: Optional[str] = None) -> Future:
+        """إرسال العمل إلى العمال عند حلول دور المنصة بدل انتظاره داخل عامل
+
+        المنصة المقيدة تنتظر في الموزع ولا تحجز عمالاً عن بقية المنصات. إذا تجاوز
+        الانتظار max_wait يكتمل المستقبل فوراً بنتيجة rejected(). bucket_key يفصل دلاء النطاقات
+        داخل المنصة العامة حتى لا تشترك كل المواقع في دلو واحد.
+        """
+        bucket = self._get_bucket(bucket_key or platform, platform)
+        wait = bucket.reserve(max_wait)
+        if wait is None:
+            future = Future()
+            future.set_result(rejected() if rejected is not None else None)
+            return future
+        if wait <= 0:
+            return submit(func, *args)
+
+        future = Future()
+
+        def dispatch():
+            if future.cancelled():
+                bucket.refund()
+                return
+            try:
+                inner = submit(func, *args)
+            except Exception as e:
+                # مثل queue.Full من FairScheduler: يظهر عند قراءة النتيجة
+                try:
+                    future.set_exception(e)
+                except InvalidStateError:
+                    pass
+                return
+            _chain(inner, future)
+
+        with self.lock:
+            if self.dispatcher is None:
+                self.dispatcher = DelayedDispatcher()
+        self.dispatcher.call_at(time.monotonic() + wait, dispatch, cancel_event)
+        return future
+
+class BatchEngine:
+    """تنفيذ الدفعات بعدد محدود من العمال مع احترام وتيرة كل منصة"""
+
+    def __init__(self, extractor, max_workers: int = 8, rate_limiter: Optional[PlatformRateLimiter] = None,
+                 submit: Optional[Callable[..., Future]] = None, max_pending: int = 256):
+        self.extractor = extractor
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or PlatformRateLimiter()
+        # دالة submit(func, *args) -> Future بديلة عن مجمع الخيوط الخاص، مثل FairScheduler.submitter
+        self.submit = submit
+        # أقصى أعمال لكل دفعة في طابور المجدول الخارجي؛ الباقي ينتظر في BoundedSubmitter
+        self.max_pending = max_pending
+
+    def run(self, urls: List[str], submit: Optional[Callable[..., Future]] = None,
+            deadline: Optional[Deadline] = None) -> List[Dict]:
+        """معالجة الروابط مع الحفاظ على ترتيب الإدخال"""
+        results = [None] * len(urls)
+        for index, result in self.iter_results(urls, submit=submit, deadline=deadline):
+            results[index] = result
+        return results
+
+    def iter_results(self, urls: List[str], cancel_event: Optional[threading.Event] = None,
+                     submit: Optional[Callable[..., Future]] = None,
+                     deadline: Optional[Deadline] = None) -> Iterator[Tuple[int, Dict]]:
+        """إرجاع النتائج فور اكتمالها مع رقم الرابط، ونتيجة timed_out لما لم يكتمل قبل deadline"""
+        if not urls:
+            return
+
+        # الروابط المختلفة لنفس الملف الشخصي تُجلب مرة واحدة
+        groups = {}
+        for i, url in enumerate(urls):
+            groups.setdefault(self._canonical_key(url), []).append(i)
+
+        submit = submit or self.submit
+        if submit is not None:
+            yield from self._collect(urls, groups, BoundedSubmitter(submit, self.max_pending), cancel_event, deadline)
+            return
+
+        workers = max(1, min(self.max_workers, len(groups)))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            yield from self._collect(urls, groups, executor.submit, cancel_event, deadline)
+        finally:
+            # مع deadline لا ننتظر الروابط الجارية؛ مهلة جلبها محدودة بالمتبقي أصلاً
+            executor.shutdown(wait=deadline is None)
+
+    def _collect(self, urls: List[str], groups: Dict[str, List[int]], submit: Callable[..., Future],
+                 cancel_event: Optional[threading.Event],
+                 deadline: Optional[Deadline] = None) -> Iterator[Tuple[int, Dict]]:
+        """إرسال رابط واحد لكل ملف شخصي وتوزيع نتيجته على كل نسخه"""
+        total = len(urls)
+        futures = {}
+        try:
+            for indices in groups.values():
+                url = urls[indices[0]]
+                future = self.rate_limiter.submit(
+                    self._platform_for(url), submit, self._process_one, indices[0], total, url, cancel_event, deadline,
+                    cancel_event=cancel_event, max_wait=deadline.remaining() if deadline is not None else None,
+                    rejected=lambda url=url: self._timed_out_result(url), bucket_key=self._rate_key(url)
+                )
+                futures[future] = indices
+        except Exception:
+            # رفض الطابور لجزء من الدفعة يلغي ما أُرسل منها
+            for future in futures:
+                future.cancel()
+            raise
+
+        pending = dict(futures)
+        try:
+            try:
+                for future in as_completed(futures, timeout=deadline.remaining() if deadline is not None else None):
+                    result = future.result()
+                    indices = pending.pop(future)
+                    yield indices[0], result
+                    for i in indices[1:]:
+                        yield i, result.copy(input_url=urls[i])
+            except TimeoutError:
+                # نتائج جزئية: ما اكتمل أُرسل، والباقي يُلغى ويُعلَّم timed_out
+                print(f"⏱️ انتهت المهلة مع {len(pending)} روابط غير مكتملة")
+                for future, indices in pending.items():
+                    future.cancel()
+                    for i in indices:
+                        yield i, self._timed_out_result(urls[i])
+        finally:
+            # عند توقف المستهلك لا تبقى أعمال معلقة في طابور مشترك
+            for future in futures:
+                future.cancel()
+
+    def iter_stream(self, items: Iterable[Tuple[int, str]], max_in_flight: Optional[int] = None,
+                    cancel_event: Optional[threading.Event] = None) -> Iterator[Tuple[int, Dict]]:
+        """معالجة مصدر روابط بأي طول مع عدد محدود من الروابط المعلقة في الذاكرة"""
+        max_in_flight = max_in_flight or self.max_workers * 4
+        items = iter(items)
+        pending = {}
+        exhausted = False
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                # لا نقرأ من المصدر إلا بقدر ما تفرغ النافذة
+                while not exhausted and len(pending) < max_in_flight:
+                    try:
+                        key, url = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    future = self.rate_limiter.submit(self._platform_for(url), executor.submit, self._process_one,
+                                                      key, None, url, cancel_event, cancel_event=cancel_event,
+                                                      bucket_key=self._rate_key(url))
+                    pending[future] = key
+
+                if not pending:
+                    return
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+
+    def _process_one(self, index: int, total: Optional[int], url: str,
+                     cancel_event: Optional[threading.Event] = None,
+                     deadline: Optional[Deadline] = None) -> ExtractionResult:
+        """معالجة رابط واحد؛ يصل إلى العامل بعد حلول دور منصته"""
+        if cancel_event is not None and cancel_event.is_set():
+            return self._cancelled_result(url)
+        if deadline is not None and deadline.expired():
+            return self._timed_out_result(url)
+
+        position = f"{index + 1}/{total}" if total else f"{index + 1}"
+        print(f"\n📍 معالجة الرابط {position}: {url}")
+
+        started = time.perf_counter()
+        try:
+            # استخراج الصورة
+            result = as_result(self.extractor.extract_avatar(url, deadline=deadline))
+            result.elapsed = time.perf_counter() - started
+
+            # عرض النتيجة
+            if result.success:
+                print(f"   ✅ نجح - {result.get('platform')} - {result.get('resolution', (0, 0))[0]}x{result.get('resolution', (0, 0))[1]}")
+            else:
+                print(f"   ❌ فشل - {result.get('error')}")
+
+            return result
+
+        except Exception as e:
+            print(f"   💥 خطأ - {str(e)}")
+            return ExtractionResult.failure(url, f'خطأ غير متوقع: {str(e)}', platform=self._platform_for(url))
+
+    def _cancelled_result(self, url: str) -> ExtractionResult:
+        return ExtractionResult.failure(url, 'تم إلغاء المعالجة', cancelled=True, platform=self._platform_for(url))
+
+    def _timed_out_result(self, url: str) -> ExtractionResult:
+        return ExtractionResult.failure(url, 'انتهت المهلة قبل اكتمال المعالجة', 'timed_out', timed_out=True,
+                                        platform=self._platform_for(url))
+
+    def _canonical_key(self, url: str) -> str:
+        """مفتاح الملف الشخصي (المنصة واسم المستخدم) لدمج الروابط المكررة"""
+        return self.extractor.registry.canonical_key(url)
+
+    def _platform_for(self, url: str) -> str:
+        """تحديد المنصة من الرابط"""
+        return self.extractor._platform_for(url)
+
+    def _rate_key(self, url: str) -> str:
+        """دلو المعدل: المنصة المعروفة، أو نطاق الموقع العام مثل قاطع الدائرة"""
+        return self.extractor._site_key(url)
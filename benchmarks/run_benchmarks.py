@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Stage Benchmarks - قياس زمن كل مرحلة لكل منصة على صفحات مسجلة دون شبكة حقيقية
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform as platform_info
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from requests.adapters import HTTPAdapter
+from avatar_extractor import AvatarExtractor
+from html_document import HtmlDocument
+from metrics import ExtractionMetrics, MetricsRegistry
+from platform_registry import default_registry
+from standin_server import PLATFORMS, StandInServer
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+STAGES = ('fetch', 'parse', 'candidates', 'selection', 'download', 'transcode', 'total')
+
+# روابط حقيقية الشكل حتى يتعرف السجل على المنصة كما في الإنتاج
+PROFILE_URLS = {
+    'youtube': 'https://www.youtube.com/@bench',
+    'instagram': 'https://www.instagram.com/bench/',
+    'tiktok': 'https://www.tiktok.com/@bench',
+    'twitter': 'https://x.com/bench',
+    'generic': 'https://example.com/team/bench',
+}
+
+def summarize(samples: List[float]) -> Dict:
+    """الوسيط والمئين 95 والمتوسط بالميلي ثانية"""
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        'median_ms': round(statistics.median(ordered) * 1000, 3),
+        'p95_ms': round(ordered[p95_index] * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'samples': len(ordered),
+    }
+
+class StageRecorder(ExtractionMetrics):
+    """مقاييس المستخرج نفسها مع حفظ زمن كل مرحلة للجولة الحالية"""
+
+    def __init__(self):
+        super().__init__(MetricsRegistry())
+        self.timings = None
+
+    def observe_stage(self, stage: str, platform: str, seconds: float):
+        super().observe_stage(stage, platform, seconds)
+        if self.timings is not None and stage in self.timings:
+            self.timings[stage].append(seconds)
+
+class StandInAdapter(HTTPAdapter):
+    """توجيه روابط المنصات الحقيقية إلى صفحات الخادم المحلي مع إبقاء الرابط الأصلي في الاستجابة"""
+
+    def __init__(self, standin: StandInServer, **kwargs):
+        super().__init__(**kwargs)
+        self.standin = standin
+
+    def send(self, request, **kwargs):
+        original = request.url
+        request.url = self.standin.page_url(default_registry.detect(urlparse(original).netloc).name)
+        response = super().send(request, **kwargs)
+        # المستخرج يحدد المنصة من رابط الاستجابة كما في الإنتاج
+        response.url = original
+        return response
+
+def make_extractor(standin: StandInServer) -> AvatarExtractor:
+    extractor = AvatarExtractor(pool_size=4, metrics=StageRecorder())
+    # الصفحات عبر https:// إلى الخادم المحلي، والصور روابط http:// محلية أصلاً
+    extractor.session.mount('https://', StandInAdapter(standin, pool_connections=4, pool_maxsize=4))
+    return extractor
+
+def run_once(extractor: AvatarExtractor, name: str, timings: Dict[str, List[float]]):
+    """استخراج كامل عبر extract_avatar لمنصة واحدة، مع زمن كل مرحلة كما يقيسه المستخرج"""
+    extractor.metrics.timings = timings
+    started = time.perf_counter()
+    try:
+        # رسائل المستخرج لكل رابط تغطي على جدول النتائج
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = extractor.extract_avatar(PROFILE_URLS[name])
+    finally:
+        extractor.metrics.timings = None
+    timings['total'].append(time.perf_counter() - started)
+    if not result.success:
+        raise RuntimeError(f'فشل الاستخراج من صفحة {name}: {result.get("error")}')
+
+def run_benchmarks(iterations: int, warmup: int, latency: float, padding_bytes: int,
+                   platforms: List[str]) -> Dict:
+    """قياس كل المراحل لكل منصة"""
+    results = {}
+    with StandInServer(latency=latency, padding_bytes=padding_bytes) as standin:
+        extractor = make_extractor(standin)
+        for name in platforms:
+            timings = {stage: [] for stage in STAGES}
+            for _ in range(warmup):
+                run_once(extractor, name, {stage: [] for stage in STAGES})
+            for _ in range(iterations):
+                run_once(extractor, name, timings)
+            # مرحلة لا تحدث في كل جولة (مثل تحميل صورة جاءت كاملة في الفحص) لا تظهر
+            results[name] = {stage: summarize(samples) for stage, samples in timings.items() if samples}
+            print(f"✅ {name}: " + ', '.join(f"{s}={results[name][s]['median_ms']}ms" for s in STAGES if s in results[name]))
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'iterations': iterations,
+            'warmup': warmup,
+            'latency': latency,
+            'padding_bytes': padding_bytes,
+        },
+        'environment': {
+            'python': platform_info.python_version(),
+            'machine': platform_info.machine(),
+            'html_backend': HtmlDocument('', '').backend,
+        },
+        'results': results,
+    }
+
+def save_report(report: Dict) -> str:
+    """حفظ النتائج كملف JSON مؤرخ"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(RESULTS_DIR, f'{stamp}.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
+
+def load_baseline(reference: str) -> Dict:
+    """تحميل نتيجة سابقة: مسار ملف أو latest"""
+    if reference == 'latest':
+        saved = sorted(glob.glob(os.path.join(RESULTS_DIR, '*.json')))
+        if not saved:
+            raise FileNotFoundError('لا توجد نتائج محفوظة للمقارنة')
+        reference = saved[-1]
+    with open(reference, encoding='utf-8') as f:
+        return json.load(f)
+
+def compare(report: Dict, baseline: Dict, threshold: float, min_delta_ms: float) -> List[Dict]:
+    """المراحل التي تباطأ وسيطها بأكثر من النسبة المسموحة"""
+    regressions = []
+    for name, stages in report['results'].items():
+        for stage, current in stages.items():
+            previous = baseline.get('results', {}).get(name, {}).get(stage)
+            if not previous:
+                continue
+            delta = current['median_ms'] - previous['median_ms']
+            # تجاهل الفروق الصغيرة جداً لأنها ضجيج قياس
+            if delta > min_delta_ms and current['median_ms'] > previous['median_ms'] * (1 + threshold):
+                regressions.append({
+                    'platform': name,
+                    'stage': stage,
+                    'baseline_ms': previous['median_ms'],
+                    'current_ms': current['median_ms'],
+                    'change': round(delta / previous['median_ms'] * 100, 1) if previous['median_ms'] else None,
+                })
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='قياس زمن مراحل الاستخراج على صفحات مسجلة')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.0, help='تأخير الخادم المحلي بالثواني')
+    parser.add_argument('--padding', type=int, default=512 * 1024, help='حجم المحتوى الإضافي في كل صفحة')
+    parser.add_argument('--platform', action='append', choices=PLATFORMS, help='منصة واحدة أو أكثر')
+    parser.add_argument('--save', action='store_true', help='حفظ النتائج في benchmarks/results')
+    parser.add_argument('--compare', metavar='PATH|latest', help='مقارنة بنتيجة سابقة')
+    parser.add_argument('--threshold', type=float, default=0.2, help='نسبة التباطؤ المسموحة')
+    parser.add_argument('--min-delta', type=float, default=0.5, help='أقل فرق بالميلي ثانية يعتبر تراجعاً')
+    args = parser.parse_args(argv)
+
+    # تحميل المرجع قبل الحفظ حتى لا يقارن latest النتيجة بنفسها
+    baseline = load_baseline(args.compare) if args.compare else None
+
+    report = run_benchmarks(args.iterations, args.warmup, args.latency, args.padding,
+                            args.platform or list(PLATFORMS))
+
+    if args.save:
+        print(f"💾 تم حفظ النتائج في {save_report(report)}")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"❌ تراجع في الأداء ({len(regressions)} مرحلة):")
+            for item in regressions:
+                print(f"   {item['platform']}/{item['stage']}: "
+                      f"{item['baseline_ms']}ms ← {item['current_ms']}ms (+{item['change']}%)")
+            return 1
+        print("✅ لا يوجد تراجع في الأداء")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Stand-in Server - خادم محلي يقدم الصفحات المسجلة والصور بتأخير قابل للضبط
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import urlparse
+from PIL import Image
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+PLATFORMS = ('youtube', 'instagram', 'tiktok', 'twitter', 'generic')
+
+def make_padding(kind: str, size: int) -> str:
+    """محتوى إضافي يقارب حجم الصفحات الحقيقية"""
+    if size <= 0:
+        return '' if kind == 'html' else '{}'
+
+    if kind == 'html':
+        item = '<p class="post">Lorem ipsum dolor sit amet, "quoted" {braces} [brackets]</p>\n'
+    else:
+        item = json.dumps({
+            'itemSectionRenderer': {
+                'contents': [{'text': {'runs': [{'text': 'Lorem ipsum "} ] {[" dolor'}]}, 'id': 'x' * 16}],
+                'trackingParams': 'CAAQ' * 8,
+            }
+        }) + ','
+    padding = item * max(1, size // len(item))
+    return padding if kind == 'html' else padding + '{}'
+
+def make_images() -> Dict[str, bytes]:
+    """صور عينات بصيغ وأحجام مختلفة تُولد بشكل ثابت"""
+    images = {}
+
+    large = Image.linear_gradient('L').resize((1600, 1600)).convert('RGB')
+    buffered = io.BytesIO()
+    large.save(buffered, format='JPEG', quality=90)
+    images['avatar_large.jpg'] = buffered.getvalue()
+
+    small = Image.radial_gradient('L').resize((200, 200)).convert('RGBA')
+    buffered = io.BytesIO()
+    small.save(buffered, format='PNG')
+    images['avatar_small.png'] = buffered.getvalue()
+
+    return images
+
+class StandInServer:
+    """تشغيل الخادم المحلي في خيط خلفي"""
+
+    def __init__(self, latency: float = 0.0, padding_bytes: int = 512 * 1024, port: int = 0):
+        self.latency = latency
+        self.padding_bytes = padding_bytes
+        self.images = make_images()
+        self.pages = {}
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self.base_url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        self._load_pages()
+        self.thread = None
+
+    def _load_pages(self):
+        for platform in PLATFORMS:
+            with open(os.path.join(FIXTURES_DIR, f'{platform}.html'), encoding='utf-8') as f:
+                template = f.read()
+            kind = 'html' if platform == 'generic' else 'json'
+            page = template.replace('{{BASE}}', self.base_url)
+            page = page.replace('{{PADDING}}', make_padding(kind, self.padding_bytes))
+            self.pages[platform] = page.encode('utf-8')
+
+    def page_url(self, platform: str) -> str:
+        return f'{self.base_url}/pages/{platform}.html'
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+
+                path = urlparse(self.path).path
+                if path.startswith('/pages/'):
+                    body = server.pages.get(path[len('/pages/'):-len('.html')])
+                    content_type = 'text/html; charset=utf-8'
+                elif path.startswith('/images/'):
+                    body = server.images.get(path[len('/images/'):])
+                    content_type = 'image/jpeg' if path.endswith('.jpg') else 'image/png'
+                else:
+                    body = None
+
+                if body is None:
+                    self.send_error(404)
+                    return
+
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # العميل أغلق الاتصال مبكراً (القراءة الجزئية)
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+# للاستخدام المباشر
+if __name__ == "__main__":
+    with StandInServer(latency=0.05) as standin:
+        print(f"🧪 الخادم المحلي يعمل على {standin.base_url}")
+        for platform in PLATFORMS:
+            print(f"   {standin.page_url(platform)}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk CLI - معالجة ملايين الروابط من ملف أو stdin مع بث النتائج ونقطة استئناف
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+from avatar_cache import AvatarCache
+from image_store import ImageStore
+from main_app import SocialMediaExtractorApp
+from profile_analyzer import SummaryAggregator
+
+class Checkpoint:
+    """نقطة استئناف مضغوطة: كل الأسطر قبل next_line منتهية، و done للمنتهية خارج الترتيب"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.next_line = 0
+        # لا يتجاوز حجمها نافذة المعالجة لأن next_line يتقدم باستمرار
+        self.done = set()
+        self.processed = 0
+        self.input = None
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.next_line = data.get('next_line', 0)
+            self.done = set(data.get('done', []))
+            self.processed = data.get('processed', 0)
+            self.input = data.get('input')
+
+    def reset(self, input_name: Optional[str] = None):
+        """بدء نقطة استئناف جديدة لمدخل آخر"""
+        self.next_line = 0
+        self.done = set()
+        self.processed = 0
+        self.input = input_name
+
+    def is_done(self, line: int) -> bool:
+        return line < self.next_line or line in self.done
+
+    def mark(self, line: int):
+        """تسجيل انتهاء سطر وتقديم next_line فوق كل الأسطر المتصلة المنتهية"""
+        self.done.add(line)
+        while self.next_line in self.done:
+            self.done.remove(self.next_line)
+            self.next_line += 1
+
+    def save(self):
+        """كتابة ذرية حتى لا تتلف نقطة الاستئناف عند الانقطاع"""
+        data = {
+            'input': self.input,
+            'next_line': self.next_line,
+            'done': sorted(self.done),
+            'processed': self.processed,
+            'updated_at': time.time(),
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.checkpoint-')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+def read_urls(stream, checkpoint: Checkpoint) -> Iterator[Tuple[int, str]]:
+    """قراءة الروابط سطراً بسطر مع تخطي المنتهي منها والأسطر الفارغة"""
+    for line_number, line in enumerate(stream):
+        if checkpoint.is_done(line_number):
+            continue
+        url = line.strip()
+        if not url or url.startswith('#'):
+            checkpoint.mark(line_number)
+            continue
+        yield line_number, url
+
+def parse_rates(values) -> Optional[Dict[str, float]]:
+    """تحويل platform=rate إلى قاموس"""
+    if not values:
+        return None
+    rates = {}
+    for value in values:
+        platform, _, rate = value.partition('=')
+        rates[platform.strip()] = float(rate)
+    return rates
+
+def run(args) -> int:
+    checkpoint = Checkpoint(args.checkpoint or args.output + '.checkpoint')
+    input_name = 'stdin' if args.input == '-' else os.path.abspath(args.input)
+    if checkpoint.input and checkpoint.input != input_name and not args.reset:
+        # أرقام الأسطر المنتهية لا معنى لها في مدخل آخر، وتخطيها يُسقط روابط بصمت
+        print(f"❌ نقطة الاستئناف تخص مدخلاً آخر: {checkpoint.input} (استخدم --reset للبدء من جديد)",
+              file=sys.stderr)
+        return 2
+    if args.reset:
+        checkpoint.reset(input_name)
+    checkpoint.input = input_name
+    if checkpoint.next_line:
+        print(f"🔁 استئناف من السطر {checkpoint.next_line + 1}", file=sys.stderr)
+
+    app = SocialMediaExtractorApp(
+        max_workers=args.workers,
+        rate_limits=parse_rates(args.rate),
+        cache=AvatarCache(args.cache) if args.cache else None,
+        image_store=ImageStore(args.images),
+        transcode_workers=args.transcode_workers
+    )
+
+    cancel_event = threading.Event()
+    # ملخص بذاكرة ثابتة مهما بلغ عدد الروابط
+    aggregator = SummaryAggregator()
+    started = time.monotonic()
+    since_save = 0
+
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    # رسائل المستخرج لكل رابط لا فائدة منها مع ملايين الروابط
+    quiet = open(os.devnull, 'w') if args.quiet else None
+    output = open(args.output, 'a', encoding='utf-8')
+    results = app.engine.iter_stream(read_urls(source, checkpoint), args.window, cancel_event)
+    try:
+        with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext():
+            for line_number, result in results:
+                if result.get('cancelled'):
+                    continue
+
+                output.write(json.dumps(dict(result, line=line_number), ensure_ascii=False) + '\n')
+                aggregator.add(result)
+                checkpoint.processed += 1
+                checkpoint.mark(line_number)
+
+                since_save += 1
+                if since_save >= args.checkpoint_every:
+                    # النتائج على القرص قبل نقطة الاستئناف التي تشير إليها
+                    output.flush()
+                    os.fsync(output.fileno())
+                    checkpoint.save()
+                    since_save = 0
+                    rate = aggregator.total / max(time.monotonic() - started, 1e-9)
+                    print(f"📊 {checkpoint.processed} رابط ({rate:.1f}/ث) - "
+                          f"✅ {aggregator.successful} ❌ {aggregator.total - aggregator.successful}", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("\n⏹️ إيقاف... حفظ نقطة الاستئناف", file=sys.stderr)
+        cancel_event.set()
+        results.close()
+        return_code = 130
+    else:
+        return_code = 0
+    finally:
+        output.flush()
+        os.fsync(output.fileno())
+        output.close()
+        checkpoint.save()
+        if source is not sys.stdin:
+            source.close()
+        if quiet:
+            quiet.close()
+
+    summary = aggregator.summary()
+    print(f"🎊 انتهى: ✅ {summary['successful']} ❌ {summary['failed']} "
+          f"في {time.monotonic() - started:.1f} ثانية", file=sys.stderr)
+    if summary['error_classes']:
+        print(f"⚠️ أسباب الفشل: {summary['error_classes']}", file=sys.stderr)
+    latency = summary['latency_seconds']
+    if latency['count']:
+        print(f"⏱️ الزمن: p50 {latency['p50']}ث p90 {latency['p90']}ث p99 {latency['p99']}ث", file=sys.stderr)
+    return return_code
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='استخراج صور الملفات الشخصية بالجملة إلى ملف JSONL')
+    parser.add_argument('input', help='ملف روابط، رابط في كل سطر، أو - لـ stdin')
+    parser.add_argument('-o', '--output', default='results.jsonl', help='ملف النتائج (يُضاف إليه عند الاستئناف)')
+    parser.add_argument('--images', default='avatar_store', help='مجلد حفظ الصور')
+    parser.add_argument('--checkpoint', help='ملف نقطة الاستئناف (الافتراضي: OUTPUT.checkpoint)')
+    parser.add_argument('--reset', action='store_true', help='تجاهل نقطة الاستئناف الحالية والبدء من السطر الأول')
+    parser.add_argument('--checkpoint-every', type=int, default=100, help='حفظ نقطة الاستئناف كل N نتيجة')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--window', type=int, help='أقصى عدد روابط معلقة (الافتراضي: 4 × العمال)')
+    parser.add_argument('--rate', action='append', metavar='PLATFORM=RATE', help='طلبات في الثانية لكل منصة')
+    parser.add_argument('--cache', help='ملف SQLite للتخزين المؤقت')
+    parser.add_argument('--transcode-workers', type=int, default=0)
+    parser.add_argument('-q', '--quiet', action='store_true', help='إخفاء رسائل كل رابط')
+    return run(parser.parse_args(argv))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Candidate Resolver - ترتيب الصور المرشحة وفحصها والانتقال للتالي عند الفشل
+"""
+
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from PIL import Image
+from deadline import Deadline, timeout_within
+from records import AvatarCandidate
+
+class CandidateResolver:
+    """فحص المرشحين بطلبات جزئية صغيرة لمعرفة أبعادهم الحقيقية"""
+
+    def __init__(self, session, probe: bool = True, max_probes: int = 4,
+                 probe_bytes: int = 32 * 1024, timeout: float = 5, probe_workers: int = 32):
+        self.session = session
+        self.probe_enabled = probe
+        self.max_probes = max_probes
+        self.probe_bytes = probe_bytes
+        self.timeout = timeout
+        # مشترك بين كل العمال الذين يستخدمون المستخرج، فيتسع لفحوص عدة روابط معاً
+        self.probe_workers = probe_workers
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def dedupe(self, candidates: List[Dict]) -> List[Dict]:
+        """حذف الروابط المكررة مع الإبقاء على أعلى جودة مقدرة"""
+        unique = {}
+        for candidate in candidates:
+            url = candidate.get('url')
+            if not url:
+                continue
+            existing = unique.get(url)
+            if existing is None or candidate.get('quality', 0) > existing.get('quality', 0):
+                unique[url] = candidate
+        return list(unique.values())
+
+    def rank(self, candidates: List[Dict], deadline: Optional[Deadline] = None,
+             bodies: Optional[Dict[str, Tuple[bytes, Dict]]] = None) -> List[Dict]:
+        """ترتيب المرشحين حسب الأبعاد الحقيقية عند إمكان فحصها
+
+        الفحوص تعمل بالتوازي. إذا مُرر قاموس bodies تُحفظ فيه (البايتات، الترويسات) للصور
+        التي جاءت كاملة في الفحص، فلا يُعاد تحميلها.
+        """
+        ranked, to_probe = self.probe_plan(candidates)
+        if not to_probe:
+            return ranked
+        results = self._probe_pool().map(lambda candidate: self._probe(candidate['url'], deadline), to_probe)
+        return self.apply_probes(ranked, to_probe, results, bodies)
+
+    def probe_plan(self, candidates: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """(المرشحون مرتبين بالجودة المقدرة، من يُفحص منهم)؛ تشترك فيه الفحوص المتزامنة وغير المتزامنة"""
+        ranked = sorted(self.dedupe(candidates), key=lambda x: x.get('quality', 0), reverse=True)
+        if not self.probe_enabled or len(ranked) < 2:
+            return ranked, []
+        return ranked, ranked[:self.max_probes]
+
+    def apply_probes(self, ranked: List[Dict], to_probe: List[Dict], results,
+                     bodies: Optional[Dict[str, Tuple[bytes, Dict]]] = None) -> List[Dict]:
+        """إعادة الترتيب بنتائج الفحص (الأبعاد، الجسم) بنفس ترتيب to_probe"""
+        probed = []
+        failed = []
+        for candidate, (size, body) in zip(to_probe, results):
+            if size is None:
+                failed.append(candidate)
+                continue
+            if body is not None and bodies is not None:
+                bodies[candidate['url']] = body
+            probed.append(AvatarCandidate.from_dict(candidate, width=size[0], height=size[1], quality=max(size), probed=True))
+
+        # المفحوصة أولاً، ثم غير المفحوصة، ثم التي فشل فحصها كاحتياط أخير
+        probed.sort(key=lambda x: x['quality'], reverse=True)
+        return probed + ranked[len(to_probe):] + failed
+
+    def _probe_pool(self) -> ThreadPoolExecutor:
+        # يُنشأ عند أول فحص: المحللات التي لا تفحص (مثل الأرشيف) لا تحتاج خيوطاً
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.probe_workers, thread_name_prefix='probe')
+            return self.pool
+
+    def probe(self, url: str, deadline: Optional[Deadline] = None) -> Optional[Tuple[int, int]]:
+        """قراءة أول بايتات الصورة فقط لمعرفة أبعادها"""
+        return self._probe(url, deadline)[0]
+
+    def _probe(self, url: str, deadline: Optional[Deadline] = None) -> Tuple[Optional[Tuple[int, int]], Optional[Tuple[bytes, Dict]]]:
+        """(الأبعاد، (البايتات، الترويسات) إذا وصلت الصورة كاملة)"""
+        try:
+            headers = {'Range': f'bytes=0-{self.probe_bytes - 1}'}
+            timeout = timeout_within(deadline, self.timeout)
+            response = self.session.get(url, headers=headers, timeout=timeout, stream=True)
+            try:
+                if response.status_code not in (200, 206):
+                    return None, None
+                buffer = io.BytesIO()
+                complete = True
+                # بعض الخوادم تتجاهل Range فنتوقف بأنفسنا
+                for chunk in response.iter_content(chunk_size=8192):
+                    buffer.write(chunk)
+                    if buffer.tell() >= self.probe_bytes:
+                        complete = False
+                        break
+            finally:
+                response.close()
+
+            return self.parse_probe(buffer.getvalue(), response.status_code, response.headers, complete)
+        except Exception:
+            return None, None
+
+    def parse_probe(self, data: bytes, status: int, headers, complete: bool) -> Tuple[Tuple[int, int], Optional[Tuple[bytes, Dict]]]:
+        """أبعاد الصورة من بايتات الفحص، والجسم إذا وصلت كاملة"""
+        size = Image.open(io.BytesIO(data)).size
+        if status == 206:
+            # Content-Range: bytes 0-N/TOTAL
+            total = headers.get('Content-Range', '').rpartition('/')[2]
+            complete = total.isdigit() and int(total) == len(data)
+        return size, ((data, headers) if complete else None)
+
+    def resolve(self, candidates: List[Dict], download: Callable[[str], Dict]) -> Tuple[Optional[Dict], Dict]:
+        """تحميل أفضل مرشح، والانتقال للتالي إذا فشل التحميل"""
+        return self.resolve_ranked(self.rank(candidates), download)
+
+    def resolve_ranked(self, ranked: List[Dict], download: Callable[[str], Dict],
+                       deadline: Optional[Deadline] = None) -> Tuple[Optional[Dict], Dict]:
+        """مثل resolve لكن على قائمة مرتبة مسبقاً عبر rank"""
+        download_result = {'success': False, 'error': 'لا توجد صور بجودة مناسبة'}
+        for candidate in ranked:
+            download_result = download(candidate['url'])
+            if download_result['success']:
+                return candidate, download_result
+            if deadline is not None and deadline.expired():
+                # لا وقت لتجربة بقية المرشحين
+                break
+            print(f"⚠️ فشل تحميل المرشح {candidate['url']}: {download_result.get('error')}")
+        return None, download_result
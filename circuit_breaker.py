@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Circuit Breaker - إعادة المحاولة حسب حالة الاستجابة وإيقاف المنصة مؤقتاً عند تكرار الفشل
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Sequence
+
+class FetchError(Exception):
+    """استجابة بحالة خطأ لا تصلح للتحليل كملف شخصي"""
+
+    def __init__(self, status: int, url: str):
+        super().__init__(f'فشل الجلب: {status}')
+        self.status = status
+        self.url = url
+        self.error_class = f'http_{status}'
+
+class CircuitOpenError(Exception):
+    """المنصة موقوفة مؤقتاً بعد تكرار الفشل"""
+
+    error_class = 'circuit_open'
+
+    def __init__(self, platform: str, retry_in: float):
+        super().__init__(f'المنصة {platform} موقوفة مؤقتاً، إعادة المحاولة بعد {retry_in:.0f} ثانية')
+        self.platform = platform
+        self.retry_in = retry_in
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """قيمة Retry-After بالثواني: عدد ثوانٍ أو تاريخ HTTP"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+class RetryPolicy:
+    """إعادة المحاولة للحالات المؤقتة فقط، بتأخير أسي عشوائي يحترم Retry-After"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 30.0,
+                 retry_statuses: Sequence[int] = (429, 500, 502, 503, 504)):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        # إذا طلب الخادم انتظاراً أطول من هذا فالمحاولة محكوم عليها بالفشل
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+
+    def should_retry(self, status: int) -> bool:
+        return status in self.retry_statuses
+
+    def delay_for(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """مدة الانتظار قبل المحاولة التالية، أو None إذا لا فائدة من المحاولة"""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay else None
+        # full jitter: يوزع المحاولات المتزامنة بدل أن تصطدم مجدداً
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+class CircuitBreaker:
+    """قاطع دائرة لمنصة واحدة: closed ثم open بعد فشل متكرر ثم half_open لطلب تجريبي واحد"""
+
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_until = 0.0
+        self.probe_in_flight = False
+        self.total_opens = 0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """هل يُسمح بطلب الآن"""
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open':
+                if time.monotonic() < self.opened_until:
+                    return False
+                self.state = 'half_open'
+            # half_open: طلب تجريبي واحد في كل مرة
+            if self.probe_in_flight:
+                return False
+            self.probe_in_flight = True
+            return True
+
+    def retry_in(self) -> float:
+        with self.lock:
+            return max(0.0, self.opened_until - time.monotonic())
+
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.probe_in_flight = False
+
+    def release(self):
+        """إنهاء طلب بلا حكم على المنصة، مثل طلب قطعته مهلة المستدعي"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def record_failure(self, retry_after: Optional[float] = None):
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_until = time.monotonic() + max(self.recovery_time, retry_after or 0)
+                self.total_opens += 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'retry_in': round(max(0.0, self.opened_until - time.monotonic()), 1) if self.state == 'open' else 0,
+                'total_opens': self.total_opens,
+            }
+
+class CircuitBreakerRegistry:
+    """قاطع منفصل لكل منصة حتى تستمر بقية المنصات عند تعثر إحداها"""
+
+    def __init__(self, failure_threshold: int = 5, recovery_time: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def get(self, platform: str) -> CircuitBreaker:
+        with self.lock:
+            breaker = self.breakers.get(platform)
+            if breaker is None:
+                breaker = self.breakers[platform] = CircuitBreaker(self.failure_threshold, self.recovery_time)
+            return breaker
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """حالة كل القواطع لعرضها في /status"""
+        with self.lock:
+            breakers = dict(self.breakers)
+        return {platform: breaker.snapshot() for platform, breaker in sorted(breakers.items())}
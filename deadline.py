@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Deadline - ميزانية زمنية للطلب تُمرر إلى كل جلب وتحميل
+"""
+
+import time
+from typing import Optional, Union
+
+class DeadlineExceeded(Exception):
+    """انتهت ميزانية الطلب قبل اكتمال المعالجة"""
+
+    error_class = 'timed_out'
+
+    def __init__(self, message: str = 'انتهت المهلة قبل اكتمال المعالجة'):
+        super().__init__(message)
+
+class Deadline:
+    """موعد نهائي مطلق يحسب منه كل جلب مهلته المتبقية"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        # بصيغة النفي حتى يُعد Deadline(nan) منتهياً
+        return not time.monotonic() < self.expires_at
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded()
+
+    def timeout(self, default: float) -> float:
+        """المهلة الأقصر بين الافتراضية والمتبقي؛ يرفع DeadlineExceeded إذا انتهى الوقت"""
+        remaining = self.expires_at - time.monotonic()
+        # مهلة صفرية يرفضها urllib3 بـ ValueError، و NaN لا تقارن بشيء
+        if not remaining > 0:
+            raise DeadlineExceeded()
+        return min(default, remaining)
+
+def as_deadline(value: Union[Deadline, float, None]) -> Optional[Deadline]:
+    """قبول deadline جاهز أو عدد ثوانٍ من الآن"""
+    if value is None or isinstance(value, Deadline):
+        return value
+    return Deadline(float(value))
+
+def timeout_within(deadline: Optional[Deadline], default: float) -> float:
+    """مهلة الطلب مع deadline اختياري"""
+    return deadline.timeout(default) if deadline is not None else default
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Fair Scheduler - توزيع العمال بعدل بين العملاء مع مسار أولوية للطلبات الصغيرة
+"""
+
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+class _Task:
+    def __init__(self, func: Callable, args: tuple, future: Future):
+        self.func = func
+        self.args = args
+        self.future = future
+        # ما زال في طابور العميل، وهل احتُسب ضمن الملغاة فيه
+        self.queued = True
+        self.counted_cancelled = False
+
+class _ClientState:
+    """طوابير العميل في المسارين وعدد أعماله الجارية ووسمه الافتراضي"""
+
+    def __init__(self, client_id: str, weight: float):
+        self.client_id = client_id
+        self.weight = weight
+        self.queues = {INTERACTIVE: deque(), BULK: deque()}
+        # حد الأعمال الجارية لكل مسار، فدفعة العميل الكبيرة لا تحجب طلباته التفاعلية
+        self.in_flight = {INTERACTIVE: 0, BULK: 0}
+        # أعمال أُلغيت وهي في الطابور؛ تُزال عند وصولها لرأسه بدل البحث عنها في وسطه
+        self.cancelled = {INTERACTIVE: 0, BULK: 0}
+        # زمن الانتهاء الافتراضي: كل رابط يضيف 1/weight
+        self.tag = 0.0
+
+    def queued_in(self, lane: str) -> int:
+        return len(self.queues[lane]) - self.cancelled[lane]
+
+    def queued(self) -> int:
+        return self.queued_in(INTERACTIVE) + self.queued_in(BULK)
+
+    def prune(self, lane: str):
+        """إزالة الأعمال الملغاة من رأس الطابور دون احتسابها في الوسم"""
+        tasks = self.queues[lane]
+        while tasks and tasks[0].future.cancelled():
+            task = tasks.popleft()
+            task.queued = False
+            if task.counted_cancelled:
+                self.cancelled[lane] -= 1
+
+    def idle(self) -> bool:
+        return self.queued() == 0 and not any(self.in_flight.values())
+
+class FairScheduler:
+    """طوابير لكل عميل وجدولة weighted fair queuing، والمسار التفاعلي يُخدم أولاً"""
+
+    def __init__(self, max_workers: int = 8, weights: Optional[Dict[str, float]] = None,
+                 default_weight: float = 1.0, max_in_flight_per_client: int = 4,
+                 max_queued_per_client: int = 10000, reserved_interactive_workers: int = 1):
+        self.max_workers = max_workers
+        self.weights = weights or {}
+        self.default_weight = default_weight
+        self.max_in_flight_per_client = max_in_flight_per_client
+        self.max_queued_per_client = max_queued_per_client
+        # عمال لا تستخدمهم الدفعات الكبيرة حتى لا ينتظر الطلب التفاعلي انتهاء رابط بطيء
+        self.bulk_capacity = max(1, max_workers - reserved_interactive_workers)
+        self.clients = {}
+        self.lane_in_flight = {INTERACTIVE: 0, BULK: 0}
+        self.virtual_time = 0.0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker, name=f'fair-worker-{i}', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, client_id: str, func: Callable, *args, interactive: bool = False) -> Future:
+        """إضافة عمل لطابور العميل؛ يرفع queue.Full إذا تجاوز العميل حده"""
+        future = Future()
+        lane = INTERACTIVE if interactive else BULK
+        with self.condition:
+            if self.closed:
+                raise RuntimeError('المجدول متوقف')
+            client = self.clients.get(client_id)
+            if client is None:
+                client = self.clients[client_id] = _ClientState(
+                    client_id, self.weights.get(client_id, self.default_weight))
+            if client.queued() >= self.max_queued_per_client:
+                raise queue.Full(f'طابور العميل {client_id} ممتلئ')
+
+            if client.idle():
+                # عميل عاد بعد خمول لا يحصل على رصيد متراكم
+                client.tag = max(client.tag, self.virtual_time)
+            task = _Task(func, args, future)
+            client.queues[lane].append(task)
+            self.condition.notify()
+        future.add_done_callback(lambda _: self._on_done(client, lane, task))
+        return future
+
+    def _on_done(self, client: _ClientState, lane: str, task: _Task):
+        # الإلغاء قبل البدء: لا يُحتسب العمل بعدها في حد طابور العميل
+        if not task.future.cancelled():
+            return
+        with self.condition:
+            if task.queued and not task.counted_cancelled:
+                task.counted_cancelled = True
+                client.cancelled[lane] += 1
+
+    def submitter(self, client_id: str, interactive: bool = False) -> Callable[..., Future]:
+        """دالة submit(func, *args) مربوطة بعميل ومسار، لتمريرها إلى BatchEngine"""
+        def submit(func: Callable, *args) -> Future:
+            return self.submit(client_id, func, *args, interactive=interactive)
+        return submit
+
+    def snapshot(self) -> Dict:
+        """حالة الطوابير لكل عميل"""
+        with self.condition:
+            return {
+                'in_flight': dict(self.lane_in_flight),
+                'clients': {
+                    client_id: {
+                        'weight': client.weight,
+                        'in_flight': sum(client.in_flight.values()),
+                        'queued_interactive': client.queued_in(INTERACTIVE),
+                        'queued_bulk': client.queued_in(BULK),
+                    }
+                    for client_id, client in self.clients.items()
+                },
+            }
+
+    def shutdown(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def _next_task(self):
+        """العميل المؤهل صاحب أصغر وسم افتراضي، في المسار التفاعلي ثم مسار الدفعات"""
+        for lane in (INTERACTIVE, BULK):
+            if lane == BULK and self.lane_in_flight[BULK] >= self.bulk_capacity:
+                continue
+
+            best = None
+            for client in list(self.clients.values()):
+                client.prune(lane)
+                if client.idle():
+                    # كل ما في طابوره أُلغي
+                    del self.clients[client.client_id]
+                    continue
+                if not client.queues[lane] or client.in_flight[lane] >= self.max_in_flight_per_client:
+                    continue
+                if best is None or client.tag < best.tag:
+                    best = client
+            if best is None:
+                continue
+
+            task = best.queues[lane].popleft()
+            task.queued = False
+            self.virtual_time = max(self.virtual_time, best.tag)
+            best.tag += 1.0 / best.weight
+            best.in_flight[lane] += 1
+            self.lane_in_flight[lane] += 1
+            return best, lane, task
+        return None
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                picked = self._next_task()
+                while picked is None:
+                    if self.closed:
+                        return
+                    self.condition.wait()
+                    picked = self._next_task()
+            client, lane, task = picked
+
+            try:
+                # العمل الملغى قبل بدئه لا يُنفذ
+                if task.future.set_running_or_notify_cancel():
+                    try:
+                        task.future.set_result(task.func(*task.args))
+                    except BaseException as e:
+                        task.future.set_exception(e)
+            finally:
+                with self.condition:
+                    client.in_flight[lane] -= 1
+                    self.lane_in_flight[lane] -= 1
+                    if client.idle() and self.clients.get(client.client_id) is client:
+                        del self.clients[client.client_id]
+                    self.condition.notify_all()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+HTML Document - مستند HTML يُحلَّل مرة واحدة
+"""
+
+import time
+from typing import Dict, Optional
+from bs4 import BeautifulSoup
+
+# أسرع محلل متاح: selectolax ثم lxml ثم html.parser
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxParser
+    except ImportError:
+        SelectolaxParser = None
+
+try:
+    import lxml  # noqa: F401
+    BS4_FEATURES = 'lxml'
+except ImportError:
+    BS4_FEATURES = 'html.parser'
+
+class HtmlDocument:
+    """صفحة محللة تتشاركها مستخرجات الصور ومحلل الملفات الشخصية"""
+
+    def __init__(self, html: str, url: str):
+        self.html = html
+        self.url = url
+        self._soup = None
+        self._tree = None
+        self._meta = None
+        self._title = False
+        # الزمن المستغرق في بناء الشجرة، لأن التحليل يحدث عند أول استعلام
+        self.parse_seconds = 0.0
+
+    @property
+    def backend(self) -> str:
+        return 'selectolax' if SelectolaxParser is not None else BS4_FEATURES
+
+    @property
+    def soup(self) -> BeautifulSoup:
+        """شجرة BeautifulSoup عند الحاجة لاستعلامات غير مدعومة هنا"""
+        if self._soup is None:
+            started = time.perf_counter()
+            self._soup = BeautifulSoup(self.html, BS4_FEATURES)
+            self.parse_seconds += time.perf_counter() - started
+        return self._soup
+
+    def meta(self, key: str) -> Optional[str]:
+        """قيمة content لوسم meta حسب property أو name"""
+        if self._meta is None:
+            self._meta = self._collect_meta()
+        return self._meta.get(key)
+
+    @property
+    def title(self) -> Optional[str]:
+        """عنوان الصفحة"""
+        if self._title is False:
+            self._title = self._find_title()
+        return self._title
+
+    def _collect_meta(self) -> Dict[str, str]:
+        """جمع كل وسوم meta في مرور واحد، مع الإبقاء على أول قيمة لكل مفتاح"""
+        meta = {}
+        if SelectolaxParser is not None:
+            tags = (node.attributes for node in self._get_tree().css('meta'))
+        else:
+            tags = (tag.attrs for tag in self.soup.find_all('meta'))
+
+        for attrs in tags:
+            content = attrs.get('content')
+            if not content:
+                continue
+            for attr in ('property', 'name'):
+                key = attrs.get(attr)
+                if key and key not in meta:
+                    meta[key] = content
+        return meta
+
+    def _find_title(self) -> Optional[str]:
+        if SelectolaxParser is not None:
+            node = self._get_tree().css_first('title')
+            text = node.text() if node is not None else None
+        else:
+            title = self.soup.title
+            text = title.string if title else None
+        return text.strip() if text else None
+
+    def _get_tree(self):
+        if self._tree is None:
+            started = time.perf_counter()
+            self._tree = SelectolaxParser(self.html)
+            self.parse_seconds += time.perf_counter() - started
+        return self._tree
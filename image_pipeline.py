@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Image Pipeline - معالجة الصور دون إعادة ترميز غير ضرورية
+"""
+
+import io
+from typing import Dict, List, Optional, Sequence
+from PIL import Image
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'AVIF': 'image/avif',
+    'GIF': 'image/gif',
+}
+
+# الصيغ التي ترسلها بعض الشبكات دون نوع صورة صريح
+GENERIC_CONTENT_TYPES = ('application/octet-stream', 'binary/octet-stream')
+
+# لا نحاول قراءة الترويسة بعد هذا الحجم
+HEADER_PROBE_LIMIT = 1024 * 1024
+
+def check_dimensions(img: Image.Image, max_pixels: Optional[int]):
+    """رفض الصور التي تتجاوز عدد البكسلات المسموح"""
+    width, height = img.size
+    if max_pixels and width * height > max_pixels:
+        raise ValueError(f'أبعاد الصورة كبيرة جداً: {width}x{height}')
+
+class BoundedImageReader:
+    """تجميع جسم الصورة على دفعات مع حدود للحجم والأبعاد ورفض مبكر"""
+
+    def __init__(self, max_bytes: int, max_pixels: Optional[int],
+                 content_type: Optional[str] = None, content_length: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.buffer = io.BytesIO()
+        self.received = 0
+        self.size = None
+        # حجم المقروء الذي تُعاد عنده محاولة قراءة الترويسة
+        self.next_probe = 0
+
+        # رفض قبل قراءة أي بايت
+        mime = (content_type or '').split(';')[0].strip().lower()
+        if mime and not mime.startswith('image/') and mime not in GENERIC_CONTENT_TYPES:
+            raise ValueError(f'المحتوى ليس صورة: {mime}')
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise ValueError(f'حجم الصورة كبير جداً: {content_length} بايت')
+
+    def feed(self, chunk: bytes):
+        """إضافة دفعة وفحص الحدود"""
+        self.buffer.write(chunk)
+        self.received = received = self.buffer.tell()
+        if received > self.max_bytes:
+            raise ValueError(f'حجم الصورة تجاوز الحد: {self.max_bytes} بايت')
+
+        if self.size is None and self.next_probe <= received <= HEADER_PROBE_LIMIT:
+            self._probe_header()
+            # مضاعفة الحد بعد كل محاولة تبقي كلفة المحاولات خطية بدل فتح المقروء كله مع كل دفعة
+            self.next_probe = received * 2
+
+    def _probe_header(self):
+        """قراءة الأبعاد من الترويسة فور وصولها، دون فك ترميز البكسلات"""
+        position = self.buffer.tell()
+        try:
+            self.buffer.seek(0)
+            img = Image.open(self.buffer)
+            self.size = img.size
+        except Image.DecompressionBombError as e:
+            raise ValueError(f'أبعاد الصورة كبيرة جداً: {e}')
+        except Exception:
+            # الترويسة لم تكتمل بعد
+            return
+        finally:
+            self.buffer.seek(position)
+
+        check_dimensions(img, self.max_pixels)
+
+    def getvalue(self) -> bytes:
+        """البيانات المجمعة دون نسخة إضافية"""
+        data = self.buffer.getvalue()
+        self.buffer = None
+        return data
+
+class ImagePipeline:
+    """تحويل بيانات الصورة حسب الوضع: reencode أو passthrough أو auto"""
+
+    MODES = ('reencode', 'passthrough', 'auto')
+
+    def __init__(self, mode: str = 'auto', output_format: str = 'JPEG', quality: int = 95,
+                 min_size: int = 400, upscale_to: Optional[int] = 800, max_size: Optional[int] = 1080,
+                 passthrough_formats: Sequence[str] = ('JPEG', 'PNG', 'WEBP'),
+                 variants: Sequence[int] = (), max_pixels: Optional[int] = 25_000_000):
+        if mode not in self.MODES:
+            raise ValueError(f'وضع غير معروف: {mode}')
+
+        output_format = output_format.upper()
+        Image.init()
+        if output_format not in Image.SAVE:
+            print(f"⚠️ الصيغة {output_format} غير مدعومة في Pillow، سيتم استخدام JPEG")
+            output_format = 'JPEG'
+
+        self.mode = mode
+        self.output_format = output_format
+        self.quality = quality
+        self.min_size = min_size
+        self.upscale_to = upscale_to
+        self.max_size = max_size
+        self.passthrough_formats = tuple(f.upper() for f in passthrough_formats)
+        self.variants = tuple(sorted(variants))
+        self.max_pixels = max_pixels
+
+    def process(self, image_data: bytes) -> Dict:
+        """معالجة الصورة وإرجاع البيانات النهائية مع المقاسات المطلوبة"""
+        # فتح الصورة يقرأ الترويسة فقط دون فك الترميز
+        img = Image.open(io.BytesIO(image_data))
+        check_dimensions(img, self.max_pixels)
+
+        if self._can_pass_through(img):
+            result = {
+                'data': image_data,
+                'format': img.format,
+                'mime': MIME_TYPES.get(img.format, 'application/octet-stream'),
+                'resolution': img.size,
+                'passthrough': True,
+            }
+        else:
+            img = self._decode(img)
+            encoded = self._encode(self._prepare_main(img))
+            result = dict(encoded, passthrough=False)
+
+        if self.variants:
+            if result['passthrough']:
+                img = self._decode(img)
+            result['variants'] = self._make_variants(img)
+        return result
+
+    def _can_pass_through(self, img: Image.Image) -> bool:
+        if self.mode == 'reencode' or img.format not in self.passthrough_formats:
+            return False
+        if self.mode == 'passthrough':
+            return True
+
+        longest = max(img.size)
+        if longest < self.min_size:
+            return False
+        return self.max_size is None or longest <= self.max_size
+
+    def _decode(self, img: Image.Image) -> Image.Image:
+        """فك الترميز، مع تصغير JPEG أثناء الفك عبر draft"""
+        needed = max([self.max_size or 0] + list(self.variants)) or None
+        if img.format == 'JPEG' and needed and max(img.size) > needed:
+            # يفك JPEG مباشرة بمقياس 1/2 أو 1/4 أو 1/8 بدل الحجم الكامل
+            img.draft('RGB', (needed, needed))
+        img.load()
+        return img
+
+    def _prepare_main(self, img: Image.Image) -> Image.Image:
+        if self.max_size and max(img.size) > self.max_size:
+            img = img.copy()
+            img.thumbnail((self.max_size, self.max_size), Image.Resampling.LANCZOS)
+
+        # تحسين الجودة إذا كانت صغيرة
+        if self.upscale_to and max(img.size) < self.min_size:
+            img = img.resize((self.upscale_to, self.upscale_to), Image.Resampling.LANCZOS)
+        return img
+
+    def _make_variants(self, img: Image.Image) -> List[Dict]:
+        """توليد كل المقاسات من فك ترميز واحد"""
+        variants = []
+        for size in self.variants:
+            variant = img.copy()
+            variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+            variants.append(dict(self._encode(variant), size=size))
+        return variants
+
+    def _encode(self, img: Image.Image) -> Dict:
+        """ترميز الصورة بالصيغة المطلوبة"""
+        if self.output_format == 'JPEG':
+            img = self._flatten(img)
+        elif img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+
+        buffered = io.BytesIO()
+        img.save(buffered, format=self.output_format, quality=self.quality)
+        return {
+            'data': buffered.getvalue(),
+            'format': self.output_format,
+            'mime': MIME_TYPES.get(self.output_format, 'application/octet-stream'),
+            'resolution': img.size,
+        }
+
+    def _flatten(self, img: Image.Image) -> Image.Image:
+        """دمج الشفافية على خلفية بيضاء لأن JPEG لا يدعمها"""
+        if img.mode == 'P':
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        if img.mode in ('RGBA', 'LA'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            return background
+        if img.mode != 'RGB':
+            return img.convert('RGB')
+        return img
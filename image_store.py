@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Image Store - مخزن الصور حسب المحتوى
+"""
+
+import base64
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional
+
+HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+def sniff_mimetype(header: bytes) -> str:
+    """تحديد نوع الصورة من أول بايتات"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    if header[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    if header.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    return 'application/octet-stream'
+
+class ImageStore:
+    """تخزين الصور على القرص بمفتاح SHA-256 لمحتواها"""
+
+    def __init__(self, root: str = 'avatar_store'):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, data: bytes) -> str:
+        """حفظ الصورة مرة واحدة فقط وإرجاع بصمتها"""
+        image_hash = hashlib.sha256(data).hexdigest()
+        path = self._path(image_hash)
+        if os.path.exists(path):
+            return image_hash
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # كتابة ذرية حتى لا يُقرأ ملف ناقص
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return image_hash
+
+    def path_for(self, image_hash: str) -> Optional[str]:
+        """مسار الصورة إن وجدت"""
+        if not HASH_PATTERN.match(image_hash or ''):
+            return None
+        path = self._path(image_hash)
+        return path if os.path.exists(path) else None
+
+    def mimetype_for(self, image_hash: str) -> Optional[str]:
+        """نوع الصورة المخزنة"""
+        path = self.path_for(image_hash)
+        if not path:
+            return None
+        with open(path, 'rb') as f:
+            return sniff_mimetype(f.read(16))
+
+    def load(self, image_hash: str) -> Optional[bytes]:
+        """بايتات الصورة كما هي"""
+        path = self.path_for(image_hash)
+        if not path:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def load_data_url(self, image_hash: str) -> Optional[str]:
+        """قراءة الصورة كرابط data بصيغة base64"""
+        data = self.load(image_hash)
+        if data is None:
+            return None
+        return f"data:{sniff_mimetype(data[:16])};base64,{base64.b64encode(data).decode()}"
+
+    def _path(self, image_hash: str) -> str:
+        return os.path.join(self.root, image_hash[:2], image_hash)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Job Manager - إدارة المهام الخلفية
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from profile_analyzer import ReportGenerator
+
+class Job:
+    """مهمة دفعة واحدة بنتائجها المعزولة"""
+
+    def __init__(self, urls: List[str], client_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.urls = urls
+        self.client_id = client_id
+        self.status = 'queued'
+        self.results = [None] * len(urls)
+        self.completed = 0
+        self.succeeded = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def record(self, index: int, result: Dict):
+        """تسجيل نتيجة رابط واحد"""
+        with self.lock:
+            self.results[index] = result
+            self.completed += 1
+            if result.get('success'):
+                self.succeeded += 1
+
+    def is_finished(self) -> bool:
+        return self.status in ('completed', 'cancelled', 'failed')
+
+    def to_dict(self, include_results: bool = True) -> Dict:
+        """حالة المهمة مع عدادات التقدم والنتائج الجزئية"""
+        with self.lock:
+            data = {
+                'job_id': self.id,
+                'status': self.status,
+                'progress': {
+                    'total': len(self.urls),
+                    'completed': self.completed,
+                    'successful': self.succeeded,
+                    'failed': self.completed - self.succeeded,
+                },
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+            if self.error:
+                data['error'] = self.error
+            if include_results:
+                data['results'] = list(self.results)
+            if self.is_finished():
+                data['summary'] = ReportGenerator.generate_summary([r for r in self.results if r])
+            return data
+
+class JobManager:
+    """طابور مهام مع مجموعة عمال محدودة داخل العملية"""
+
+    def __init__(self, engine, max_workers: int = 2, max_queued: int = 100, max_finished: int = 1000,
+                 scheduler=None):
+        self.engine = engine
+        # FairScheduler اختياري تمر عبره روابط المهام كعمل غير تفاعلي للعميل صاحب المهمة
+        self.scheduler = scheduler
+        self.max_finished = max_finished
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._worker, name=f'job-worker-{i}', daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, urls: List[str], client_id: Optional[str] = None) -> Job:
+        """إضافة مهمة للطابور؛ يرفع queue.Full إذا امتلأ"""
+        job = Job(urls, client_id)
+        self.queue.put_nowait(job)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._evict_finished()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """إلغاء مهمة في الطابور أو قيد التنفيذ"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+
+        job.cancel_event.set()
+        with job.lock:
+            if job.status == 'queued':
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+        return job
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self._run(job)
+            finally:
+                self.queue.task_done()
+
+    def _run(self, job: Job):
+        with job.lock:
+            if job.cancel_event.is_set():
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+
+        print(f"🧵 بدء المهمة {job.id} ({len(job.urls)} روابط)")
+        submit = None
+        if self.scheduler is not None:
+            submit = self.scheduler.submitter(job.client_id or 'jobs', interactive=False)
+        try:
+            for index, result in self.engine.iter_results(job.urls, job.cancel_event, submit=submit):
+                job.record(index, result)
+            status = 'cancelled' if job.cancel_event.is_set() else 'completed'
+        except Exception as e:
+            job.error = f'خطأ في المهمة: {str(e)}'
+            status = 'failed'
+
+        with job.lock:
+            job.status = status
+            job.finished_at = time.time()
+        print(f"🏁 انتهت المهمة {job.id}: {status}")
+
+    def _evict_finished(self):
+        """الاحتفاظ بعدد محدود من المهام المنتهية"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.is_finished()]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+JSON Scanner - ماسح JSON مضمن في الصفحات دون تحليله كاملاً
+"""
+
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+# نص JSON كامل أو قوس؛ النصوص تُتخطى كوحدة حتى لا تُحسب الأقواس داخلها
+_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]', re.S)
+# مثله مع علامة " وحدها لنص لم يكتمل بعد في نهاية الدفعة
+_PARTIAL_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]|"', re.S)
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+_WHITESPACE = re.compile(r'\s*')
+_PRIMITIVE = re.compile(r'[^,}\]\s]*')
+
+_decoder = json.JSONDecoder()
+
+def find_json_object(text: str, start: int) -> Optional[Tuple[int, int]]:
+    """حدود الكائن أو المصفوفة التي تبدأ عند start، أو None إن لم يكتمل"""
+    if start >= len(text) or text[start] not in '{[':
+        return None
+
+    depth = 0
+    for match in _TOKEN.finditer(text, start):
+        token = match.group()
+        if token[0] == '"':
+            continue
+        if token in '{[':
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return start, match.end()
+    return None
+
+class JsonObjectScanner:
+    """حدود كائن JSON يصل على دفعات؛ كل حرف يُمسح مرة واحدة ولا يُحفظ إلا نص لم يكتمل"""
+
+    def __init__(self):
+        self.depth = 0
+        self.pending = ''
+        # موضع بداية pending من أول نص مُرر
+        self.offset = 0
+        self.end = None
+
+    def feed(self, piece: str) -> Optional[int]:
+        """إضافة نص يلي ما سبقه؛ يعيد نهاية الكائن (من بداية أول نص) عند اكتماله"""
+        if self.end is not None:
+            return self.end
+        text = self.pending + piece
+        position = len(text)
+        for match in _PARTIAL_TOKEN.finditer(text):
+            token = match.group()
+            if token == '"':
+                # نص مقسوم بين دفعتين: يُستأنف من بدايته مع الدفعة التالية
+                position = match.start()
+                break
+            if token[0] == '"':
+                continue
+            if token in '{[':
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.end = self.offset + match.end()
+                    self.pending = ''
+                    return self.end
+        self.pending = text[position:]
+        self.offset += position
+        return None
+
+def extract_json_paths(text: str, start: int, paths: List[str]) -> Dict[str, object]:
+    """استخراج قيم مسارات محددة (مفاتيح كائنات مفصولة بنقاط) مع تخطي بقية الكائن"""
+    trie = {}
+    for path in paths:
+        node = trie
+        keys = path.split('.')
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = None
+
+    found = {}
+    try:
+        _PathWalker(text, len(paths), found).walk_object(start, trie, '')
+    except IndexError:
+        # النص انتهى داخل الكائن، مثل صفحة قُطعت عند حد البايتات
+        raise ValueError(f'كائن JSON غير مكتمل عند {start}') from None
+    return found
+
+class _PathWalker:
+    """تجوال في كائن JSON يدخل فقط في المفاتيح المطلوبة"""
+
+    def __init__(self, text: str, wanted: int, found: Dict):
+        self.text = text
+        self.wanted = wanted
+        self.found = found
+
+    def walk_object(self, pos: int, trie: Dict, prefix: str) -> int:
+        text = self.text
+        if text[pos] != '{':
+            return self.skip_value(pos)
+
+        pos = self.skip_ws(pos + 1)
+        if text[pos] == '}':
+            return pos + 1
+
+        while True:
+            key_match = _STRING.match(text, pos)
+            if not key_match:
+                raise ValueError(f'مفتاح JSON غير صالح عند {pos}')
+            raw_key = key_match.group()
+            key = raw_key[1:-1] if '\\' not in raw_key else json.loads(raw_key)
+
+            pos = self.skip_ws(key_match.end())
+            if text[pos] != ':':
+                raise ValueError(f'متوقع ":" عند {pos}')
+            pos = self.skip_ws(pos + 1)
+
+            if key in trie:
+                path = f'{prefix}{key}'
+                if trie[key] is None:
+                    value, pos = _decoder.raw_decode(text, pos)
+                    self.found[path] = value
+                else:
+                    pos = self.walk_object(pos, trie[key], path + '.')
+            else:
+                pos = self.skip_value(pos)
+
+            # لا داعي لإكمال المسح بعد إيجاد كل المسارات
+            if len(self.found) == self.wanted:
+                return pos
+
+            pos = self.skip_ws(pos)
+            if text[pos] == ',':
+                pos = self.skip_ws(pos + 1)
+            elif text[pos] == '}':
+                return pos + 1
+            else:
+                raise ValueError(f'متوقع "," أو "}}" عند {pos}')
+
+    def skip_value(self, pos: int) -> int:
+        text = self.text
+        char = text[pos]
+        if char in '{[':
+            bounds = find_json_object(text, pos)
+            if bounds is None:
+                raise ValueError(f'كائن JSON غير مكتمل عند {pos}')
+            return bounds[1]
+        if char == '"':
+            match = _STRING.match(text, pos)
+            if not match:
+                raise ValueError(f'نص JSON غير مكتمل عند {pos}')
+            return match.end()
+        return _PRIMITIVE.match(text, pos).end()
+
+    def skip_ws(self, pos: int) -> int:
+        return _WHITESPACE.match(self.text, pos).end()
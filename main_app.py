@@ -3,59 +3,67 @@
 Main Application - التطبيق الرئيسي
 """
 
-import time
-import random
-from typing import List, Dict
+from concurrent.futures import Future
+from typing import Callable, List, Dict, Iterator, Optional, Tuple, Union
 from avatar_extractor import AvatarExtractor
-from profile_analyzer import ProfileAnalyzer, ReportGenerator
+from batch_engine import BatchEngine, PlatformRateLimiter
+from deadline import Deadline, as_deadline
+from transcode_pool import TranscodePool
+from profile_analyzer import ProfileAnalyzer, SummaryAggregator
 
 class SocialMediaExtractorApp:
     """التطبيق الرئيسي"""
     
-    def __init__(self):
-        self.avatar_extractor = AvatarExtractor()
+    def __init__(self, max_workers: int = 8, rate_limits: Optional[Dict[str, float]] = None, cache=None,
+                 image_store=None, transcode_workers: int = 0, profiler=None):
+        self.avatar_extractor = AvatarExtractor(cache=cache, image_store=image_store, profiler=profiler)
+        # معالجة الصور في عمليات منفصلة عند تحديد عدد العمال
+        if transcode_workers:
+            self.avatar_extractor.transcode_pool = TranscodePool(
+                self.avatar_extractor.image_pipeline,
+                max_workers=transcode_workers
+            )
         self.profile_analyzer = ProfileAnalyzer()
+        # حدود المعدل بعدد الطلبات في الثانية لكل منصة
+        self.engine = BatchEngine(
+            self.avatar_extractor,
+            max_workers=max_workers,
+            rate_limiter=PlatformRateLimiter(rate_limits)
+        )
         self.results = []
+        # ملخص آخر تشغيل يتحدث مع وصول كل نتيجة
+        self.aggregator = SummaryAggregator()
     
-    def process_urls(self, urls: List[str]) -> List[Dict]:
-        """معالجة قائمة الروابط"""
+    def process_urls(self, urls: List[str], submit: Optional[Callable[..., Future]] = None,
+                     deadline: Union[Deadline, float, None] = None) -> List[Dict]:
+        """معالجة قائمة الروابط، عبر مجدول خارجي عند تمرير submit، وضمن deadline (أو ثوانٍ) اختياري"""
         print(f"🚀 بدء معالجة {len(urls)} روابط...")
-        self.results = []
-        
-        for i, url in enumerate(urls, 1):
-            print(f"\n📍 معالجة الرابط {i}/{len(urls)}: {url}")
-            
-            try:
-                # استخراج الصورة
-                result = self.avatar_extractor.extract_avatar(url)
-                self.results.append(result)
-                
-                # عرض النتيجة
-                if result['success']:
-                    print(f"   ✅ نجح - {result.get('platform')} - {result.get('resolution', (0, 0))[0]}x{result.get('resolution', (0, 0))[1]}")
-                else:
-                    print(f"   ❌ فشل - {result.get('error')}")
-                
-            except Exception as e:
-                error_result = {
-                    'success': False, 
-                    'error': f'خطأ غير متوقع: {str(e)}', 
-                    'input_url': url
-                }
-                self.results.append(error_result)
-                print(f"   💥 خطأ - {str(e)}")
-            
-            # تأخير بين الطلبات
-            if i < len(urls):
-                delay = random.uniform(1, 3)
-                time.sleep(delay)
+        # نتائج وملخص لكل استدعاء: التطبيق مشترك بين طلبات الخادم المتزامنة
+        aggregator = SummaryAggregator()
+        results = [None] * len(urls)
+        for index, result in self.engine.iter_results(urls, submit=submit, deadline=as_deadline(deadline)):
+            results[index] = result
+            aggregator.add(result)
         
+        # آخر دفعة مكتملة لـ get_summary و get_successful_results
+        self.results, self.aggregator = results, aggregator
+        print(f"\n🎊 اكتملت معالجة جميع الروابط!")
+        return results
+    
+    def iter_results(self, urls: List[str], submit: Optional[Callable[..., Future]] = None,
+                     deadline: Union[Deadline, float, None] = None) -> Iterator[Tuple[int, Dict]]:
+        """معالجة الروابط وإرجاع كل نتيجة فور اكتمالها مع رقمها"""
+        print(f"🚀 بدء معالجة {len(urls)} روابط (بث)...")
+        aggregator = SummaryAggregator()
+        for index, result in self.engine.iter_results(urls, submit=submit, deadline=as_deadline(deadline)):
+            aggregator.add(result)
+            yield index, result
+        self.aggregator = aggregator
         print(f"\n🎊 اكتملت معالجة جميع الروابط!")
-        return self.results
     
     def get_summary(self) -> Dict:
-        """الحصول على ملخص النتائج"""
-        return ReportGenerator.generate_summary(self.results)
+        """الحصول على ملخص النتائج دون إعادة المرور عليها"""
+        return self.aggregator.summary()
     
     def get_successful_results(self) -> List[Dict]:
         """الحصول على النتائج الناجحة فقط"""
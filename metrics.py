@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics - عدادات ومدرجات زمنية لكل مرحلة ومنصة بصيغة Prometheus النصية
+"""
+
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+
+# حدود المدرج بالثواني: من جزء من الميلي ثانية للتحليل حتى مهلة الشبكة
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def error_class_of(error: BaseException) -> str:
+    """تصنيف الخطأ للتسميات: error_class إن وُجد وإلا اسم الاستثناء"""
+    return getattr(error, 'error_class', None) or type(error).__name__
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class Counter:
+    """عداد تراكمي بتسميات"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> str:
+        with self.lock:
+            items = sorted(self.values.items())
+        return ''.join(
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}\n'
+            for key, value in items
+        )
+
+class Histogram:
+    """مدرج زمني بحدود ثابتة ومجموع وعدد لكل مجموعة تسميات"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> str:
+        with self.lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self.values.items())
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}\n')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}\n')
+            lines.append(f'{self.name}_count{labels} {count}\n')
+        return ''.join(lines)
+
+class MetricsRegistry:
+    """مجموعة المقاييس التي يعرضها /metrics"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """كل المقاييس بصيغة Prometheus النصية"""
+        parts = []
+        for metric in self.metrics:
+            parts.append(f'# HELP {metric.name} {metric.documentation}\n')
+            parts.append(f'# TYPE {metric.name} {metric.kind}\n')
+            parts.append(metric.render())
+        return ''.join(parts)
+
+class ExtractionMetrics:
+    """مقاييس مراحل الاستخراج: fetch و parse و candidates و selection و download و transcode"""
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        self.registry = registry or MetricsRegistry()
+        self.stage_seconds = self.registry.histogram(
+            'avatar_stage_duration_seconds', 'زمن كل مرحلة حسب المنصة', ('stage', 'platform'))
+        self.stage_failures = self.registry.counter(
+            'avatar_stage_failures_total', 'إخفاقات كل مرحلة حسب نوع الخطأ', ('stage', 'platform', 'error_class'))
+        self.bytes_in = self.registry.counter(
+            'avatar_bytes_in_total', 'البايتات المقروءة من الشبكة', ('stage', 'platform'))
+        self.bytes_out = self.registry.counter(
+            'avatar_bytes_out_total', 'بايتات الصور الناتجة بعد المعالجة', ('platform',))
+        self.extraction_seconds = self.registry.histogram(
+            'avatar_extraction_duration_seconds', 'الزمن الكلي لاستخراج رابط واحد', ('platform',))
+        self.extractions = self.registry.counter(
+            'avatar_extractions_total', 'نتائج الاستخراج', ('platform', 'outcome', 'error_class'))
+        self.retries = self.registry.counter(
+            'avatar_retries_total', 'إعادة المحاولات حسب السبب', ('platform', 'reason'))
+
+    def observe_stage(self, stage: str, platform: str, seconds: float):
+        self.stage_seconds.observe(seconds, stage=stage, platform=platform)
+
+    def stage_failed(self, stage: str, platform: str, error_class: str):
+        self.stage_failures.inc(stage=stage, platform=platform, error_class=error_class)
+
+    @contextmanager
+    def stage(self, stage: str, platform: str):
+        """قياس زمن مرحلة، وعد الاستثناءات التي تخرج منها"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.stage_failed(stage, platform, error_class_of(e))
+            raise
+        finally:
+            self.observe_stage(stage, platform, time.perf_counter() - started)
+
+    def record_result(self, platform: str, result: Dict, seconds: float, outcome: Optional[str] = None):
+        """تسجيل النتيجة النهائية لرابط واحد"""
+        if outcome is None:
+            outcome = 'success' if result.get('success') else 'failure'
+        error_class = '' if result.get('success') else result.get('error_class', 'unknown')
+        self.extractions.inc(platform=platform, outcome=outcome, error_class=error_class)
+        self.extraction_seconds.observe(seconds, platform=platform)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+class SlowRequestProfiler:
+    """تشغيل cProfile على عينة من الطلبات وحفظ ملف التحليل إذا كان الطلب بطيئاً"""
+
+    def __init__(self, threshold: float = 2.0, sample_rate: float = 0.05,
+                 output_dir: str = 'profiles', max_files: int = 100):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.output_dir = os.path.abspath(output_dir)
+        self.max_files = max_files
+        self.saved = 0
+        # cProfile يقيس خيطاً واحداً، ولا نريد أكثر من محلل نشط في الوقت نفسه
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def sample(self, label: str):
+        """تحليل الطلب إذا وقع في العينة ولم يكن هناك طلب آخر قيد التحليل"""
+        if self.saved >= self.max_files or random.random() >= self.sample_rate \
+                or not self.lock.acquire(blocking=False):
+            yield
+            return
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+
+            elapsed = time.perf_counter() - started
+            if elapsed >= self.threshold:
+                self._dump(profiler, label, elapsed)
+        finally:
+            self.lock.release()
+
+    def _dump(self, profiler: cProfile.Profile, label: str, elapsed: float):
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_label = ''.join(c if c.isalnum() else '_' for c in label)[:60]
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}.prof")
+        profiler.dump_stats(path)
+        self.saved += 1
+        print(f"🐢 طلب بطيء ({elapsed:.2f}s)، تم حفظ التحليل في {path}")
+
+# المقاييس المشتركة؛ يعرضها server.py على /metrics
+default_metrics = ExtractionMetrics()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Page Stream - قراءة الصفحة على دفعات والتوقف عند إيجاد الصور
+"""
+
+import codecs
+import re
+from typing import Dict, Optional, Tuple
+from deadline import Deadline
+from json_scanner import JsonObjectScanner
+from platform_registry import Platform
+
+HEAD_END = re.compile(r'</head\s*>', re.I)
+
+# تداخل بين الدفعات حتى لا تضيع علامة مقسومة على دفعتين
+OVERLAP = 4096
+
+class PageStopTracker:
+    """متابعة النص الوارد ومعرفة متى يكفي ما وصل للاستخراج"""
+
+    def __init__(self, platform: Platform, need_head: bool = False):
+        self.platform = platform
+        has_marker = platform.embedded_json_start is not None or platform.stop_pattern is not None
+        # المنصات بلا علامات خاصة تكتفي بـ <head> حيث وسوم meta
+        self.marker_done = not has_marker
+        self.need_head = need_head or not has_marker
+        self.head_done = False
+        self.parts = []
+        self.length = 0
+        self.tail = ''
+        self.json_start = None
+        self.json_scanner = None
+
+    def feed(self, piece: str) -> bool:
+        """إضافة نص جديد وإرجاع True إذا أصبح كافياً"""
+        self.parts.append(piece)
+        window_offset = self.length - len(self.tail)
+        window = self.tail + piece
+        self.length += len(piece)
+        self.tail = window[-OVERLAP:]
+
+        if self.need_head and not self.head_done:
+            self.head_done = HEAD_END.search(window) is not None
+
+        if not self.marker_done:
+            if self.platform.embedded_json_start is not None:
+                self.marker_done = self._check_embedded_json(window, window_offset, piece)
+            else:
+                self.marker_done = self.platform.stop_pattern.search(window) is not None
+
+        return self.marker_done and (self.head_done or not self.need_head)
+
+    def text(self) -> str:
+        return ''.join(self.parts)
+
+    def _check_embedded_json(self, window: str, window_offset: int, piece: str) -> bool:
+        """الكائن المضمن (مثل ytInitialData) يكفي عندما يكتمل"""
+        if self.json_scanner is None:
+            match = self.platform.embedded_json_start.search(window)
+            if not match:
+                return False
+            self.json_start = window_offset + match.end() - 1
+            self.json_scanner = JsonObjectScanner()
+            # بقية النافذة بعد بداية الكائن لم تُمسح بعد
+            return self.json_scanner.feed(window[match.end() - 1:]) is not None
+
+        # الماسح يحتفظ بموضعه فتُمسح الدفعة الجديدة وحدها
+        return self.json_scanner.feed(piece) is not None
+
+def read_page(response, platform: Platform, max_bytes: int, chunk_size: int = 65536,
+              need_head: bool = False, deadline: Optional[Deadline] = None) -> Tuple[str, Dict]:
+    """قراءة جسم الاستجابة حتى يكفي للاستخراج أو يبلغ الحد الأقصى أو تنتهي المهلة"""
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    tracker = PageStopTracker(platform, need_head)
+    received = 0
+    reason = 'complete'
+
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        received += len(chunk)
+        if deadline is not None:
+            deadline.check()
+        if tracker.feed(decoder.decode(chunk)):
+            reason = 'markers'
+            break
+        if received >= max_bytes:
+            reason = 'byte_cap'
+            break
+    else:
+        tracker.feed(decoder.decode(b'', final=True))
+
+    return tracker.text(), {'bytes_read': received, 'stop_reason': reason}
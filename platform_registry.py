@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+Platform Registry - سجل المنصات وأنماطها المترجمة
+"""
+
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse
+from json_scanner import extract_json_paths
+from records import AvatarCandidate
+
+# بادئات النطاق التي تشير لنفس الموقع
+HOST_PREFIXES = ('www.', 'm.', 'mobile.')
+
+# معاملات تتبع لا تغير الصفحة؛ بقية الاستعلام جزء من هويتها (profile.php?id= و watch?v=)
+TRACKING_PARAMS = frozenset(('fbclid', 'gclid', 'igshid', 'igsh', 'si', 'feature', 'ref', 'ref_src', 'ref_url',
+                             't', 'hl', 'lang', 'locale', 'mibextid', '_rdr'))
+TRACKING_PREFIXES = ('utm_',)
+
+def _unescape_json_url(url: str) -> str:
+    return url.replace('\\u0026', '&').replace('\\/', '/')
+
+def clean_url(url: str) -> str:
+    """إزالة المسافات وإضافة https:// عند غيابه"""
+    url = url.strip()
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+def _identity_query(query: str) -> str:
+    params = [(key, value) for key, value in parse_qsl(query, keep_blank_values=True)
+              if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)]
+    return urlencode(sorted(params))
+
+def normalize_url(url: str) -> str:
+    """توحيد الرابط: نطاق بأحرف صغيرة دون www. أو m.، ومسار دون / أخيرة، واستعلام مرتب دون معاملات التتبع"""
+    parsed = urlparse(clean_url(url))
+    hostname = parsed.netloc.lower()
+    for prefix in HOST_PREFIXES:
+        if hostname.startswith(prefix):
+            hostname = hostname[len(prefix):]
+            break
+
+    path = parsed.path.rstrip('/')
+    query = _identity_query(parsed.query)
+    return f"{hostname}{path}?{query}" if query else f"{hostname}{path}"
+
+class AvatarPattern:
+    """مفتاح JSON مضمن يحمل رابط صورة"""
+
+    def __init__(self, key: str, quality: int, transform: Optional[Callable[[str], str]] = None):
+        self.key = key
+        self.quality = quality
+        self.transform = transform
+
+class Platform:
+    """كل ما يخص منصة واحدة: النطاقات، الأنماط، تقديرات الجودة ومحسنات الروابط"""
+
+    def __init__(self, name: str, domains: List[str] = (), patterns: List[AvatarPattern] = (),
+                 og_image_quality: Optional[int] = None, og_image_transform: Optional[Callable[[str], str]] = None,
+                 embedded_extractor: Optional[Callable] = None, embedded_json_start=None,
+                 username_pattern: Optional[str] = None, profile_url: Optional[str] = None,
+                 reserved_usernames: List[str] = ()):
+        self.name = name
+        self.domains = tuple(domains)
+        self.patterns = list(patterns)
+        self.og_image_quality = og_image_quality
+        self.og_image_transform = og_image_transform
+        # دالة (doc, platform) -> مرشحين من بيانات مضمنة مثل ytInitialData
+        self.embedded_extractor = embedded_extractor
+        # بداية كائن JSON الذي يكفي اكتماله للاستخراج أثناء القراءة المتدفقة
+        self.embedded_json_start = embedded_json_start
+        self.username_pattern = re.compile(username_pattern) if username_pattern else None
+        # قالب الرابط الموحد للملف الشخصي، مثل https://x.com/{username}
+        self.profile_url = profile_url
+        # مسارات تطابق نمط اسم المستخدم لكنها ليست ملفات شخصية
+        self.reserved_usernames = frozenset(reserved_usernames)
+
+        self._pattern_index = {p.key: i for i, p in enumerate(self.patterns)}
+        self.combined_pattern = None
+        self.stop_pattern = None
+        if self.patterns:
+            keys = '|'.join(re.escape(p.key) for p in self.patterns)
+            # مسح واحد لكل مفاتيح المنصة بدل findall لكل نمط
+            self.combined_pattern = re.compile(rf'"({keys})"\s*:\s*"([^"]+)"')
+            top = re.escape(self.patterns[0].key)
+            self.stop_pattern = re.compile(rf'"{top}"\s*:\s*"[^"]+"')
+
+    def matches_host(self, hostname: str) -> bool:
+        """هل النطاق يخص هذه المنصة"""
+        return any(hostname == d or hostname.endswith('.' + d) for d in self.domains)
+
+    def username_for(self, url: str) -> Optional[str]:
+        """اسم المستخدم من الرابط بأحرف صغيرة، أو None إذا لم يكن رابط ملف شخصي"""
+        if self.username_pattern is None:
+            return None
+        match = self.username_pattern.search(url)
+        if not match:
+            return None
+        username = match.group(1).lower()
+        return None if username in self.reserved_usernames else username
+
+    def candidate(self, url: str, quality: int, width: int = None, height: int = None) -> AvatarCandidate:
+        return AvatarCandidate(
+            url=url,
+            width=quality if width is None else width,
+            height=quality if height is None else height,
+            platform=self.name,
+            quality=quality
+        )
+
+    def extract_candidates(self, doc) -> List[Dict]:
+        """جمع المرشحين من المفاتيح المضمنة والبيانات الخاصة ووسم og:image"""
+        avatars = []
+
+        if self.combined_pattern is not None:
+            matches = []
+            for match in self.combined_pattern.finditer(doc.html):
+                value = match.group(2)
+                if 'http' in value:
+                    matches.append((self._pattern_index[match.group(1)], value))
+
+            # ترتيب المفاتيح حسب أولويتها كما عُرّفت
+            matches.sort(key=lambda item: item[0])
+            for index, value in matches:
+                pattern = self.patterns[index]
+                url = _unescape_json_url(value)
+                if pattern.transform:
+                    url = pattern.transform(url)
+                avatars.append(self.candidate(url, pattern.quality))
+
+        if self.embedded_extractor is not None:
+            avatars.extend(self.embedded_extractor(doc, self))
+
+        if self.og_image_quality is not None:
+            meta_url = doc.meta('og:image')
+            if meta_url:
+                if self.og_image_transform:
+                    meta_url = self.og_image_transform(meta_url)
+                avatars.append(self.candidate(meta_url, self.og_image_quality))
+
+        return avatars
+
+class PlatformRegistry:
+    """سجل قابل للتوسعة؛ تسجيل منصة جديدة لا يتطلب تعديل أي سلسلة if/elif"""
+
+    def __init__(self, fallback: Platform):
+        self.platforms = []
+        self.fallback = fallback
+
+    def register(self, platform: Platform):
+        """إضافة منصة أو استبدال منصة بنفس الاسم"""
+        self.platforms = [p for p in self.platforms if p.name != platform.name]
+        self.platforms.append(platform)
+
+    def get(self, name: str) -> Platform:
+        for platform in self.platforms:
+            if platform.name == name:
+                return platform
+        return self.fallback
+
+    def detect(self, hostname: str) -> Platform:
+        """المنصة المطابقة للنطاق، أو العامة"""
+        hostname = hostname.lower().split(':')[0]
+        for platform in self.platforms:
+            if platform.matches_host(hostname):
+                return platform
+        return self.fallback
+
+    def canonicalize(self, url: str) -> Tuple[str, str]:
+        """(المنصة، اسم المستخدم)، أو (المنصة، الرابط الموحد) إذا لم يُعرف اسم المستخدم"""
+        url = clean_url(url)
+        platform = self.detect(urlparse(url).netloc)
+        username = platform.username_for(url)
+        if username and platform.profile_url:
+            return platform.name, username
+        return platform.name, normalize_url(url)
+
+    def canonical_key(self, url: str) -> str:
+        """مفتاح نصي واحد لكل ملف شخصي، للتخزين المؤقت ودمج الطلبات"""
+        platform, identity = self.canonicalize(url)
+        return f"{platform}:{identity}"
+
+    def canonical_url(self, url: str) -> str:
+        """الرابط الذي يُجلب فعلاً: رابط الملف الشخصي الموحد إن أمكن"""
+        url = clean_url(url)
+        platform = self.detect(urlparse(url).netloc)
+        username = platform.username_for(url)
+        if username and platform.profile_url:
+            return platform.profile_url.format(username=username)
+        return url
+
+    def __iter__(self):
+        return iter(self.platforms + [self.fallback])
+
+# ===== المنصات المدمجة =====
+
+YT_DATA_START = re.compile(r'(?:var\s+ytInitialData|window\[["\']ytInitialData["\']\])\s*=\s*\{')
+
+YT_THUMBNAIL_PATHS = [
+    'metadata.channelMetadataRenderer.avatar.thumbnails',
+    'microformat.channelMicroformatRenderer.thumbnail.thumbnails',
+]
+
+def enhance_youtube_url(url: str) -> str:
+    """تحسين رابط YouTube"""
+    if not url or 'ytimg.com' not in url:
+        return url
+
+    enhancements = [
+        ('s88-c-k', 's800-c-k'),
+        ('s100-c-k', 's800-c-k'),
+        ('s176-c-k', 's800-c-k'),
+    ]
+
+    for old, new in enhancements:
+        if old in url:
+            return url.replace(old, new)
+    return url
+
+def _extract_youtube_initial_data(doc, platform: Platform) -> List[Dict]:
+    """صور القناة من ytInitialData: نقرأ مسارات الصور فقط دون تحليل الكائن كاملاً"""
+    avatars = []
+    yt_data_match = YT_DATA_START.search(doc.html)
+    if not yt_data_match:
+        return avatars
+
+    yt_data = extract_json_paths(doc.html, yt_data_match.end() - 1, YT_THUMBNAIL_PATHS)
+    for path in YT_THUMBNAIL_PATHS:
+        for thumb in yt_data.get(path) or []:
+            if thumb.get('url'):
+                width = thumb.get('width', 0)
+                height = thumb.get('height', 0)
+                avatars.append(platform.candidate(enhance_youtube_url(thumb['url']), max(width, height), width, height))
+    return avatars
+
+def _create_default_registry() -> PlatformRegistry:
+    registry = PlatformRegistry(Platform('generic', og_image_quality=500))
+
+    registry.register(Platform(
+        'youtube',
+        domains=['youtube.com', 'youtu.be'],
+        og_image_quality=300,
+        og_image_transform=enhance_youtube_url,
+        embedded_extractor=_extract_youtube_initial_data,
+        embedded_json_start=YT_DATA_START,
+        username_pattern=r'/@([A-Za-z0-9_.-]+)',
+        profile_url='https://www.youtube.com/@{username}',
+    ))
+    registry.register(Platform(
+        'instagram',
+        domains=['instagram.com'],
+        patterns=[
+            AvatarPattern('profile_pic_url_hd', 1080),
+            AvatarPattern('profile_pic_url', 1080),
+        ],
+        og_image_quality=1080,
+        og_image_transform=lambda url: url.replace('150x150', '1080x1080'),
+        username_pattern=r'instagram\.com/([^/?#]+)',
+        profile_url='https://www.instagram.com/{username}/',
+        reserved_usernames=['p', 'reel', 'reels', 'tv', 'stories', 'explore', 'accounts', 'direct'],
+    ))
+    registry.register(Platform(
+        'tiktok',
+        domains=['tiktok.com'],
+        patterns=[
+            AvatarPattern('avatarLarger', 1000),
+            AvatarPattern('avatarMedium', 300),
+        ],
+        username_pattern=r'/@([^/?#]+)',
+        profile_url='https://www.tiktok.com/@{username}',
+    ))
+    registry.register(Platform(
+        'twitter',
+        domains=['twitter.com', 'x.com'],
+        patterns=[
+            AvatarPattern('profile_image_url_https', 400,
+                          lambda url: url.replace('_normal', '').replace('_bigger', '')),
+        ],
+        username_pattern=r'(?:twitter|x)\.com/([^/?#]+)',
+        profile_url='https://x.com/{username}',
+        reserved_usernames=['i', 'home', 'search', 'explore', 'intent', 'share', 'hashtag', 'settings'],
+    ))
+    return registry
+
+# السجل المشترك؛ استخدم default_registry.register لإضافة منصة
+default_registry = _create_default_registry()
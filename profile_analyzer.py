@@ -4,24 +4,22 @@ Profile Analyzer - محلل الملفات الشخصية
 """
 
 import re
+import math
+import threading
 from urllib.parse import urlparse
-from typing import Dict, List
-from bs4 import BeautifulSoup
+from typing import Dict, Iterable, List, Optional
 import json
+from html_document import HtmlDocument
+from platform_registry import default_registry
 
 class ProfileAnalyzer:
-    def __init__(self):
-        self.platform_patterns = {
-            'youtube': r'@([A-Za-z0-9_.-]+)',
-            'instagram': r'instagram\.com/([^/?]+)',
-            'tiktok': r'/@([^/?]+)',
-            'twitter': r'twitter\.com/([^/?]+)',
-        }
+    def __init__(self, registry=None):
+        self.registry = registry or default_registry
     
-    def analyze_profile(self, html: str, url: str) -> Dict:
-        """تحليل بيانات الملف الشخصي"""
+    def analyze_profile(self, html, url: str) -> Dict:
+        """تحليل بيانات الملف الشخصي من نص HTML أو HtmlDocument محلل مسبقاً"""
         try:
-            soup = BeautifulSoup(html, 'html.parser')
+            doc = html if isinstance(html, HtmlDocument) else HtmlDocument(html, url)
             hostname = urlparse(url).netloc.lower()
             platform = self._detect_platform(hostname)
             
@@ -35,13 +33,12 @@ class ProfileAnalyzer:
             }
             
             # استخراج من meta tags
-            meta_data = self._extract_meta_data(soup)
+            meta_data = self._extract_meta_data(doc)
             profile_data.update(meta_data)
             
             # استخراج من عنوان الصفحة
-            title = soup.title
-            if title and title.string:
-                profile_data['page_title'] = title.string.strip()
+            if doc.title:
+                profile_data['page_title'] = doc.title
             
             return profile_data
             
@@ -54,22 +51,13 @@ class ProfileAnalyzer:
     
     def _detect_platform(self, hostname: str) -> str:
         """كشف المنصة"""
-        if 'youtube' in hostname or 'youtu.be' in hostname:
-            return 'youtube'
-        elif 'instagram' in hostname:
-            return 'instagram'
-        elif 'tiktok' in hostname:
-            return 'tiktok'
-        elif 'twitter' in hostname or 'x.com' in hostname:
-            return 'twitter'
-        else:
-            return 'generic'
+        return self.registry.detect(hostname).name
     
     def _extract_username(self, url: str, platform: str) -> str:
         """استخراج اسم المستخدم"""
-        if platform in self.platform_patterns:
-            pattern = self.platform_patterns[platform]
-            match = re.search(pattern, url)
+        username_pattern = self.registry.get(platform).username_pattern
+        if username_pattern is not None:
+            match = username_pattern.search(url)
             if match:
                 return match.group(1)
         
@@ -81,7 +69,7 @@ class ProfileAnalyzer:
         
         return None
     
-    def _extract_meta_data(self, soup: BeautifulSoup) -> Dict:
+    def _extract_meta_data(self, doc: HtmlDocument) -> Dict:
         """استخراج البيانات من meta tags"""
         meta_data = {
             'display_name': None,
@@ -89,46 +77,141 @@ class ProfileAnalyzer:
         }
         
         # og:title و og:description
-        og_title = soup.find('meta', property='og:title')
-        og_description = soup.find('meta', property='og:description')
+        og_title = doc.meta('og:title')
+        og_description = doc.meta('og:description')
         
-        if og_title and og_title.get('content'):
-            meta_data['display_name'] = og_title['content']
+        if og_title:
+            meta_data['display_name'] = og_title
         
-        if og_description and og_description.get('content'):
-            meta_data['description'] = og_description['content']
+        if og_description:
+            meta_data['description'] = og_description
         
         return meta_data
 
+class QuantileSketch:
+    """تقدير المئينات بدلاء لوغاريتمية بخطأ نسبي ثابت، فالذاكرة لا تكبر مع عدد القيم"""
+    
+    def __init__(self, relative_accuracy: float = 0.02):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = {}
+        self.zeros = 0
+        self.count = 0
+        self.max = 0.0
+    
+    def add(self, value: float):
+        self.count += 1
+        self.max = max(self.max, value)
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+    
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # منتصف الدلو يحقق الخطأ النسبي المطلوب
+                return min(self.max, 2 * self.gamma ** index / (self.gamma + 1))
+        return self.max
+    
+    def summary(self, digits: int = 3) -> Dict:
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'p50': round(self.quantile(0.5), digits),
+            'p90': round(self.quantile(0.9), digits),
+            'p99': round(self.quantile(0.99), digits),
+            'max': round(self.max, digits),
+        }
+
+class SummaryAggregator:
+    """ملخص يتحدث مع وصول كل نتيجة دون الاحتفاظ بالنتائج نفسها"""
+    
+    def __init__(self):
+        self.total = 0
+        self.successful = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        # المنصة -> [الإجمالي، الناجحة]
+        self.platforms = {}
+        self.error_classes = {}
+        self.latency = QuantileSketch()
+        self.file_size = QuantileSketch()
+        self.lock = threading.Lock()
+    
+    def add(self, result: Dict, seconds: Optional[float] = None):
+        """إضافة نتيجة؛ الزمن من seconds أو من elapsed في ExtractionResult"""
+        if seconds is None:
+            seconds = getattr(result, 'elapsed', None)
+        success = bool(result.get('success'))
+        platform = result.get('platform') or 'unknown'
+        with self.lock:
+            self.total += 1
+            counts = self.platforms.setdefault(platform, [0, 0])
+            counts[0] += 1
+            if success:
+                self.successful += 1
+                counts[1] += 1
+                if result.get('file_size') is not None:
+                    self.file_size.add(result['file_size'])
+            else:
+                error_class = result.get('error_class') or 'unknown'
+                self.error_classes[error_class] = self.error_classes.get(error_class, 0) + 1
+            if result.get('timed_out'):
+                self.timed_out += 1
+            if result.get('cancelled'):
+                self.cancelled += 1
+            if seconds is not None:
+                self.latency.add(seconds)
+    
+    def extend(self, results: Iterable[Dict]) -> 'SummaryAggregator':
+        for result in results:
+            self.add(result)
+        return self
+    
+    def summary(self) -> Dict:
+        with self.lock:
+            failed = self.total - self.successful
+            return {
+                'total_urls': self.total,
+                'successful': self.successful,
+                'failed': failed,
+                'success_rate': (self.successful / self.total * 100) if self.total > 0 else 0,
+                # الناجحة فقط لكل منصة كما في الملخص السابق
+                'platforms': {p: c[1] for p, c in self.platforms.items() if c[1]},
+                'by_platform': {
+                    p: {'total': c[0], 'successful': c[1], 'failed': c[0] - c[1]}
+                    for p, c in self.platforms.items()
+                },
+                'error_classes': dict(self.error_classes),
+                'timed_out': self.timed_out,
+                'cancelled': self.cancelled,
+                'latency_seconds': self.latency.summary(),
+                'file_size_bytes': self.file_size.summary(0),
+            }
+
 class ReportGenerator:
     """مولد التقارير"""
     
     @staticmethod
-    def generate_summary(results: List[Dict]) -> Dict:
-        """توليد ملخص للنتائج"""
-        total = len(results)
-        successful = sum(1 for r in results if r.get('success'))
-        failed = total - successful
-        success_rate = (successful / total * 100) if total > 0 else 0
-        
-        platforms = {}
-        for result in results:
-            if result.get('success'):
-                platform = result.get('platform', 'unknown')
-                platforms[platform] = platforms.get(platform, 0) + 1
-        
-        return {
-            'total_urls': total,
-            'successful': successful,
-            'failed': failed,
-            'success_rate': success_rate,
-            'platforms': platforms
-        }
+    def generate_summary(results: Iterable[Dict]) -> Dict:
+        """توليد ملخص للنتائج في مرور واحد"""
+        return SummaryAggregator().extend(results).summary()
     
     @staticmethod
-    def generate_detailed_report(results: List[Dict]) -> str:
-        """توليد تقرير مفصل"""
-        summary = ReportGenerator.generate_summary(results)
+    def generate_detailed_report(results: Iterable[Dict] = None, summary: Dict = None) -> str:
+        """توليد تقرير مفصل من النتائج أو من ملخص جاهز"""
+        if summary is None:
+            summary = ReportGenerator.generate_summary(results or [])
         
         report = "📊 تقرير مفصل لاستخراج الصور\n"
         report += "=" * 50 + "\n\n"
@@ -143,6 +226,15 @@ class ReportGenerator:
             for platform, count in summary['platforms'].items():
                 report += f"   - {platform}: {count}\n"
         
+        if summary.get('error_classes'):
+            report += "\n⚠️ أسباب الفشل:\n"
+            for error_class, count in sorted(summary['error_classes'].items(), key=lambda x: -x[1]):
+                report += f"   - {error_class}: {count}\n"
+        
+        latency = summary.get('latency_seconds') or {}
+        if latency.get('count'):
+            report += f"\n⏱️ الزمن: p50 {latency['p50']}ث، p90 {latency['p90']}ث، p99 {latency['p99']}ث\n"
+        
         return report
 
 # للاستخدام المباشر
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Records - سجلات النتائج والمرشحين بخانات ثابتة بدل قاموس لكل سجل
+"""
+
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+class _Record(Mapping):
+    """خانات __slots__ مع واجهة قاموس للقراءة، فالشيفرة التي تستخدم get و [] تعمل كما هي"""
+
+    __slots__ = ('_extra',)
+    # ترتيب المفاتيح في JSON؛ الخانات الفارغة (None) لا تظهر إلا إذا كانت في _required
+    _fields = ()
+    _required = frozenset()
+
+    def __init__(self, **values):
+        self._extra = None
+        for name in self._fields:
+            setattr(self, name, None)
+        for key, value in values.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data: Mapping, **changes) -> '_Record':
+        """سجل من قاموس (مثل نتيجة مخزنة) أو سجل آخر، مع تعديلات اختيارية"""
+        record = cls(**data)
+        for key, value in changes.items():
+            record[key] = value
+        return record
+
+    def copy(self, **changes) -> '_Record':
+        return self.from_dict(self, **changes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """نفس شكل JSON السابق للقاموس"""
+        return dict(self)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._fields:
+            value = getattr(self, key)
+            if value is not None or key in self._required:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key in self._fields:
+            setattr(self, key, value)
+        else:
+            # مفاتيح نادرة يضيفها المستدعي لا تستحق خانة في كل سجل
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __iter__(self) -> Iterator[str]:
+        for name in self._fields:
+            if name in self._required or getattr(self, name) is not None:
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({dict(self)!r})'
+
+class AvatarCandidate(_Record):
+    """صورة مرشحة من صفحة الملف الشخصي"""
+
+    __slots__ = ('url', 'width', 'height', 'platform', 'quality', 'probed')
+    _fields = __slots__
+    _required = frozenset(('url', 'width', 'height', 'platform', 'quality'))
+
+class ExtractionResult(_Record):
+    """نتيجة استخراج رابط واحد"""
+
+    __slots__ = ('success', 'input_url', 'platform', 'avatar_url', 'resolution', 'file_size', 'format',
+                 'image_hash', 'base64_data', 'variants', 'error', 'error_class', 'timed_out', 'cancelled',
+                 'profile', 'elapsed')
+    # elapsed للملخصات فقط ولا يظهر في JSON
+    _fields = __slots__[:-1]
+    _required = frozenset(('success', 'input_url'))
+
+    def __init__(self, **values):
+        self.elapsed = None
+        super().__init__(**values)
+
+    def copy(self, **changes) -> 'ExtractionResult':
+        record = super().copy(**changes)
+        record.elapsed = self.elapsed
+        return record
+
+    @classmethod
+    def failure(cls, url: str, error: str, error_class: Optional[str] = None, **values) -> 'ExtractionResult':
+        return cls(success=False, error=error, error_class=error_class, input_url=url, **values)
+
+def json_default(value: Any) -> Any:
+    """للتمرير إلى json.dumps(..., default=json_default): السجلات ليست dict فلا يرمزها json وحده"""
+    if isinstance(value, _Record):
+        return value.to_dict()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def as_result(result: Mapping) -> ExtractionResult:
+    """السجل كما هو، أو سجل من قاموس قديم الشكل"""
+    return result if isinstance(result, ExtractionResult) else ExtractionResult.from_dict(result)
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+Recrawl Scheduler - إعادة فحص الملفات المتابعة دون تحميل الصور التي لم تتغير
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Iterator, List, Optional
+from avatar_extractor import AvatarExtractor
+from batch_engine import PlatformRateLimiter
+from image_store import ImageStore
+
+class RecrawlState:
+    """حالة كل ملف متابع في SQLite: آخر رابط صورة ومحددات HTTP وبصمة المحتوى وفترة الزيارة"""
+
+    COLUMNS = ('key', 'url', 'platform', 'avatar_url', 'etag', 'last_modified', 'content_hash',
+               'result', 'interval', 'next_visit_at', 'last_checked_at', 'last_changed_at',
+               'checks', 'changes')
+
+    def __init__(self, db_path: str = 'recrawl_state.sqlite3'):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self._setup_db()
+
+    def _setup_db(self):
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS tracked_profiles (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                platform TEXT,
+                avatar_url TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                result TEXT,
+                interval REAL NOT NULL,
+                next_visit_at REAL NOT NULL,
+                last_checked_at REAL,
+                last_changed_at REAL,
+                checks INTEGER NOT NULL DEFAULT 0,
+                changes INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS idx_tracked_next_visit ON tracked_profiles (next_visit_at)')
+        self.db.commit()
+
+    def track(self, key: str, url: str, platform: str, interval: float) -> bool:
+        """إضافة ملف للمتابعة، وزيارته الأولى فورية"""
+        with self.lock:
+            cursor = self.db.execute(
+                'INSERT OR IGNORE INTO tracked_profiles (key, url, platform, interval, next_visit_at) '
+                'VALUES (?, ?, ?, ?, 0)', (key, url, platform, interval)
+            )
+            self.db.commit()
+            return cursor.rowcount > 0
+
+    def due(self, now: float, limit: int) -> List[Dict]:
+        """الملفات التي حان موعد زيارتها، الأقدم أولاً"""
+        with self.lock:
+            rows = self.db.execute(
+                f'SELECT {", ".join(self.COLUMNS)} FROM tracked_profiles '
+                'WHERE next_visit_at <= ? ORDER BY next_visit_at LIMIT ?', (now, limit)
+            ).fetchall()
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def update(self, profile: Dict):
+        with self.lock:
+            self.db.execute(
+                'UPDATE tracked_profiles SET avatar_url = ?, etag = ?, last_modified = ?, content_hash = ?, '
+                'result = ?, interval = ?, next_visit_at = ?, last_checked_at = ?, last_changed_at = ?, '
+                'checks = ?, changes = ? WHERE key = ?',
+                (profile['avatar_url'], profile['etag'], profile['last_modified'], profile['content_hash'],
+                 profile['result'], profile['interval'], profile['next_visit_at'], profile['last_checked_at'],
+                 profile['last_changed_at'], profile['checks'], profile['changes'], profile['key'])
+            )
+            self.db.commit()
+
+    def count(self) -> int:
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM tracked_profiles').fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+class RecrawlScheduler:
+    """زيارة الملفات المستحقة ورصد تغير الصورة، مع فترات زيارة تتكيف مع معدل التغير"""
+
+    def __init__(self, extractor: AvatarExtractor, state: RecrawlState, max_workers: int = 8,
+                 rate_limiter: Optional[PlatformRateLimiter] = None, initial_interval: float = 24 * 3600,
+                 min_interval: float = 3600, max_interval: float = 30 * 24 * 3600,
+                 backoff: float = 1.5, jitter: float = 0.1):
+        self.extractor = extractor
+        self.state = state
+        self.max_workers = max_workers
+        self.rate_limiter = rate_limiter or PlatformRateLimiter()
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        # كل فحص دون تغيير يطيل الفترة بهذا المعامل، وكل تغيير يقصرها بنفس المعامل
+        self.backoff = backoff
+        # توزيع الزيارات حتى لا تستحق كل الملفات في اللحظة نفسها
+        self.jitter = jitter
+        self.stats = {'changed': 0, 'unchanged': 0, 'not_modified': 0, 'skipped_download': 0, 'failed': 0}
+        self.stats_lock = threading.Lock()
+
+    def track(self, urls: Iterable[str]) -> int:
+        """إضافة روابط للمتابعة بمفتاحها الموحد، وتجاهل المكرر"""
+        added = 0
+        registry = self.extractor.registry
+        for url in urls:
+            url = url.strip()
+            if not url or url.startswith('#'):
+                continue
+            platform, _ = registry.canonicalize(url)
+            if self.state.track(registry.canonical_key(url), url, platform, self.initial_interval):
+                added += 1
+        return added
+
+    def refresh_due(self, limit: Optional[int] = None, batch_size: int = 500) -> Iterator[Dict]:
+        """زيارة كل الملفات المستحقة وإرجاع المتغيرة منها فقط"""
+        now = time.time()
+        remaining = limit
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while remaining is None or remaining > 0:
+                size = batch_size if remaining is None else min(batch_size, remaining)
+                # الملفات المزارة تنتقل لموعد لاحق فلا تعود في الدفعة التالية
+                profiles = self.state.due(now, size)
+                if not profiles:
+                    return
+                if remaining is not None:
+                    remaining -= len(profiles)
+
+                # الانتظار لدور المنصة يحدث قبل الوصول إلى العمال
+                pending = {self.rate_limiter.submit(p['platform'] or 'generic', executor.submit, self.refresh_one, p,
+                                                    bucket_key=self.extractor._site_key(p['url'], p['platform']))
+                           for p in profiles}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        change = future.result()
+                        if change is not None:
+                            yield change
+
+    def refresh_one(self, profile: Dict) -> Optional[Dict]:
+        """فحص ملف واحد؛ يعيد النتيجة إذا تغيرت الصورة و None إذا لم تتغير"""
+        url = profile['url']
+        platform = profile['platform'] or self.extractor._platform_for(url)
+        now = time.time()
+        print(f"🔄 إعادة فحص: {url}")
+
+        try:
+            _, avatars = self.extractor._fetch_candidates(url, platform)
+        except Exception as e:
+            return self._record_failure(profile, now, f'خطأ في الجلب: {str(e)}')
+        if not avatars:
+            return self._record_failure(profile, now, 'لم يتم العثور على صور')
+
+        best_avatar = None
+        download_result = None
+        if profile['avatar_url'] and profile['avatar_url'] in {a['url'] for a in avatars}:
+            if not profile['etag'] and not profile['last_modified']:
+                # نفس رابط CDN ولا محددات للتحقق: لا داعي لأي طلب للصورة
+                self._count('skipped_download')
+                return self._record_unchanged(profile, now)
+
+            download_result = self.extractor._download_image(
+                profile['avatar_url'],
+                etag=profile['etag'],
+                last_modified=profile['last_modified'],
+                platform=platform
+            )
+            if download_result.get('not_modified'):
+                self._count('not_modified')
+                return self._record_unchanged(profile, now)
+            if download_result['success']:
+                best_avatar = {'url': profile['avatar_url'], 'platform': platform}
+
+        if best_avatar is None:
+            best_avatar, download_result = self.extractor._resolve_best(avatars, platform)
+        result = self.extractor._build_result(url, best_avatar, download_result, platform)
+        if not result['success']:
+            return self._record_failure(profile, now, result['error'])
+
+        content_hash = self._content_hash(result)
+        changed = content_hash != profile['content_hash']
+
+        profile.update({
+            'avatar_url': result['avatar_url'],
+            'etag': download_result.get('etag'),
+            'last_modified': download_result.get('last_modified'),
+            'content_hash': content_hash,
+            'result': json.dumps(dict(result), ensure_ascii=False),
+        })
+        if not changed:
+            # رابط جديد لنفس المحتوى: نحفظ الرابط والمحددات الجديدة فقط
+            return self._record_unchanged(profile, now)
+
+        profile['changes'] += 1
+        profile['last_changed_at'] = now
+        self._schedule(profile, now, max(self.min_interval, profile['interval'] / self.backoff))
+        self._count('changed')
+        print(f"🆕 تغيرت الصورة: {url}")
+        return dict(result, key=profile['key'], first_seen=profile['changes'] == 1)
+
+    def _content_hash(self, result: Dict) -> str:
+        """بصمة محتوى الصورة الناتجة"""
+        if result.get('image_hash'):
+            return result['image_hash']
+        return hashlib.sha256(result.get('base64_data', '').encode()).hexdigest()
+
+    def _record_unchanged(self, profile: Dict, now: float) -> None:
+        self._schedule(profile, now, min(self.max_interval, profile['interval'] * self.backoff))
+        self._count('unchanged')
+        return None
+
+    def _record_failure(self, profile: Dict, now: float, error: str) -> None:
+        """الإخفاق لا يغير الفترة، لكن نعيد المحاولة بعد أقصر فترة"""
+        print(f"⚠️ فشل إعادة الفحص {profile['url']}: {error}")
+        self._schedule(profile, now, profile['interval'], retry_after=self.min_interval)
+        self._count('failed')
+        return None
+
+    def _schedule(self, profile: Dict, now: float, interval: float, retry_after: Optional[float] = None):
+        delay = retry_after if retry_after is not None else interval
+        delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        profile.update({
+            'interval': interval,
+            'next_visit_at': now + delay,
+            'last_checked_at': now,
+            'checks': profile['checks'] + 1,
+        })
+        self.state.update(profile)
+
+    def _count(self, key: str):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='متابعة الملفات الشخصية وإرجاع التي تغيرت صورها فقط')
+    parser.add_argument('--state', default='recrawl_state.sqlite3', help='ملف حالة المتابعة')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    track_parser = subparsers.add_parser('track', help='إضافة روابط للمتابعة')
+    track_parser.add_argument('input', help='ملف روابط أو - لـ stdin')
+
+    refresh_parser = subparsers.add_parser('refresh', help='فحص الملفات المستحقة')
+    refresh_parser.add_argument('-o', '--output', help='ملف JSONL للملفات المتغيرة (الافتراضي stdout)')
+    refresh_parser.add_argument('--images', default='avatar_store', help='مجلد حفظ الصور')
+    refresh_parser.add_argument('--limit', type=int, help='أقصى عدد ملفات في هذه الجولة')
+    refresh_parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    state = RecrawlState(args.state)
+    try:
+        if args.command == 'track':
+            scheduler = RecrawlScheduler(AvatarExtractor(), state)
+            source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+            with source:
+                added = scheduler.track(source)
+            print(f"📌 تمت إضافة {added} ملف (الإجمالي {state.count()})", file=sys.stderr)
+            return 0
+
+        extractor = AvatarExtractor(image_store=ImageStore(args.images))
+        scheduler = RecrawlScheduler(extractor, state, max_workers=args.workers)
+        output = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+        try:
+            # رسائل التقدم إلى stderr حتى يبقى stdout نتائج JSONL فقط
+            with contextlib.redirect_stdout(sys.stderr):
+                for change in scheduler.refresh_due(args.limit):
+                    output.write(json.dumps(change, ensure_ascii=False) + '\n')
+                    output.flush()
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        print(f"📊 {scheduler.stats}", file=sys.stderr)
+        return 0
+    finally:
+        state.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
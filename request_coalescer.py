@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Request Coalescer - دمج الطلبات المتزامنة على نفس المفتاح في جلب واحد
+"""
+
+import threading
+from typing import Any, Callable, Hashable, Optional, Tuple
+from deadline import DeadlineExceeded
+
+class _Call:
+    """طلب قيد التنفيذ ينتظره الآخرون"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class RequestCoalescer:
+    """أول طالب للمفتاح ينفذ الدالة، ومن يصل أثناء التنفيذ يستلم نفس النتيجة"""
+
+    def __init__(self):
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def run(self, key: Hashable, func: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """تنفيذ func أو انتظار التنفيذ الجاري حتى timeout؛ يعيد (النتيجة، هل كانت مشتركة)"""
+        with self.lock:
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self.inflight[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise DeadlineExceeded()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            # الإزالة قبل الإشعار حتى لا يلتحق طالب جديد بنتيجة منتهية
+            with self.lock:
+                del self.inflight[key]
+            call.done.set()
+        return call.result, False
+
+    def __len__(self) -> int:
+        return len(self.inflight)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Response Encoding - اختيار صيغة الاستجابة (JSON أو MessagePack أو CBOR) وضغطها حسب ما يقبله العميل
+"""
+
+import gzip
+from collections.abc import Mapping
+from typing import Any, List, Optional
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CBOR = 'application/cbor'
+
+# JSON أولاً حتى يبقى الافتراضي مع Accept: */* كما يرسله المتصفح
+MEDIA_TYPES = [JSON]
+if msgpack is not None:
+    MEDIA_TYPES += [MSGPACK, 'application/x-msgpack']
+if cbor2 is not None:
+    MEDIA_TYPES.append(CBOR)
+
+# الأفضل ضغطاً أولاً عند تساوي التفضيل لدى العميل
+ENCODINGS = [name for name, module in (('zstd', zstandard), ('br', brotli)) if module is not None] + ['gzip']
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/msgpack', 'application/x-msgpack', 'application/cbor',
+                      'application/x-ndjson', 'text/')
+
+def negotiate(accept) -> str:
+    """الصيغة من ترويسة Accept (كائن MIMEAccept في Werkzeug)"""
+    media_type = accept.best_match(MEDIA_TYPES, default=JSON)
+    return MSGPACK if media_type == 'application/x-msgpack' else media_type
+
+def is_binary(media_type: str) -> bool:
+    """الصيغ الثنائية تحمل بايتات الصورة كما هي بدل base64"""
+    return media_type in (MSGPACK, CBOR)
+
+def _plain(value: Any) -> Any:
+    # السجلات وأي Mapping آخر تُرمز كقاموس
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f'لا يمكن ترميز {type(value).__name__}')
+
+def _cbor_default(encoder, value):
+    encoder.encode(_plain(value))
+
+def encode(data: Any, media_type: str) -> bytes:
+    """ترميز البيانات بصيغة ثنائية؛ JSON يبقى عبر jsonify في Flask"""
+    if media_type == MSGPACK:
+        return msgpack.packb(data, use_bin_type=True, default=_plain)
+    if media_type == CBOR:
+        return cbor2.dumps(data, default=_cbor_default)
+    raise ValueError(f'صيغة غير مدعومة: {media_type}')
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """أفضل ضغط متاح يقبله العميل، أو None للإرسال دون ضغط"""
+    return accept_encodings.best_match(ENCODINGS)
+
+def compress(body: bytes, encoding: str) -> bytes:
+    # مستويات متوسطة: معظم الفائدة بجزء صغير من زمن المعالج
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+def available() -> List[str]:
+    """الصيغ والضغط المتاح في هذه البيئة، لعرضها في /status"""
+    return MEDIA_TYPES + ENCODINGS
@@ -3,61 +3,336 @@
 Server - خادم الويب للربط بين الواجهة والسكربتات
 """
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, send_file, url_for, abort, Response, stream_with_context
 from flask_cors import CORS
 import json
+import math
 import os
+import queue
 from main_app import SocialMediaExtractorApp
+from image_store import ImageStore
+from profile_analyzer import ReportGenerator, SummaryAggregator
+from job_manager import JobManager
+from fair_scheduler import FairScheduler
+from deadline import Deadline
+import response_encoding
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, SlowRequestProfiler
 
 app = Flask(__name__)
 CORS(app)
 
+# مخزن الصور حسب المحتوى
+image_store = ImageStore(os.environ.get('AVATAR_STORE_DIR', 'avatar_store'))
+
+# تحليل عينة من الطلبات البطيئة بـ cProfile عند ضبط PROFILE_SLOW_SECONDS
+profiler = None
+if os.environ.get('PROFILE_SLOW_SECONDS'):
+    profiler = SlowRequestProfiler(
+        threshold=float(os.environ['PROFILE_SLOW_SECONDS']),
+        sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0.05)),
+        output_dir=os.environ.get('PROFILE_DIR', 'profiles')
+    )
+
 # إنشاء instance من التطبيق
-extractor_app = SocialMediaExtractorApp()
+extractor_app = SocialMediaExtractorApp(
+    image_store=image_store,
+    transcode_workers=int(os.environ.get('TRANSCODE_WORKERS', 0)),
+    profiler=profiler
+)
+
+def parse_weights(value):
+    """تحويل client=weight,client2=weight إلى قاموس"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        client_id, _, weight = item.partition('=')
+        weights[client_id.strip()] = float(weight)
+    return weights
+
+# توزيع العمال بين العملاء حتى لا تحتكرهم دفعة عميل واحد
+fair_scheduler = FairScheduler(
+    max_workers=int(os.environ.get('FAIR_WORKERS', 8)),
+    weights=parse_weights(os.environ.get('CLIENT_WEIGHTS', '')),
+    max_in_flight_per_client=int(os.environ.get('CLIENT_MAX_IN_FLIGHT', 4)),
+    max_queued_per_client=int(os.environ.get('CLIENT_MAX_QUEUED', 10000)),
+    reserved_interactive_workers=int(os.environ.get('INTERACTIVE_WORKERS', 1))
+)
+# الطلبات التي لا تتجاوز هذا العدد من الروابط تُخدم في المسار التفاعلي
+INTERACTIVE_MAX_URLS = int(os.environ.get('INTERACTIVE_MAX_URLS', 5))
+
+# مهلة /extract الافتراضية بالثواني (بلا حد إذا لم تُضبط)، والحد الأقصى لما يطلبه العميل
+DEFAULT_DEADLINE = float(os.environ['EXTRACT_DEADLINE_SECONDS']) if os.environ.get('EXTRACT_DEADLINE_SECONDS') else None
+MAX_DEADLINE = float(os.environ.get('MAX_DEADLINE_SECONDS', 300))
+
+# الاستجابات الأصغر من هذا لا تُضغط لأن الضغط لا يوفر فيها شيئاً
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+
+# مهام الدفعات الخلفية
+job_manager = JobManager(
+    extractor_app.engine,
+    max_workers=int(os.environ.get('JOB_WORKERS', 2)),
+    max_queued=int(os.environ.get('JOB_QUEUE_SIZE', 100)),
+    scheduler=fair_scheduler
+)
+
+def get_deadline(data):
+    """المهلة من deadline في الطلب أو ترويسة X-Deadline-Seconds؛ يرفع ValueError للقيم غير الصالحة"""
+    value = data.get('deadline', request.headers.get('X-Deadline-Seconds'))
+    if value is None:
+        return Deadline(DEFAULT_DEADLINE) if DEFAULT_DEADLINE else None
+    if isinstance(value, bool):
+        raise ValueError('deadline يجب أن يكون عدداً')
+    try:
+        seconds = float(value)
+    except TypeError:
+        # قيم JSON غير الرقمية مثل [1] أو {}
+        raise ValueError('deadline يجب أن يكون عدداً')
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValueError('deadline يجب أن يكون عدداً محدوداً أكبر من صفر')
+    return Deadline(min(seconds, MAX_DEADLINE))
+
+def get_client_id():
+    """هوية العميل من ترويسة X-Client-Id أو عنوانه"""
+    return request.headers.get('X-Client-Id') or request.remote_addr or 'anonymous'
+
+def present_result(result, inline=False, binary=False):
+    """استبدال بصمة الصورة برابط، أو بـ base64 عند الطلب (بايتات خام في الصيغ الثنائية)"""
+    # السجلات تتحول إلى قاموس بنفس شكل JSON
+    result = dict(result)
+    image_hash = result.get('image_hash')
+    if not image_hash:
+        return result
+    
+    result['image_url'] = url_for('get_avatar', image_hash=image_hash)
+    if inline and binary:
+        result.pop('base64_data', None)
+        result['image_data'] = image_store.load(image_hash)
+        result['image_mimetype'] = image_store.mimetype_for(image_hash)
+    elif inline:
+        result['base64_data'] = image_store.load_data_url(image_hash)
+    if 'variants' in result:
+        result['variants'] = [present_result(variant, inline, binary) for variant in result['variants']]
+    return result
+
+def wants_binary():
+    return response_encoding.is_binary(response_encoding.negotiate(request.accept_mimetypes))
+
+def respond(data):
+    """JSON افتراضياً، أو MessagePack و CBOR حسب Accept عند توفر مكتباتها"""
+    media_type = response_encoding.negotiate(request.accept_mimetypes)
+    if media_type == response_encoding.JSON:
+        response = jsonify(data)
+    else:
+        response = Response(response_encoding.encode(data, media_type), content_type=media_type)
+    response.vary.add('Accept')
+    return response
+
+@app.after_request
+def compress_response(response):
+    """ضغط الاستجابات غير المبثوثة حسب Accept-Encoding إذا تجاوزت الحد الأدنى"""
+    if (response.direct_passthrough or response.is_streamed or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or not response_encoding.is_compressible(response.content_type)):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = response_encoding.choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    response.set_data(response_encoding.compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
 
 @app.route('/')
 def index():
     """عرض الواجهة الرئيسية"""
     return render_template('index.html')
 
+def get_stream_format(data):
+    """تحديد صيغة البث من الطلب: ndjson أو sse أو بدون بث"""
+    stream = data.get('stream')
+    if stream in ('ndjson', 'sse'):
+        return stream
+    if stream is True:
+        return 'ndjson'
+    
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson', 'text/event-stream'])
+    if best == 'application/x-ndjson':
+        return 'ndjson'
+    if best == 'text/event-stream':
+        return 'sse'
+    return None
+
+def format_event(event, stream_format):
+    """تحويل حدث إلى سطر NDJSON أو رسالة SSE"""
+    payload = json.dumps(event, ensure_ascii=False)
+    if stream_format == 'sse':
+        return f"event: {event['type']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+def stream_results(urls, inline, stream_format, submit=None, deadline=None):
+    """بث كل نتيجة فور اكتمالها ثم الملخص كحدث أخير"""
+    def generate():
+        # الملخص يتحدث مع كل نتيجة فلا تُحفظ النتائج طوال البث
+        aggregator = SummaryAggregator()
+        try:
+            for index, result in extractor_app.iter_results(urls, submit=submit, deadline=deadline):
+                aggregator.add(result)
+                event = {'type': 'result', 'index': index, 'result': present_result(result, inline)}
+                yield format_event(event, stream_format)
+        except queue.Full:
+            # الإرسال للمجدول يحدث بعد بدء البث فلا يمكن إرجاع 429
+            yield format_event({'type': 'error', 'error': 'تجاوزت حد الطلبات المعلقة، حاول لاحقاً'}, stream_format)
+            return
+        
+        summary = aggregator.summary()
+        event = {
+            'type': 'summary',
+            'summary': summary,
+            'total_processed': summary['total_urls'],
+            'timed_out': summary['timed_out']
+        }
+        yield format_event(event, stream_format)
+    
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    # منع الوسطاء من تجميع الاستجابة قبل إرسالها
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/extract', methods=['POST'])
 def extract_avatars():
     """استخراج الصور من الروابط"""
     try:
         data = request.get_json()
         urls = data.get('urls', [])
+        inline = bool(data.get('inline', False))
         
         if not urls:
-            return jsonify({'error': 'لم يتم تقديم أي روابط'}), 400
+            return respond({'error': 'لم يتم تقديم أي روابط'}), 400
         
-        print(f"📥 استلام طلب لمعالجة {len(urls)} روابط")
+        # الساعة تبدأ من وصول الطلب
+        try:
+            deadline = get_deadline(data)
+        except ValueError as e:
+            return respond({'error': f'قيمة deadline غير صالحة: {e}'}), 400
+        
+        client_id = get_client_id()
+        print(f"📥 استلام طلب لمعالجة {len(urls)} روابط من {client_id}")
+        submit = fair_scheduler.submitter(client_id, interactive=len(urls) <= INTERACTIVE_MAX_URLS)
+        
+        stream_format = get_stream_format(data)
+        if stream_format:
+            return stream_results(urls, inline, stream_format, submit, deadline)
         
         # معالجة الروابط
-        results = extractor_app.process_urls(urls)
+        try:
+            results = extractor_app.process_urls(urls, submit=submit, deadline=deadline)
+        except queue.Full:
+            return respond({'error': 'تجاوزت حد الطلبات المعلقة، حاول لاحقاً'}), 429
         
-        # توليد الملخص
-        summary = extractor_app.get_summary()
+        # توليد الملخص من نتائج هذا الطلب فقط
+        summary = ReportGenerator.generate_summary(results)
+        binary = wants_binary()
         
         response = {
             'success': True,
             'summary': summary,
-            'results': results,
-            'total_processed': len(results)
+            'results': [present_result(r, inline, binary) for r in results],
+            'total_processed': len(results),
+            # نتائج جزئية: الروابط التي لم تكتمل قبل المهلة
+            'timed_out': summary['timed_out']
         }
         
-        return jsonify(response)
+        return respond(response)
         
     except Exception as e:
-        return jsonify({'error': f'خطأ في المعالجة: {str(e)}'}), 500
+        return respond({'error': f'خطأ في المعالجة: {str(e)}'}), 500
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """إنشاء مهمة خلفية لمعالجة الروابط"""
+    data = request.get_json() or {}
+    urls = data.get('urls', [])
+    
+    if not urls:
+        return respond({'error': 'لم يتم تقديم أي روابط'}), 400
+    
+    try:
+        job = job_manager.submit(urls, client_id=get_client_id())
+    except queue.Full:
+        return respond({'error': 'طابور المهام ممتلئ، حاول لاحقاً'}), 503
+    
+    print(f"📥 مهمة جديدة {job.id} لمعالجة {len(urls)} روابط")
+    return respond({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('get_job', job_id=job.id)
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """حالة المهمة وتقدمها ونتائجها الجزئية"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return respond({'error': 'المهمة غير موجودة'}), 404
+    
+    include_results = request.args.get('results', '1') != '0'
+    inline = request.args.get('inline') == '1'
+    data = job.to_dict(include_results)
+    if include_results:
+        binary = wants_binary()
+        data['results'] = [present_result(r, inline, binary) if r else None for r in data['results']]
+    return respond(data)
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """إلغاء مهمة"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return respond({'error': 'المهمة غير موجودة'}), 404
+    return respond(job.to_dict(include_results=False))
+
+@app.route('/avatar/<image_hash>')
+def get_avatar(image_hash):
+    """تقديم صورة من المخزن بتخزين مؤقت طويل"""
+    path = image_store.path_for(image_hash)
+    if not path:
+        abort(404)
+    
+    # البصمة مشتقة من المحتوى فلا يتغير الملف أبداً
+    response = send_file(
+        path,
+        mimetype=image_store.mimetype_for(image_hash),
+        etag=image_hash,
+        max_age=31536000,
+        conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/status')
 def status():
     """حالة الخادم"""
-    return jsonify({
+    return respond({
         'status': 'يعمل',
-        'message': 'خادم مستخرج الصور جاهز للاستخدام'
+        'message': 'خادم مستخرج الصور جاهز للاستخدام',
+        'circuit_breakers': extractor_app.avatar_extractor.breakers.snapshot(),
+        'scheduler': fair_scheduler.snapshot(),
+        'encodings': response_encoding.available()
     })
 
+@app.route('/metrics')
+def metrics():
+    """زمن المراحل والعدادات بصيغة Prometheus"""
+    body = extractor_app.avatar_extractor.metrics.render()
+    return Response(body, content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/examples')
 def get_examples():
     """الحصول على أمثلة للروابط"""
@@ -79,14 +354,19 @@ def get_examples():
             'https://twitter.com/Twitter'
         ]
     }
-    return jsonify(examples)
+    return respond(examples)
 
 if __name__ == '__main__':
     print("🚀 بدء تشغيل خادم مستخرج الصور...")
     print("📧 Endpoints المتاحة:")
     print("   GET  /          - الواجهة الرئيسية")
     print("   POST /extract   - استخراج الصور")
+    print("   GET  /avatar/<hash> - تقديم صورة مخزنة")
+    print("   POST /jobs      - إنشاء مهمة خلفية")
+    print("   GET  /jobs/<id> - حالة المهمة ونتائجها")
+    print("   DELETE /jobs/<id> - إلغاء المهمة")
     print("   GET  /status    - حالة الخادم")
+    print("   GET  /metrics   - مقاييس الأداء (Prometheus)")
     print("   GET  /examples  - أمثلة الروابط")
     
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import base64
+import gzip
+import json
+
+from archive_ingest import _har_entries, _warc_records, iter_har, iter_warc
+
+PAGE = '<html><head><link rel="canonical" href="https://example.com/u"></head></html>'
+
+
+def har_entry(index, html=PAGE, **content):
+    return {
+        'startedDateTime': '2024-01-01T00:00:00Z',
+        'request': {'url': f'https://example.com/{index}', 'headers': [{'name': 'a', 'value': 'b'}]},
+        'response': {'status': 200, 'content': dict({'mimeType': 'text/html; charset=utf-8', 'text': html}, **content)},
+    }
+
+
+def har_bytes(entries):
+    return json.dumps({'log': {'version': '1.2', 'entries': entries}}, ensure_ascii=False).encode('utf-8')
+
+
+def test_har_entries_across_small_chunks():
+    entries = [har_entry(i, html=PAGE + 'ي' * i) for i in range(20)]
+    data = har_bytes(entries)
+
+    assert list(_har_entries(data, chunk_size=7)) == entries
+    assert list(_har_entries(data)) == entries
+
+
+def test_har_entries_skip_corrupt_entry():
+    entries = [har_entry(i) for i in range(3)]
+    good = har_bytes(entries).decode('utf-8')
+    second = json.dumps(entries[1], ensure_ascii=False)
+    corrupt = good.replace(second, second.replace('"status": 200', '"status": 2x0'), 1)
+
+    parsed = list(_har_entries(corrupt.encode('utf-8'), chunk_size=16))
+
+    assert [entry['request']['url'] for entry in parsed] == ['https://example.com/0', 'https://example.com/2']
+
+
+def test_har_entries_truncated_file():
+    data = har_bytes([har_entry(0), har_entry(1)])
+    cut = data[:data.rindex(b'"startedDateTime"') + 40]
+
+    assert [entry['request']['url'] for entry in _har_entries(cut, chunk_size=32)] == ['https://example.com/0']
+
+
+def test_iter_har_pages(tmp_path):
+    path = tmp_path / 'session.har'
+    encoded = base64.b64encode(PAGE.encode('utf-8')).decode('ascii')
+    skipped = har_entry(2)
+    skipped['response']['status'] = 404
+    path.write_bytes(har_bytes([har_entry(0), har_entry(1, html=encoded, encoding='base64'), skipped]))
+
+    refs = list(iter_har(str(path)))
+
+    assert [ref['data'] for ref in refs] == [PAGE.encode('utf-8')] * 2
+    assert [ref['charset'] for ref in refs] == ['utf-8', 'utf-8']
+
+
+def warc_record(record_type, url, block, content_type='application/http; msgtype=response'):
+    headers = (f'WARC/1.0\r\nWARC-Type: {record_type}\r\nWARC-Target-URI: {url}\r\n'
+               f'WARC-Record-ID: <urn:{url}>\r\nContent-Type: {content_type}\r\n'
+               f'Content-Length: {len(block)}\r\n\r\n')
+    return headers.encode('ascii') + block + b'\r\n\r\n'
+
+
+def http_response(status, body, content_type='text/html'):
+    return (f'HTTP/1.1 {status} X\r\nContent-Type: {content_type}\r\n\r\n').encode('ascii') + body
+
+
+def warc_bytes():
+    body = PAGE.encode('utf-8')
+    return b''.join([
+        warc_record('request', 'https://example.com/a', b'GET /a HTTP/1.1\r\n\r\n', 'application/http; msgtype=request'),
+        warc_record('response', 'https://example.com/a', http_response(200, body)),
+        warc_record('response', 'https://example.com/b', http_response(404, body)),
+        warc_record('response', 'https://example.com/c', http_response(200, b'\x89PNG', 'image/png')),
+        warc_record('resource', 'https://example.com/d', body, 'text/html'),
+    ])
+
+
+def test_warc_records_offsets():
+    data = warc_bytes()
+    records = list(_warc_records(data))
+
+    assert [headers['warc-type'] for headers, _, _ in records] == ['request', 'response', 'response', 'response', 'resource']
+    headers, start, length = records[-1]
+    assert data[start:start + length] == PAGE.encode('utf-8')
+
+
+def test_warc_records_skip_bad_length():
+    data = warc_bytes().replace(b'Content-Length: ', b'Content-Length: x', 1)
+
+    assert [headers['warc-target-uri'] for headers, _, _ in _warc_records(data)] == [
+        'https://example.com/a', 'https://example.com/b', 'https://example.com/c', 'https://example.com/d']
+
+
+def test_iter_warc_plain_and_gzip(tmp_path):
+    plain = tmp_path / 'crawl.warc'
+    plain.write_bytes(warc_bytes())
+    compressed = tmp_path / 'crawl.warc.gz'
+    compressed.write_bytes(gzip.compress(warc_bytes()))
+
+    refs = list(iter_warc(str(plain)))
+    assert len(refs) == 2
+    assert [plain.read_bytes()[ref['offset']:ref['offset'] + ref['length']] for ref in refs] == [PAGE.encode('utf-8')] * 2
+
+    assert [ref['data'] for ref in iter_warc(str(compressed))] == [PAGE.encode('utf-8')] * 2
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import io
+
+from aiohttp import web
+from PIL import Image
+
+from async_extractor import AsyncAvatarExtractor
+from avatar_extractor import AvatarExtractor
+from circuit_breaker import CircuitBreakerRegistry, RetryPolicy
+
+
+def png(size):
+    buffer = io.BytesIO()
+    Image.new('RGB', (size, size), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+async def serve(hits):
+    async def page(request):
+        name = request.match_info['name']
+        hits[name] = hits.get(name, 0) + 1
+        if name == 'down' or (name == 'flaky' and hits[name] == 1):
+            return web.Response(status=503)
+        html = f'<html><head><meta property="og:image" content="{request.url.origin()}/img/64"></head></html>'
+        return web.Response(text=html, content_type='text/html')
+
+    async def image(request):
+        return web.Response(body=png(int(request.match_info['size'])), content_type='image/png')
+
+    app = web.Application()
+    app.router.add_get('/u/{name}', page)
+    app.router.add_get('/img/{size}', image)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    return runner, f'http://127.0.0.1:{runner.addresses[0][1]}'
+
+
+def make_extractor():
+    return AsyncAvatarExtractor(AvatarExtractor(
+        retry_policy=RetryPolicy(base_delay=0.01),
+        breakers=CircuitBreakerRegistry(failure_threshold=3, recovery_time=60),
+    ))
+
+
+def run(scenario):
+    async def main():
+        hits = {}
+        runner, base = await serve(hits)
+        try:
+            async with make_extractor() as extractor:
+                return await scenario(extractor, base, hits)
+        finally:
+            await runner.cleanup()
+    return asyncio.run(main())
+
+
+def test_async_fetch_retries_transient_status():
+    async def scenario(extractor, base, hits):
+        result = await extractor.extract_avatar_async(f'{base}/u/flaky')
+        return result, hits
+
+    result, hits = run(scenario)
+
+    assert result.success
+    assert result.platform == 'generic'
+    assert hits['flaky'] == 2
+
+
+def test_async_fetch_shares_breaker_with_sync_extractor():
+    async def scenario(extractor, base, hits):
+        first = await extractor.extract_avatar_async(f'{base}/u/down')
+        second = await extractor.extract_avatar_async(f'{base}/u/other')
+        return first, second, hits, extractor.extractor.breakers.snapshot()
+
+    first, second, hits, breakers = run(scenario)
+
+    assert not first.success and first.error_class == 'http_503'
+    assert second.error_class == 'circuit_open'
+    assert 'other' not in hits
+    assert [state['state'] for state in breakers.values()] == ['open']
+
+
+def test_async_rank_probes_candidates():
+    async def scenario(extractor, base, hits):
+        bodies = {}
+        candidates = [
+            {'url': f'{base}/img/16', 'quality': 400},
+            {'url': f'{base}/img/48', 'quality': 100},
+        ]
+        ranked = await extractor._rank(candidates, bodies=bodies)
+        return [candidate['url'] for candidate in ranked], bodies, base
+
+    ranked, bodies, base = run(scenario)
+
+    assert ranked == [f'{base}/img/48', f'{base}/img/16']
+    assert set(bodies) == {f'{base}/img/48', f'{base}/img/16'}
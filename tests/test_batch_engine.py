@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from avatar_extractor import AvatarExtractor
+from batch_engine import BatchEngine, PlatformRateLimiter, TokenBucket
+from deadline import Deadline
+from records import ExtractionResult
+
+
+def make_engine(rates=None, default_rate=0.5, max_workers=4):
+    extractor = AvatarExtractor()
+
+    def extract_avatar(url, include_profile=False, deadline=None):
+        time.sleep(0.01)
+        return ExtractionResult(success=True, input_url=url, platform=extractor._platform_for(url))
+
+    extractor.extract_avatar = extract_avatar
+    return BatchEngine(extractor, max_workers=max_workers,
+                       rate_limiter=PlatformRateLimiter(rates, default_rate=default_rate))
+
+
+def test_generic_sites_get_a_bucket_per_host():
+    engine = make_engine()
+    urls = [f'https://site{i}.example.com/team/a' for i in range(6)]
+    started = time.monotonic()
+    results = engine.run(urls, deadline=Deadline(5))
+    assert time.monotonic() - started < 2
+    assert all(r.success for r in results)
+
+
+def test_same_host_is_still_rate_limited_within_deadline():
+    engine = make_engine(default_rate=1)
+    urls = [f'https://one.example.com/u{i}' for i in range(4)]
+    results = engine.run(urls, deadline=Deadline(1.5))
+    # دور الثالث والرابع بعد المهلة
+    assert [bool(r.get('timed_out')) for r in results] == [False, False, True, True]
+    assert all(r.platform == 'generic' for r in results)
+
+
+def test_throttled_platform_does_not_block_others():
+    engine = make_engine({'youtube': 1, 'instagram': 100}, max_workers=2)
+    slow = [f'https://www.youtube.com/@user{i}' for i in range(3)]
+    fast = [f'https://www.instagram.com/user{i}/' for i in range(6)]
+    finished = {}
+    started = time.monotonic()
+    for index, result in engine.iter_results(slow + fast):
+        finished[index] = time.monotonic() - started
+    assert max(finished[i] for i in range(3, 9)) < 1
+
+
+def test_duplicate_profiles_are_fetched_once():
+    engine = make_engine(default_rate=100)
+    calls = []
+    extract = engine.extractor.extract_avatar
+    engine.extractor.extract_avatar = lambda url, **kw: calls.append(url) or extract(url, **kw)
+    urls = ['https://youtube.com/@a', 'https://www.youtube.com/@a/', 'https://m.youtube.com/@a?si=x']
+    results = engine.run(urls)
+    assert len(calls) == 1
+    assert [r['input_url'] for r in results] == urls
+
+
+def test_cancel_event_releases_queued_work():
+    engine = make_engine({'youtube': 0.2})
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    started = time.monotonic()
+    results = [r for _, r in engine.iter_results([f'https://youtube.com/@u{i}' for i in range(3)], cancel)]
+    assert time.monotonic() - started < 2
+    assert sum(1 for r in results if r.get('cancelled')) == 2
+
+
+def test_token_bucket_refuses_waits_beyond_max_wait():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.reserve() == 0
+    assert bucket.reserve(max_wait=0.1) is None
+    assert 0.5 < bucket.reserve(max_wait=2) <= 1
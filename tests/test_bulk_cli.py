@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import json
+
+import bulk_cli
+from bulk_cli import Checkpoint
+
+
+def test_mismatched_checkpoint_refused(tmp_path):
+    urls = tmp_path / 'urls.txt'
+    urls.write_text('https://example.com/a\n', encoding='utf-8')
+    checkpoint = tmp_path / 'run.checkpoint'
+    checkpoint.write_text(json.dumps({'input': str(tmp_path / 'other.txt'), 'next_line': 5}), encoding='utf-8')
+
+    code = bulk_cli.main([str(urls), '-o', str(tmp_path / 'out.jsonl'), '--checkpoint', str(checkpoint)])
+
+    assert code != 0
+    assert json.loads(checkpoint.read_text(encoding='utf-8'))['next_line'] == 5
+    assert not (tmp_path / 'out.jsonl').exists()
+
+
+def test_reset_starts_from_first_line(tmp_path):
+    path = tmp_path / 'run.checkpoint'
+    checkpoint = Checkpoint(str(path))
+    checkpoint.input = 'old.txt'
+    for line in (0, 1, 3):
+        checkpoint.mark(line)
+    checkpoint.processed = 3
+    checkpoint.save()
+
+    checkpoint = Checkpoint(str(path))
+    assert checkpoint.next_line == 2 and checkpoint.done == {3}
+    checkpoint.reset('new.txt')
+
+    assert checkpoint.input == 'new.txt'
+    assert checkpoint.processed == 0
+    assert not any(checkpoint.is_done(line) for line in range(5))
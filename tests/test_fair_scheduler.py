@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import queue
+import threading
+import time
+
+import pytest
+
+from fair_scheduler import FairScheduler
+from tests.test_batch_engine import make_engine
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = FairScheduler(max_workers=1, max_queued_per_client=5, reserved_interactive_workers=0)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def block(scheduler, client='a'):
+    """إشغال العامل الوحيد حتى يُفتح الباب"""
+    gate = threading.Event()
+    scheduler.submit(client, gate.wait)
+    time.sleep(0.05)
+    return gate
+
+
+def test_clients_are_served_in_turn(scheduler):
+    gate = block(scheduler)
+    order = []
+    futures = [scheduler.submit('a', order.append, f'a{i}') for i in range(3)]
+    futures += [scheduler.submit('b', order.append, f'b{i}') for i in range(3)]
+    gate.set()
+    for future in futures:
+        future.result(timeout=2)
+    assert order == ['b0', 'a0', 'b1', 'a1', 'b2', 'a2']
+
+
+def test_interactive_lane_goes_first(scheduler):
+    gate = block(scheduler)
+    order = []
+    bulk = [scheduler.submit('a', order.append, f'bulk{i}') for i in range(2)]
+    interactive = scheduler.submit('b', order.append, 'interactive', interactive=True)
+    gate.set()
+    for future in bulk + [interactive]:
+        future.result(timeout=2)
+    assert order[0] == 'interactive'
+
+
+def test_queue_limit_raises_full(scheduler):
+    gate = block(scheduler)
+    for _ in range(5):
+        scheduler.submit('a', time.sleep, 0)
+    with pytest.raises(queue.Full):
+        scheduler.submit('a', time.sleep, 0)
+    gate.set()
+
+
+def test_cancelled_tasks_free_the_queue_and_are_not_charged(scheduler):
+    gate = block(scheduler)
+    cancelled = [scheduler.submit('a', time.sleep, 0) for _ in range(5)]
+    for future in cancelled:
+        assert future.cancel()
+    assert scheduler.snapshot()['clients']['a']['queued_bulk'] == 0
+
+    order = []
+    futures = [scheduler.submit('a', order.append, f'a{i}') for i in range(2)]
+    futures += [scheduler.submit('b', order.append, f'b{i}') for i in range(2)]
+    gate.set()
+    for future in futures:
+        future.result(timeout=2)
+    # لو احتُسبت الملغاة لتقدم b بالكامل
+    assert order == ['b0', 'a0', 'b1', 'a1']
+
+
+def test_batch_larger_than_client_queue_limit():
+    scheduler = FairScheduler(max_workers=2, max_queued_per_client=5, reserved_interactive_workers=0)
+    try:
+        engine = make_engine(default_rate=1000)
+        engine.max_pending = 3
+        urls = [f'https://site{i}.example.com/u' for i in range(30)]
+        results = engine.run(urls, submit=scheduler.submitter('big'))
+        assert all(r.success for r in results)
+        assert [r['input_url'] for r in results] == urls
+    finally:
+        scheduler.shutdown()
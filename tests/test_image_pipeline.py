@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import io
+
+import pytest
+from PIL import Image
+
+import image_pipeline
+from image_pipeline import BoundedImageReader
+
+
+def png(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'blue').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_reader_rejects_large_dimensions_before_body():
+    data = png(64, 64)
+    reader = BoundedImageReader(1024 * 1024, max_pixels=100)
+    fed = 0
+    with pytest.raises(ValueError):
+        for i in range(0, len(data), 16):
+            reader.feed(data[i:i + 16])
+            fed = i + 16
+    assert fed < len(data)
+
+
+def test_reader_header_probes_back_off(monkeypatch):
+    calls = []
+    real_open = image_pipeline.Image.open
+    monkeypatch.setattr(image_pipeline.Image, 'open', lambda fp: calls.append(1) or real_open(fp))
+    reader = BoundedImageReader(4 * 1024 * 1024, max_pixels=None)
+    for _ in range(1024):
+        reader.feed(b'\0' * 1024)
+
+    assert reader.size is None
+    assert len(calls) <= 12
+    assert len(reader.getvalue()) == reader.received == 1024 * 1024
+
+
+def test_reader_reads_size_and_releases_buffer():
+    data = png(32, 16)
+    reader = BoundedImageReader(1024 * 1024, max_pixels=10_000, content_type='image/png')
+    for i in range(0, len(data), 8):
+        reader.feed(data[i:i + 8])
+
+    assert reader.size == (32, 16)
+    assert reader.getvalue() == data
+    assert reader.buffer is None
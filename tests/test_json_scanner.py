@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from json_scanner import extract_json_paths, find_json_object
+from platform_registry import YT_THUMBNAIL_PATHS
+
+DATA = {
+    'responseContext': {'skip': ['}', '{', '"', [1, {'a': ']'}]]},
+    'metadata': {'channelMetadataRenderer': {
+        'title': 'قناة "مقتبسة" \\ }',
+        'avatar': {'thumbnails': [{'url': 'https://yt3.example/a=s88', 'width': 88}]},
+    }},
+    'microformat': {'channelMicroformatRenderer': {'thumbnail': {'thumbnails': [{'url': 'https://yt3.example/b'}]}}},
+    'trailing': {'big': list(range(100))},
+}
+
+
+def page(data):
+    return 'var ytInitialData = ' + json.dumps(data, ensure_ascii=False) + ';</script>'
+
+
+def test_extracts_requested_paths_only():
+    text = page(DATA)
+    start = text.index('{')
+
+    found = extract_json_paths(text, start, YT_THUMBNAIL_PATHS + ['metadata.channelMetadataRenderer.title'])
+
+    assert found == {
+        'metadata.channelMetadataRenderer.avatar.thumbnails': DATA['metadata']['channelMetadataRenderer']['avatar']['thumbnails'],
+        'microformat.channelMicroformatRenderer.thumbnail.thumbnails': [{'url': 'https://yt3.example/b'}],
+        'metadata.channelMetadataRenderer.title': 'قناة "مقتبسة" \\ }',
+    }
+
+
+def test_missing_paths_are_absent():
+    text = json.dumps({'metadata': {'other': 1}, 'x': [1, 2]})
+
+    assert extract_json_paths(text, 0, ['metadata.channelMetadataRenderer.avatar', 'x.y']) == {}
+
+
+def test_escaped_keys_and_whitespace():
+    text = '{ "a\\u0062" : { "c" :\n[ 1 , 2 ] } , "d" : null }'
+
+    assert extract_json_paths(text, 0, ['ab.c', 'd']) == {'ab.c': [1, 2], 'd': None}
+
+
+def test_incomplete_object_raises():
+    text = page(DATA)
+    start = text.index('{')
+    truncated = text[:text.index('"trailing"') + 20]
+
+    assert find_json_object(truncated, start) is None
+    with pytest.raises(ValueError):
+        extract_json_paths(truncated, start, ['trailing.missing'])
+
+
+def test_find_json_object_bounds():
+    text = page(DATA)
+    start = text.index('{')
+    bounds = find_json_object(text, start)
+
+    assert bounds is not None and json.loads(text[bounds[0]:bounds[1]]) == DATA
+    assert find_json_object(text, 0) is None
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from main_app import SocialMediaExtractorApp
+from records import ExtractionResult
+
+
+def make_app():
+    app = SocialMediaExtractorApp(max_workers=4)
+    app.engine.rate_limiter.default_rate = 1000
+    app.engine.rate_limiter.rates = {}
+
+    def extract_avatar(url, include_profile=False, deadline=None):
+        time.sleep(0.01)
+        return ExtractionResult(success=True, input_url=url, platform='generic')
+
+    app.avatar_extractor.extract_avatar = extract_avatar
+    return app
+
+
+def test_concurrent_process_urls_keep_their_own_results():
+    app = make_app()
+    batches = {
+        'a': [f'https://a{i}.example.com/u' for i in range(12)],
+        'b': [f'https://b{i}.example.com/u' for i in range(3)],
+    }
+    outcomes = {}
+    errors = []
+
+    def run(name):
+        try:
+            outcomes[name] = app.process_urls(batches[name])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    for name, urls in batches.items():
+        assert [r['input_url'] for r in outcomes[name]] == urls
+
+
+def test_last_batch_is_kept_for_summary():
+    app = make_app()
+    urls = ['https://one.example.com/u', 'https://two.example.com/u']
+    app.process_urls(urls)
+    assert app.get_summary()['total_urls'] == 2
+    assert len(app.get_successful_results()) == 2
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import json
+
+from json_scanner import JsonObjectScanner
+from page_stream import PageStopTracker
+from platform_registry import default_registry
+
+DATA = {'header': {'title': 'a } ] " { [', 'avatar': {'thumbnails': [{'url': 'https://yt3.example/a=s88'}]}},
+        'escaped': 'quote \\" and \\\\', 'items': [1, 2.5, None, True, {'k': '}'}]}
+
+
+def test_scanner_finds_end_across_every_split():
+    text = json.dumps(DATA) + ';</script>'
+    end = len(json.dumps(DATA))
+    for size in (1, 2, 3, 7, 64):
+        scanner = JsonObjectScanner()
+        results = [scanner.feed(text[i:i + size]) for i in range(0, len(text), size)]
+        completed = [result for result in results if result is not None]
+        assert completed and completed[0] == end
+        # لا يبقى من النص إلا رمز لم يكتمل
+        assert scanner.pending == ''
+
+
+def test_scanner_keeps_only_unfinished_string():
+    scanner = JsonObjectScanner()
+    assert scanner.feed('{"a": "long') is None
+    assert scanner.pending == '"long'
+    assert scanner.feed(' value}"') is None
+    assert scanner.feed(', "b": 1}') == len('{"a": "long value}", "b": 1}')
+
+
+def test_tracker_stops_when_embedded_json_completes():
+    platform = default_registry.get('youtube')
+    body = json.dumps(DATA)
+    page = f'<html><head></head><body><script>var ytInitialData = {body};</script>' + 'x' * 5000
+    tracker = PageStopTracker(platform)
+    done_at = None
+    for i in range(0, len(page), 50):
+        if tracker.feed(page[i:i + 50]):
+            done_at = i + 50
+            break
+
+    start = page.index('{')
+    assert done_at is not None and start + len(body) <= done_at < start + len(body) + 50
+    assert tracker.text() == page[:done_at]
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from platform_registry import default_registry, normalize_url
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.instagram.com/Someone/',
+    'instagram.com/someone?igsh=abc&utm_source=x',
+    'https://m.instagram.com/someone/#top',
+    '  http://instagram.com/SOMEONE  ',
+])
+def test_instagram_variants_share_key(url):
+    assert default_registry.canonical_key(url) == 'instagram:someone'
+
+
+def test_platform_specific_usernames():
+    assert default_registry.canonical_key('https://x.com/Jack?s=20') == default_registry.canonical_key('twitter.com/jack')
+    assert default_registry.canonical_key('https://m.youtube.com/@Chan/videos') == 'youtube:chan'
+    assert default_registry.canonical_key('https://www.tiktok.com/@user?lang=en') == 'tiktok:user'
+
+
+def test_reserved_paths_are_not_usernames():
+    key = default_registry.canonical_key('https://www.instagram.com/p/ABC123/')
+    assert key == 'instagram:instagram.com/p/ABC123'
+    assert key != default_registry.canonical_key('https://www.instagram.com/p/XYZ789/')
+
+
+def test_generic_keys_keep_identity_query():
+    # معاملات الهوية تبقى ومعاملات التتبع تُحذف، بترتيب ثابت
+    first = default_registry.canonical_key('https://Example.com/profile.php?id=2&utm_campaign=a&fbclid=z')
+    second = default_registry.canonical_key('https://www.example.com/profile.php/?fbclid=y&id=2')
+    assert first == second == 'generic:example.com/profile.php?id=2'
+    assert default_registry.canonical_key('https://example.com/profile.php?id=3') != first
+    assert normalize_url('example.com/a?b=2&a=1') == 'example.com/a?a=1&b=2'
+
+
+def test_canonical_url_uses_profile_template():
+    assert default_registry.canonical_url('m.youtube.com/@chan/videos') == 'https://www.youtube.com/@chan'
+    assert default_registry.canonical_url('https://example.com/u/1') == 'https://example.com/u/1'
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+from avatar_extractor import AvatarExtractor
+from batch_engine import BatchEngine
+from circuit_breaker import FetchError
+from profile_analyzer import QuantileSketch, SummaryAggregator
+from records import AvatarCandidate, ExtractionResult, as_result, json_default
+
+
+def test_extraction_result_hides_empty_fields():
+    result = ExtractionResult.failure('https://x.com/a', 'boom', 'http_404', platform='twitter')
+    assert dict(result) == {
+        'success': False, 'input_url': 'https://x.com/a', 'platform': 'twitter',
+        'error': 'boom', 'error_class': 'http_404',
+    }
+    assert 'avatar_url' not in result
+    assert result.get('avatar_url') is None
+
+
+def test_extra_keys_and_copy():
+    result = ExtractionResult(success=True, input_url='a', platform='youtube')
+    result['line'] = 7
+    result.elapsed = 1.5
+    copied = result.copy(input_url='b')
+    assert copied['input_url'] == 'b' and copied['line'] == 7 and copied.elapsed == 1.5
+    assert result['input_url'] == 'a'
+    # elapsed للملخصات فقط
+    assert 'elapsed' not in dict(copied)
+
+
+def test_records_are_json_encodable_with_default():
+    candidate = AvatarCandidate(url='u', width=1, height=2, platform='generic', quality=3)
+    result = ExtractionResult(success=True, input_url='a', profile={'candidates': [candidate]})
+    data = json.loads(json.dumps([result], default=json_default))
+    assert data[0]['profile']['candidates'][0]['quality'] == 3
+    with pytest.raises(TypeError):
+        json.dumps(result)
+
+
+def test_as_result_accepts_plain_dicts():
+    result = as_result({'success': True, 'input_url': 'a', 'platform': 'tiktok'})
+    assert isinstance(result, ExtractionResult) and result.platform == 'tiktok'
+
+
+def test_summary_aggregator_counts_per_platform():
+    aggregator = SummaryAggregator()
+    aggregator.add(ExtractionResult(success=True, input_url='a', platform='youtube', file_size=100), 0.2)
+    aggregator.add(ExtractionResult.failure('b', 'x', 'http_404', platform='instagram'), 0.1)
+    aggregator.add(ExtractionResult.failure('c', 'x', 'timed_out', platform='instagram', timed_out=True))
+    summary = aggregator.summary()
+    assert summary['total_urls'] == 3 and summary['successful'] == 1 and summary['failed'] == 2
+    assert summary['by_platform']['instagram'] == {'total': 2, 'successful': 0, 'failed': 2}
+    assert summary['platforms'] == {'youtube': 1}
+    assert summary['timed_out'] == 1
+    assert summary['error_classes'] == {'http_404': 1, 'timed_out': 1}
+
+
+def test_quantile_sketch_is_within_relative_accuracy():
+    sketch = QuantileSketch()
+    values = [i / 1000 for i in range(1, 1001)]
+    for value in values:
+        sketch.add(value)
+    assert sketch.quantile(0.5) == pytest.approx(0.5, rel=0.03)
+    assert sketch.quantile(0.99) == pytest.approx(0.99, rel=0.03)
+
+
+def test_failures_carry_detected_platform():
+    extractor = AvatarExtractor()
+
+    def not_found(url, need_head=False, deadline=None):
+        raise FetchError(404, url)
+
+    extractor._fetch_page = not_found
+    result = extractor.extract_avatar('https://www.instagram.com/nobody/')
+    assert not result.success and result.platform == 'instagram'
+
+    engine = BatchEngine(extractor)
+    assert engine._timed_out_result('https://www.tiktok.com/@x').platform == 'tiktok'
+    assert engine._cancelled_result('https://youtube.com/@x').platform == 'youtube'
+
+    aggregator = SummaryAggregator()
+    aggregator.add(result)
+    assert set(aggregator.summary()['by_platform']) == {'instagram'}
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Transcode Pool - معالجة الصور في عمليات منفصلة عن الشبكة
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+from image_pipeline import ImagePipeline
+
+# خط المعالجة داخل كل عملية عاملة
+_worker_pipeline = None
+
+def _init_worker(pipeline: ImagePipeline):
+    global _worker_pipeline
+    _worker_pipeline = pipeline
+
+def _process_bytes(image_data: bytes) -> Dict:
+    return _worker_pipeline.process(image_data)
+
+def _process_shared(name: str, size: int) -> Dict:
+    """قراءة الصورة من الذاكرة المشتركة بدل تمريرها عبر الأنبوب"""
+    # العملية الأم هي التي تحذف المقطع بعد انتهاء المعالجة
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        image_data = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+    return _worker_pipeline.process(image_data)
+
+class TranscodePool:
+    """مجموعة عمليات لفك وترميز الصور مع ضغط عكسي على مرحلة الشبكة"""
+
+    def __init__(self, pipeline: ImagePipeline, max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, shm_threshold: int = 64 * 1024, mp_context=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=mp_context,
+            initializer=_init_worker,
+            initargs=(pipeline,)
+        )
+        # عند امتلاء الطابور ينتظر خيط الشبكة بدل تكديس الصور في الذاكرة
+        self.max_pending = max_pending or self.max_workers * 2
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.shm_threshold = shm_threshold
+
+    def process(self, image_data: bytes) -> Dict:
+        """معالجة الصورة في عملية عاملة وانتظار النتيجة"""
+        self.slots.acquire()
+        shm = None
+        try:
+            if len(image_data) >= self.shm_threshold:
+                shm = shared_memory.SharedMemory(create=True, size=len(image_data))
+                shm.buf[:len(image_data)] = image_data
+                future = self.executor.submit(_process_shared, shm.name, len(image_data))
+            else:
+                future = self.executor.submit(_process_bytes, image_data)
+            return future.result()
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            self.slots.release()
+
+    def shutdown(self, wait: bool = True):
+        """إيقاف العمليات العاملة"""
+        self.executor.shutdown(wait=wait)